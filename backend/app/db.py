@@ -1,10 +1,85 @@
 import os
-from supabase import create_client
+import threading
+from typing import TYPE_CHECKING, Optional
+
+import httpx
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from supabase import Client
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # service_role key
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# "supabase" (default) talks to the real project; "memory" uses the local
+# in-process stand-in from db_memory.py, for offline benchmarks.
+SUPABASE_BACKEND = os.getenv("SUPABASE_BACKEND", "supabase")
+
+# Connection pool for PostgREST calls. One pool is shared by the whole
+# process, so DB calls reuse warm keep-alive connections instead of paying
+# for a TCP + TLS handshake each time.
+POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", 32))
+POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", 16))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", 30))
+REQUEST_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", 10))
+CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", 5))
+
+_client: Optional["Client"] = None
+_lock = threading.Lock()
+
+
+def _pooled_session(session: httpx.Client) -> httpx.Client:
+    """Rebuild the PostgREST session with our pool limits and timeouts, keeping its auth headers."""
+    return httpx.Client(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def _create_client():
+    if SUPABASE_BACKEND == "memory":
+        from db_memory import InMemorySupabase
+        return InMemorySupabase()
+
+    # supabase pulls in realtime, storage and gotrue clients; import on first use
+    from supabase import create_client
+
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    default_session = client.postgrest.session
+    client.postgrest.session = _pooled_session(default_session)
+    default_session.close()
+    return client
+
+
+def init_supabase():
+    """Create the shared client. Called from the FastAPI lifespan; safe to call twice."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = _create_client()
+        return _client
+
+
+def get_supabase():
+    """
+    Return the process-wide Supabase client. The underlying httpx pool is
+    thread-safe, so the same client is used from the event loop and from the
+    Supabase executor threads.
+    """
+    return _client if _client is not None else init_supabase()
+
+
+def close_supabase() -> None:
+    global _client
+    with _lock:
+        if _client is not None and hasattr(_client, "postgrest"):
+            _client.postgrest.session.close()
+        _client = None
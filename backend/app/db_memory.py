@@ -0,0 +1,402 @@
+"""
+In-process stand-in for the Supabase/PostgREST client.
+
+Implements the subset of the query builder API this backend uses
+(select/insert/upsert/update/delete, the common filters, order, limit,
+range and rpc) over plain Python dicts. Enable it with
+SUPABASE_BACKEND=memory to run or benchmark the data layer offline.
+"""
+import copy
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Optional
+
+
+@dataclass
+class MemoryResponse:
+    data: list[dict]
+    count: Optional[int] = None
+
+
+class MemoryQuery:
+    def __init__(self, db: "InMemorySupabase", table: str):
+        self._db = db
+        self._table = table
+        self._op = "select"
+        self._columns = "*"
+        self._count = None
+        self._payload: Any = None
+        self._on_conflict: Optional[str] = None
+        self._filters: list[Callable[[dict], bool]] = []
+        self._order: list[tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+
+    # Operations
+
+    def select(self, *columns: str, count: Optional[str] = None) -> "MemoryQuery":
+        self._op, self._columns, self._count = "select", ",".join(columns) or "*", count
+        return self
+
+    def insert(self, rows, **_) -> "MemoryQuery":
+        self._op, self._payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = "", ignore_duplicates: bool = False, **_) -> "MemoryQuery":
+        self._op, self._payload = ("upsert_ignore" if ignore_duplicates else "upsert"), rows
+        self._on_conflict = on_conflict or "id"
+        return self
+
+    def update(self, values: dict, **_) -> "MemoryQuery":
+        self._op, self._payload = "update", values
+        return self
+
+    def delete(self, **_) -> "MemoryQuery":
+        self._op = "delete"
+        return self
+
+    # Filters
+
+    def _where(self, predicate: Callable[[dict], bool]) -> "MemoryQuery":
+        self._filters.append(predicate)
+        return self
+
+    def eq(self, column, value):
+        return self._where(lambda r: _cmp(r.get(column)) == _cmp(value))
+
+    def neq(self, column, value):
+        return self._where(lambda r: _cmp(r.get(column)) != _cmp(value))
+
+    def gt(self, column, value):
+        return self._where(lambda r: r.get(column) is not None and _cmp(r[column]) > _cmp(value))
+
+    def gte(self, column, value):
+        return self._where(lambda r: r.get(column) is not None and _cmp(r[column]) >= _cmp(value))
+
+    def lt(self, column, value):
+        return self._where(lambda r: r.get(column) is not None and _cmp(r[column]) < _cmp(value))
+
+    def lte(self, column, value):
+        return self._where(lambda r: r.get(column) is not None and _cmp(r[column]) <= _cmp(value))
+
+    def in_(self, column, values):
+        wanted = {_cmp(v) for v in values}
+        return self._where(lambda r: _cmp(r.get(column)) in wanted)
+
+    def is_(self, column, value):
+        target = None if value in (None, "null") else value
+        return self._where(lambda r: r.get(column) is target)
+
+    def order(self, column: str, *, desc: bool = False, **_) -> "MemoryQuery":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **_) -> "MemoryQuery":
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int) -> "MemoryQuery":
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def execute(self) -> MemoryResponse:
+        self._db._round_trip()
+        return self._db._execute(self)
+
+
+class InMemorySupabase:
+    """
+    Dict-backed replacement for `supabase.Client`; thread-safe. `latency`,
+    if given, returns the seconds each call should take, standing in for the
+    PostgREST round trip (the lock isn't held meanwhile).
+    """
+
+    def __init__(self, latency: Optional[Callable[[], float]] = None):
+        self.latency = latency
+        self.tables: dict[str, list[dict]] = {}
+        self.functions: dict[str, Callable[["InMemorySupabase", dict], Any]] = {}
+        # Row triggers per table, called as fn(db, old, new) after each write
+        self.triggers: dict[str, list[Callable[["InMemorySupabase", Optional[dict], Optional[dict]], None]]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        # Mirrors of the Postgres functions and triggers in supabase/migrations
+        self.register_rpc("save_recipe", _rpc_save_recipe)
+        self.register_rpc("bulk_mutate_items", _rpc_bulk_mutate_items)
+        self.register_rpc("item_stats", _rpc_item_stats)
+        self.register_trigger("items", _items_stats_trigger)
+
+    def table(self, name: str) -> MemoryQuery:
+        return MemoryQuery(self, name)
+
+    from_ = table
+
+    def register_rpc(self, name: str, fn: Callable[["InMemorySupabase", dict], Any]) -> None:
+        self.functions[name] = fn
+
+    def register_trigger(self, table: str, fn: Callable[["InMemorySupabase", Optional[dict], Optional[dict]], None]) -> None:
+        self.triggers.setdefault(table, []).append(fn)
+
+    def _fire(self, table: str, old: Optional[dict], new: Optional[dict]) -> None:
+        # Caller holds the lock
+        for fn in self.triggers.get(table, ()):
+            fn(self, old, new)
+
+    def rpc(self, name: str, params: dict) -> "MemoryRPC":
+        return MemoryRPC(self, name, params)
+
+    def _round_trip(self) -> None:
+        if self.latency is not None:
+            time.sleep(max(0.0, self.latency()))
+
+    def _execute(self, q: MemoryQuery) -> MemoryResponse:
+        with self._lock:
+            rows = self.tables.setdefault(q._table, [])
+            if q._op == "insert":
+                return MemoryResponse(self._insert(rows, q._payload, q._table))
+            if q._op in ("upsert", "upsert_ignore"):
+                return MemoryResponse(self._upsert(rows, q._payload, q._on_conflict, q._op == "upsert_ignore", q._table))
+
+            matched = [r for r in rows if all(f(r) for f in q._filters)]
+            if q._op == "update":
+                now = datetime.now(timezone.utc).isoformat()
+                for r in matched:
+                    old = copy.deepcopy(r)
+                    r.update(copy.deepcopy(q._payload))
+                    if "updated_at" in r:
+                        r["updated_at"] = now
+                    self._fire(q._table, old, r)
+                return MemoryResponse(copy.deepcopy(matched))
+            if q._op == "delete":
+                ids = {id(r) for r in matched}
+                rows[:] = [r for r in rows if id(r) not in ids]
+                for r in matched:
+                    self._fire(q._table, r, None)
+                return MemoryResponse(copy.deepcopy(matched))
+
+            for column, desc in reversed(q._order):
+                matched.sort(key=lambda r: (r.get(column) is None, _cmp(r.get(column))), reverse=desc)
+            total = len(matched)
+            end = None if q._limit is None else q._offset + q._limit
+            matched = matched[q._offset:end]
+            return MemoryResponse([self._project(q._table, r, q._columns) for r in matched],
+                                  count=total if q._count else None)
+
+    def _insert(self, rows: list[dict], payload, table: Optional[str] = None) -> list[dict]:
+        new_rows = payload if isinstance(payload, list) else [payload]
+        inserted = []
+        now = datetime.now(timezone.utc).isoformat()
+        for row in new_rows:
+            row = copy.deepcopy(row)
+            row.setdefault("id", next(self._ids))
+            row.setdefault("created_at", now)
+            row.setdefault("updated_at", now)
+            rows.append(row)
+            if table is not None:
+                self._fire(table, None, row)
+            inserted.append(copy.deepcopy(row))
+        return inserted
+
+    def _upsert(self, rows: list[dict], payload, on_conflict: str, ignore_duplicates: bool,
+                table: Optional[str] = None) -> list[dict]:
+        keys = [k.strip() for k in on_conflict.split(",")]
+        existing = {tuple(_cmp(r.get(k)) for k in keys): r for r in rows}
+        written = []
+        for row in payload if isinstance(payload, list) else [payload]:
+            key = tuple(_cmp(row.get(k)) for k in keys)
+            match = existing.get(key)
+            if match is None:
+                written.extend(self._insert(rows, row, table))
+                existing[key] = rows[-1]
+            elif not ignore_duplicates:
+                old = copy.deepcopy(match)
+                match.update(copy.deepcopy(row))
+                if table is not None:
+                    self._fire(table, old, match)
+                written.append(copy.deepcopy(match))
+        return written
+
+    def _project(self, table: str, row: dict, columns: str) -> dict:
+        """
+        Apply a PostgREST select list, including one level of embedded
+        resources like `recipe_steps(step_number,instruction)`. Embeds join on
+        the `<singular parent>_id` foreign key, e.g. recipes.id = recipe_id.
+        """
+        out = {}
+        for column in _split_columns(columns):
+            if "(" in column:
+                child, child_columns = column[:-1].split("(", 1)
+                fk = table.rstrip("s") + "_id"
+                out[child] = [
+                    self._project(child, r, child_columns)
+                    for r in self.tables.get(child, []) if r.get(fk) == row.get("id")
+                ]
+            elif column == "*":
+                out.update(copy.deepcopy(row))
+            else:
+                out[column] = copy.deepcopy(row.get(column))
+        return out
+
+
+class MemoryRPC:
+    def __init__(self, db: InMemorySupabase, name: str, params: dict):
+        self._db, self._name, self._params = db, name, params
+
+    def execute(self) -> MemoryResponse:
+        fn = self._db.functions.get(self._name)
+        if fn is None:
+            raise RuntimeError(f"Unknown RPC function: {self._name}")
+        self._db._round_trip()
+        with self._db._lock:
+            return MemoryResponse(fn(self._db, copy.deepcopy(self._params)))
+
+
+def _split_columns(columns: str) -> list[str]:
+    """Split a select list on top-level commas only."""
+    parts, depth, current = [], 0, ""
+    for ch in columns:
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        depth += ch == "("
+        depth -= ch == ")"
+        current += ch
+    parts.append(current.strip())
+    return [p for p in parts if p]
+
+
+def _rpc_save_recipe(db: InMemorySupabase, params: dict) -> int:
+    recipe = params["p_recipe"]
+    [row] = db._insert(db.tables.setdefault("recipes", []), {
+        "user_uuid": params["p_user_uuid"],
+        "title": recipe.get("title") or "Untitled",
+        "cook_time": recipe.get("cook_time"),
+        "difficulty": recipe.get("difficulty") or "Easy",
+        "servings": recipe.get("servings") or 1,
+        "url": recipe.get("url"),
+    })
+    db._insert(db.tables.setdefault("recipe_ingredients", []),
+               [{"recipe_id": row["id"], "ingredient": i} for i in recipe.get("ingredients") or []])
+    db._insert(db.tables.setdefault("recipe_steps", []),
+               [{"recipe_id": row["id"], "step_number": n, "instruction": step}
+                for n, step in enumerate(recipe.get("steps") or [], start=1)])
+    return row["id"]
+
+
+# Columns bulk_mutate_items lets "set" change
+_BULK_FIELDS = ("name", "price", "date_bought", "estimated_expiration", "storage_location")
+
+
+def _rpc_bulk_mutate_items(db: InMemorySupabase, params: dict) -> dict:
+    user, changes = _cmp(params["p_user_uuid"]), params["p_changes"]
+    rows = db.tables.setdefault("items", [])
+    by_id = {r.get("id"): r for r in rows if _cmp(r.get("user_uuid")) == user}
+    before = {str(c["id"]): copy.deepcopy(by_id[c["id"]]) for c in changes if c["id"] in by_id}
+    conflicts = [
+        {"id": c["id"], "reason": "version" if c["id"] in by_id else "missing", "current": before.get(str(c["id"]))}
+        for c in changes
+        if c["id"] not in by_id
+        or (c.get("version") is not None and _cmp(by_id[c["id"]].get("updated_at")) != _cmp(c["version"]))
+    ]
+    if params.get("p_atomic") and conflicts:
+        return {"updated": [], "deleted": [], "before": before, "conflicts": conflicts}
+
+    skip = {c["id"] for c in conflicts}
+    now = datetime.now(timezone.utc).isoformat()
+    updated, deleted = [], []
+    for change in changes:
+        if change["id"] in skip:
+            continue
+        row = by_id[change["id"]]
+        if change.get("delete"):
+            deleted.append(row)
+            continue
+        values = {k: v for k, v in (change.get("set") or {}).items() if k in _BULK_FIELDS}
+        consume = bool(change.get("consume")) and row.get("consumed_at") is None
+        if consume or any(row.get(k) != v for k, v in values.items()):
+            old = copy.deepcopy(row)
+            row.update(copy.deepcopy(values))
+            if consume:
+                row["consumed_at"] = now
+            row["updated_at"] = now
+            db._fire("items", old, row)
+            updated.append(copy.deepcopy(row))
+    gone = {id(r) for r in deleted}
+    rows[:] = [r for r in rows if id(r) not in gone]
+    for row in deleted:
+        db._fire("items", row, None)
+    return {"updated": updated, "deleted": copy.deepcopy(deleted), "before": before, "conflicts": conflicts}
+
+
+def _bump(db: InMemorySupabase, table: str, key: dict, deltas: dict) -> dict:
+    """INSERT ... ON CONFLICT DO UPDATE SET column = column + delta, on `key`."""
+    rows = db.tables.setdefault(table, [])
+    row = next((r for r in rows if all(r.get(k) == v for k, v in key.items())), None)
+    if row is None:
+        row = {**key, **{k: 0 for k in deltas}}
+        rows.append(row)
+    for column, delta in deltas.items():
+        row[column] = row.get(column, 0) + delta
+    return row
+
+
+def _item_stats_apply(db: InMemorySupabase, row: dict, sign: int) -> None:
+    user, price = _cmp(row.get("user_uuid")), sign * float(row.get("price") or 0.0)
+    consumed = row.get("consumed_at") is not None
+    _bump(db, "item_stats_totals", {"user_uuid": user}, {
+        "item_count": sign,
+        "total_spend": price,
+        "consumed_count": sign if consumed else 0,
+        "consumed_value": price if consumed else 0.0,
+    })
+    if row.get("date_bought"):
+        _bump(db, "item_stats_monthly", {"user_uuid": user, "month": str(row["date_bought"])[:7] + "-01"}, {"spend": price})
+    if consumed:
+        daily = _bump(db, "item_stats_daily", {"user_uuid": user, "day": str(row["consumed_at"])[:10]},
+                      {"consumed_value": price, "expiring_count": 0, "expiring_value": 0.0})
+    elif row.get("estimated_expiration"):
+        daily = _bump(db, "item_stats_daily", {"user_uuid": user, "day": str(row["estimated_expiration"])[:10]},
+                      {"consumed_value": 0.0, "expiring_count": sign, "expiring_value": price})
+    else:
+        return
+    if not daily["consumed_value"] and not daily["expiring_count"]:
+        db.tables["item_stats_daily"].remove(daily)
+
+
+def _items_stats_trigger(db: InMemorySupabase, old: Optional[dict], new: Optional[dict]) -> None:
+    if old is not None:
+        _item_stats_apply(db, old, -1)
+    if new is not None:
+        _item_stats_apply(db, new, 1)
+
+
+def _rpc_item_stats(db: InMemorySupabase, params: dict) -> dict:
+    user = _cmp(params["p_user_uuid"])
+    today = params.get("p_today") or date.today().isoformat()
+    week_start = (date.fromisoformat(today) - timedelta(days=6)).isoformat()
+    totals = next((r for r in db.tables.get("item_stats_totals", []) if r["user_uuid"] == user), {})
+    daily = [r for r in db.tables.get("item_stats_daily", []) if r["user_uuid"] == user]
+    months = sorted((r for r in db.tables.get("item_stats_monthly", []) if r["user_uuid"] == user), key=lambda r: r["month"])
+    return {
+        "total_spend": round(totals.get("total_spend", 0.0), 2),
+        "monthly_spend": [{"month": r["month"][:7], "spend": round(r["spend"], 2)} for r in months],
+        "items": {
+            "total": totals.get("item_count", 0),
+            "consumed": totals.get("consumed_count", 0),
+            "expired": sum(r["expiring_count"] for r in daily if r["day"] < today),
+            "active": sum(r["expiring_count"] for r in daily if r["day"] >= today),
+        },
+        "savings": {
+            "weekly": round(sum(r["consumed_value"] for r in daily if week_start <= r["day"] <= today), 2),
+            "lifetime": round(totals.get("consumed_value", 0.0), 2),
+        },
+        "waste": {"expired_value": round(sum(r["expiring_value"] for r in daily if r["day"] < today), 2)},
+    }
+
+
+def _cmp(value):
+    # PostgREST compares through text for UUIDs / dates; do the same so str and UUID match
+    return str(value) if value is not None and not isinstance(value, (int, float, bool)) else value
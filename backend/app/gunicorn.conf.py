@@ -0,0 +1,75 @@
+"""
+Production entry point: gunicorn managing uvicorn workers.
+
+    cd backend/app
+    gunicorn main:app
+
+Workers default to the CPUs this container may use (WEB_CONCURRENCY
+overrides). Handlers are async and blocking work already runs in bounded
+thread pools, so one worker per core keeps every core busy without
+multiplying the per-worker caches and pools.
+
+The app is imported once in the master (`preload_app`), which also loads
+the lazily imported SDKs, then freezes the heap before forking so workers
+share those pages copy-on-write instead of each importing them again.
+"""
+import gc
+import os
+import tempfile
+
+
+def _cpu_count() -> int:
+    try:
+        # Respects CPU affinity / cpusets, unlike os.cpu_count()
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '3000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", _cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Gemini calls can take most of a minute; streamed recipes keep the connection open longer
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+# Recycle workers now and then so slow leaks and cache growth can't pile up
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 500))
+
+accesslog = None  # the app writes its own JSON access log (middleware.py)
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+# Every worker records metrics here and /metrics aggregates them. Must be set
+# before prometheus_client is imported, i.e. before the app is loaded.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="gobble-metrics-"))
+# A transcription job runs in one worker but may be polled through any of them
+os.environ.setdefault("TRANSCRIPTION_JOBS_DB", os.path.join(tempfile.gettempdir(), "gobble-transcription-jobs.sqlite"))
+
+# No collections while the master imports; whatever it allocates stays put
+gc.disable()
+
+
+def when_ready(server):
+    from main import preload_shared_state
+
+    preload_shared_state()
+    # Move everything allocated so far out of the collector's reach, so GC in
+    # the workers doesn't write to (and un-share) the master's pages
+    gc.freeze()
+    server.log.info("Preloaded shared state; forking %s workers", workers)
+
+
+def post_fork(server, worker):
+    # Pools, clients and connections are all created after this point, in
+    # the worker (see main.preload_shared_state)
+    gc.enable()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,12 +1,34 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import gem_route, user_route, items_route
+from fastapi.responses import Response
+from routes import gem_route, user_route, items_route, graph_route
+from services.executor import shutdown_executors
+from services.expiry_service import digest_scheduler
+from services.inference_client import gemini
+from services.telemetry import configure_logging, metrics_payload, METRICS_CONTENT_TYPE
+from middleware import telemetry_middleware
+from db import init_supabase, close_supabase
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
+configure_logging()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled Supabase client for the whole process, created before the first request
+    init_supabase()
+    digest_scheduler.start()
+    yield
+    await digest_scheduler.stop()
+    shutdown_executors()
+    gemini.shutdown()
+    close_supabase()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -16,13 +38,49 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Request timings, access logs and opt-in profiling (see middleware.py)
+app.middleware("http")(telemetry_middleware)
 
 # Import all routes
 # Include routers
 app.include_router(gem_route.router, prefix="/gem", tags=["gem"])
 app.include_router(user_route.router, prefix="/user", tags=["user"])
 app.include_router(items_route.router, prefix="/items", tags=["items"])
+app.include_router(graph_route.router, prefix="/graphs", tags=["graphs"])
 
 @app.get("/")
 def health_check():
     return {"status": "ok"}
+
+
+def preload_shared_state() -> None:
+    """
+    Load what request handlers otherwise load lazily: the SDK imports and
+    the Gemini response schemas. gunicorn calls this in the master before
+    forking (gunicorn.conf.py) so every worker shares one copy instead of
+    paying for it on its first request.
+
+    What must not be shared across fork is created after it, per worker:
+    the Supabase client in `lifespan`, executor pools (thread and process)
+    on first use in services/executor.py, and SQLite cache connections,
+    which ResultCache reopens when it finds itself in a new process.
+    """
+    import google.generativeai  # noqa: F401
+    import PIL.ImageOps  # noqa: F401
+    import supabase  # noqa: F401
+    import youtube_transcript_api  # noqa: F401
+    from schemas.gemini_schema import ExpirationPredictions, ImageAnalysis, ReceiptParse, Recipe
+    from services.image_service import load_pillow
+    from services.inference_client import retryable_errors
+    from services.structured_output import response_schema
+
+    load_pillow()
+    retryable_errors()
+    for model in (ReceiptParse, ImageAnalysis, ExpirationPredictions, Recipe):
+        response_schema(model)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint: request and dependency latency histograms."""
+    return Response(metrics_payload(), media_type=METRICS_CONTENT_TYPE)
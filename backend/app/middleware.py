@@ -0,0 +1,84 @@
+import os
+import time
+import uuid
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse, PlainTextResponse
+
+from services.telemetry import REQUEST_LATENCY, get_logger, request_id_var
+
+# Per-request profiling: send `X-Profile: html` (or `text`) on any request.
+# Off unless PROFILING_ENABLED=1; if PROFILING_TOKEN is set the request must
+# also carry it in `X-Profile-Token`.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_SECONDS", 0.001))
+
+Profiler = None
+if PROFILING_ENABLED:
+    try:
+        from pyinstrument import Profiler
+    except ImportError:  # profiling is opt-in; the app runs fine without it
+        pass
+
+logger = get_logger("http")
+
+
+def _route_label(request: Request) -> str:
+    # The route template, not the raw path, so labels stay bounded
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+def _wants_profile(request: Request) -> str | None:
+    mode = request.headers.get("x-profile")
+    if not mode or not PROFILING_ENABLED or Profiler is None:
+        return None
+    if PROFILING_TOKEN and request.headers.get("x-profile-token") != PROFILING_TOKEN:
+        return None
+    return "text" if mode == "text" else "html"
+
+
+async def _profiled(request: Request, call_next, mode: str):
+    profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+    profiler.start()
+    try:
+        response = await call_next(request)
+        # Streaming bodies do their work while being sent; drain so it is profiled too
+        async for _ in response.body_iterator:
+            pass
+    finally:
+        profiler.stop()
+    headers = {"X-Profiled-Status": str(response.status_code)}
+    if mode == "text":
+        return PlainTextResponse(profiler.output_text(unicode=True, show_all=False), headers=headers)
+    return HTMLResponse(profiler.output_html(), headers=headers)
+
+
+async def telemetry_middleware(request: Request, call_next):
+    """
+    Times every request into `http_request_duration_seconds`, writes one
+    JSON access-log line, tags logs with a request id, and runs the
+    pyinstrument profiler when asked to.
+    """
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    token = request_id_var.set(request_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        mode = _wants_profile(request)
+        response = await (_profiled(request, call_next, mode) if mode else call_next(request))
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        route = _route_label(request)
+        REQUEST_LATENCY.labels(request.method, route, str(status)).observe(elapsed)
+        if route != "/metrics":
+            logger.info(
+                "request",
+                extra={"method": request.method, "route": route, "status": status,
+                       "duration_ms": round(elapsed * 1000, 2)},
+            )
+        request_id_var.reset(token)
@@ -1,56 +1,224 @@
 
-from fastapi import APIRouter, File, UploadFile, Request, Form, HTTPException
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from services.gem_service import parse_receipt, analyze_image, generate_recipe
-from services.gem_service import parse_receipt, analyze_image, generate_recipe
+import json
+import os
+from fastapi import APIRouter, File, UploadFile, Request, Form, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import Optional
+from uuid import UUID
+from services.gem_service import parse_receipt, parse_receipt_for_user, analyze_image, generate_recipe, analysis_cache, transcript_cache, recipe_cache
+from services.gem_service import iter_parsed_receipts, merge_receipt_items, stream_recipe
+from services.dedup_service import receipt_fingerprints
+from services.executor import run_gemini
+from services.image_service import ImageRejected, read_upload
+from services.inference_client import gemini, GeminiUnavailable
+from services.transcription_service import JobQueueFull, transcription_jobs
+from schemas.gemini_schema import Recipe
 
 router = APIRouter()
 
+
+def _unavailable(e: GeminiUnavailable) -> HTTPException:
+    # Tell the client when to come back instead of a bare 500
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) or 1)})
+
 # Request model for recipe generation
 class RecipeRequest(BaseModel):
     videoUrl: str
     platform: str
 
-# Response model for recipe (for demonstration)
-class Recipe(BaseModel):
-    title: str
-    ingredients: list[str]
-    steps: list[str]
-    cookTime: str
-    servings: int
-    difficulty: str
-
 # POST /generate-recipe endpoint (mock implementation)
 @router.post("/generate-recipe")
 async def generate_recipe_endpoint(request: RecipeRequest):
-    recipe = generate_recipe(request.videoUrl, request.platform)
+    """
+    Recipe from a video's captions. A video without captions is queued for
+    audio transcription instead: 202 with the job, poll its Location.
+    """
+    try:
+        recipe = await run_gemini(generate_recipe, request.videoUrl, request.platform)
+    except GeminiUnavailable as e:
+        raise _unavailable(e)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "60"})
+    if recipe.get("pending"):
+        return JSONResponse(
+            status_code=202,
+            content={"success": True, "recipe": recipe},
+            headers={"Location": f"/gem/transcription-jobs/{recipe['job']['id']}"},
+        )
     return {"success": True, "recipe": recipe}
 
+
+@router.get("/transcription-jobs/{job_id}")
+async def transcription_job_endpoint(job_id: str):
+    """
+    Status of a queued audio transcription: `queued`, `running` (with
+    `stage` and chunk progress), `done` (with `result.recipe` and
+    `result.transcript`) or `failed` (with `error`).
+    """
+    job = transcription_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired transcription job")
+    return job
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/generate-recipe/stream")
+async def generate_recipe_stream_endpoint(request: RecipeRequest):
+    """
+    Server-Sent Events version of /generate-recipe. Emits `title`,
+    `ingredient`, `step` and `meta` events as Gemini streams the recipe, then
+    a final `recipe` event matching the Recipe model (or an `error` event).
+    """
+    events = stream_recipe(request.videoUrl, request.platform)
+
+    async def sse():
+        try:
+            while True:
+                # Each step may block on the transcript fetch or the Gemini stream
+                item = await run_gemini(next, events, None)
+                if item is None:
+                    break
+                event, data = item
+                if event == "recipe":
+                    try:
+                        data = Recipe(**data).model_dump()
+                    except ValidationError as e:
+                        event, data = "error", {"error": "Gemini did not return a valid recipe.", "detail": e.errors(include_url=False)}
+                yield _sse(event, data)
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+        finally:
+            try:
+                events.close()
+            except ValueError:
+                # Client disconnected while a step was still running in the executor
+                pass
+
+    return StreamingResponse(
+        sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/parse-receipt")
-async def parse_receipt_endpoint(file: UploadFile = File(...)):
+async def parse_receipt_endpoint(
+    file: UploadFile = File(...),
+    user_uuid: Optional[UUID] = Form(None),
+    dedupe: bool = Form(False),
+):
     """
     Parse a receipt image and return structured items.
     Expects:
     - file: receipt image
+    - user_uuid (optional): enables rescan detection against the user's recent receipts
+    - dedupe (optional, default false): return the matched scan's parse
+      instead of parsing this image. Off by default because receipts from
+      the same store can match; a match is reported either way
     Returns:
     - parsed JSON with items [name, date_bought, price]
+    - duplicate_of: the earlier scan this one matched (distance, similarity,
+      scanned_at, image_sha256, ingest_key), or null
     """
     try:
-        # Read image bytes
-        image_bytes = await file.read()
+        # Read image bytes (bounded, so oversized uploads are rejected early)
+        image_bytes = await read_upload(file)
 
         # Parse receipt JSON
-        parsed_json = parse_receipt(image_bytes)
+        if user_uuid is not None:
+            parsed_json, duplicate_of = await run_gemini(parse_receipt_for_user, image_bytes, str(user_uuid), reuse=dedupe)
+        else:
+            parsed_json, duplicate_of = await run_gemini(parse_receipt, image_bytes), None
 
-        return {"parsed": parsed_json}
+        return {"parsed": parsed_json, "duplicate_of": duplicate_of}
 
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except GeminiUnavailable as e:
+        raise _unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+BATCH_MAX_FILES = int(os.getenv("GEM_BATCH_MAX_FILES", 10))
+
+
+@router.post("/parse-receipts")
+async def parse_receipts_batch_endpoint(
+    files: list[UploadFile] = File(...),
+    stream: bool = Query(False),
+):
+    """
+    Parse several receipt images in one request.
+    Expects:
+    - files: receipt images
+    - stream: if true, respond with NDJSON, one line per receipt as soon as it
+      is parsed, followed by a final line holding the merged items
+    Returns:
+    - per-receipt results plus the merged, de-duplicated item list
+    """
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_FILES} receipts per batch")
+    try:
+        images = [await read_upload(f) for f in files]
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    def receipt_result(index, parsed, error):
+        result = {"index": index, "filename": files[index].filename}
+        if error is None:
+            result["parsed"] = parsed
+        else:
+            result["error"] = error
+        return result
+
+    if stream:
+        async def ndjson():
+            parsed_receipts = []
+            async for index, parsed, error in iter_parsed_receipts(images):
+                parsed_receipts.append(parsed)
+                yield json.dumps(receipt_result(index, parsed, error)) + "\n"
+            yield json.dumps({"merged": merge_receipt_items(parsed_receipts)}) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    receipts = [None] * len(images)
+    async for index, parsed, error in iter_parsed_receipts(images):
+        receipts[index] = receipt_result(index, parsed, error)
+    return {
+        "receipts": receipts,
+        "merged": merge_receipt_items([r.get("parsed") for r in receipts]),
+    }
+
+
 @router.post("/analyze-image")
 async def analyze_image_endpoint(file: UploadFile = File(...)):
-    image_bytes = await file.read()
-    result_json = analyze_image(image_bytes)
+    try:
+        image_bytes = await read_upload(file)
+        result_json = await run_gemini(analyze_image, image_bytes)
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except GeminiUnavailable as e:
+        raise _unavailable(e)
     return {"analysis": result_json}
+
+
+@router.get("/cache-stats")
+async def cache_stats_endpoint():
+    """Hit/miss counters for the Gemini image analysis, transcript and recipe caches."""
+    return {
+        "analysis": analysis_cache.stats(),
+        "transcripts": transcript_cache.stats(),
+        "recipes": recipe_cache.stats(),
+        "transcription_jobs": transcription_jobs.stats(),
+        "receipt_fingerprints": receipt_fingerprints.stats(),
+    }
+
+
+@router.get("/inference-stats")
+async def inference_stats_endpoint():
+    """Gemini client counters: calls, coalesced duplicates, retries, hedges, and the current queue."""
+    return gemini.stats()
@@ -0,0 +1,54 @@
+from typing import Literal, Optional
+from uuid import UUID
+from fastapi import APIRouter, HTTPException, Query, Header
+from fastapi.responses import Response
+from services.analytics_service import user_stats
+from services.chart_service import get_bar_chart, MEDIA_TYPES
+from services.telemetry import get_logger
+
+logger = get_logger("graphs")
+
+router = APIRouter()
+
+# Shown when no user is given (the original demo chart)
+SAMPLE_SAVINGS = [50, 30, 10, 35, 20, 21, 15, 19, 20, 30, 60]
+
+
+@router.get("/bar-graph-with-average")
+async def get_bar_graph(
+    user_uuid: Optional[UUID] = Query(None, description="Plot this user's monthly spend instead of the sample data"),
+    format: Literal["png", "svg"] = Query("png"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Bar chart with an average line, rendered in memory. The ETag is a hash of
+    the plotted data, so a dashboard reload with unchanged data gets a 304.
+    """
+    if user_uuid is None:
+        spec = {
+            "values": SAMPLE_SAVINGS,
+            "title": "Amount of Money Saved Throughout the Year",
+            "xlabel": "Per Month of the Year",
+            "ylabel": "Amount of Money Saved Per Month",
+        }
+    else:
+        monthly = (await user_stats(str(user_uuid)))["monthly_spend"]
+        spec = {
+            "values": [m["spend"] for m in monthly],
+            "labels": [m["month"] for m in monthly],
+            "title": "Grocery Spend per Month",
+            "xlabel": "Month",
+            "ylabel": "Amount Spent",
+        }
+
+    try:
+        key, image = await get_bar_chart(spec, format)
+    except Exception:
+        logger.exception("chart rendering failed")
+        raise HTTPException(status_code=500, detail="Failed to render chart")
+
+    etag = f'"{key[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(image, media_type=MEDIA_TYPES[format], headers=headers)
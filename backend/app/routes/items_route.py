@@ -1,19 +1,35 @@
-from fastapi import APIRouter, HTTPException, Query
-from pydantic import BaseModel
-from typing import Dict, Any, List
+import hashlib
+from datetime import date, datetime
+from fastapi import APIRouter, HTTPException, Query, Header, File, Form, UploadFile
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, Any, List, Literal, Optional
 from uuid import UUID
-from services.item_service import insert_items_into_supabase, supabase
-from services.gem_service import predict_expirations
+from services.item_service import insert_items_into_supabase, fetch_items, items_version, ITEM_FIELDS
+from services.item_service import ingest_items_into_supabase, fetch_ingested_items, apply_item_changes
+from services.gem_service import predict_expirations, parse_receipt_for_user, receipt_items
+from services.image_service import ImageRejected, read_upload
+from services.inference_client import GeminiUnavailable
+from services.cache_service import content_key
+from services.analytics_service import user_stats
+from services.expiry_service import expiring_items, digest_scheduler
+from services.executor import run_gemini
 
 class ItemSchema(BaseModel):
+    """
+    A row as /get-items returns it: `id` always, the other columns only when
+    selected (`fields`; all of ITEM_FIELDS by default).
+    """
     id: int
-    name: str
-    date_bought: str
-    estimated_expiration: str | None
-    price: float
-    storage_location: str
-    user_uuid: str
-    
+    name: Optional[str] = None
+    date_bought: Optional[date] = None
+    estimated_expiration: Optional[date] = None
+    price: Optional[float] = None
+    storage_location: Optional[Literal["F", "R", "S"]] = None
+    user_uuid: Optional[UUID] = None
+    updated_at: Optional[datetime] = None
+    consumed_at: Optional[datetime] = None
+
 
 router = APIRouter()
 
@@ -21,6 +37,31 @@ class ItemsPayload(BaseModel):
     user_uuid: str
     items_json: Dict[str, Any]
 
+class ItemFields(BaseModel):
+    """Columns a bulk `update` may change; only the fields sent are written."""
+    model_config = ConfigDict(extra="forbid")
+
+    name: Optional[str] = Field(None, min_length=1)
+    price: Optional[float] = Field(None, ge=0)
+    date_bought: Optional[date] = None
+    estimated_expiration: Optional[date] = None
+    storage_location: Optional[Literal["F", "R", "S"]] = None
+
+
+class ItemChange(BaseModel):
+    id: int
+    op: Literal["update", "consume", "delete"]
+    # The item's updated_at as last read; omit to skip the concurrency check
+    version: Optional[str] = None
+    set: Optional[ItemFields] = None
+
+
+class BulkItemsPayload(BaseModel):
+    user_uuid: UUID
+    changes: List[ItemChange] = Field(..., min_length=1, max_length=1000)
+    atomic: bool = False
+
+
 @router.post("/finalize-items")
 async def finalize_items_endpoint(payload: ItemsPayload):
     """
@@ -30,7 +71,7 @@ async def finalize_items_endpoint(payload: ItemsPayload):
     3. Return clean response
     """
     # Step 1: Predict expiration dates
-    items_with_exp = predict_expirations(payload.items_json)
+    items_with_exp = await run_gemini(predict_expirations, payload.items_json)
     
     # Step 2: Insert into Supabase
     result = await insert_items_into_supabase(payload.user_uuid, items_with_exp)
@@ -44,14 +85,172 @@ async def finalize_items_endpoint(payload: ItemsPayload):
 
 
 
-@router.get("/get-items", response_model=List[ItemSchema])
-async def get_items_endpoint(user_uuid: UUID = Query(...)):
+@router.post("/ingest-receipt")
+async def ingest_receipt_endpoint(
+    file: UploadFile = File(...),
+    user_uuid: UUID = Form(...),
+    upload_key: Optional[str] = Form(None, max_length=128),
+    dedupe: bool = Form(False),
+    idempotency_key: Optional[str] = Header(None, max_length=128),
+):
+    """
+    Scan-to-inventory in one call: parse the receipt (one Gemini pass that
+    also returns expirations and storage), fill any missing dates locally,
+    and bulk-insert the items.
+
+    Retries are safe: pass the same `upload_key` form field (or
+    `Idempotency-Key` header); without one the image's hash is used. A
+    replay returns the rows stored the first time with status "duplicate".
+
+    A different photo that looks like a receipt the user ingested recently
+    (perceptual hash within RECEIPT_DEDUP_RADIUS, whatever key either
+    upload used) is only a suspected rescan: receipts from the same store
+    can look alike. By default the items are inserted anyway and the
+    earlier upload is reported in `duplicate_of` (distance, similarity,
+    scanned_at, image_sha256, ingest_key), so the client can ask the user.
+    With `dedupe` set, the suspected rescan is treated as a replay instead:
+    nothing is inserted and the earlier rows come back as "duplicate".
+    """
+    try:
+        image_bytes = await read_upload(file)
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    user = str(user_uuid)
+    ingest_key = upload_key or idempotency_key or "sha256:" + content_key(image_bytes)
+    existing = await fetch_ingested_items(user, ingest_key)
+    if existing:
+        return {"status": "duplicate", "ingest_key": ingest_key, "items": existing}
+
+    try:
+        parsed, match = await run_gemini(parse_receipt_for_user, image_bytes, user, reuse=dedupe, ingest_key=ingest_key)
+    except GeminiUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) or 1)})
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    duplicate_of = None
+    if match is not None:
+        # Only worth reporting if the earlier scan was ingested, not just previewed
+        earlier_key = match["ingest_key"] or "sha256:" + match["image_sha256"]
+        existing = await fetch_ingested_items(user, earlier_key)
+        if existing:
+            duplicate_of = {**match, "ingest_key": earlier_key}
+            if dedupe:
+                return {"status": "duplicate", "ingest_key": earlier_key, "items": existing, "duplicate_of": duplicate_of}
+    items = receipt_items(parsed)
+    if not items:
+        return {"status": "no items to insert", "ingest_key": ingest_key, "items": [], "duplicate_of": duplicate_of}
+
+    try:
+        rows = await ingest_items_into_supabase(user, items, ingest_key)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"status": "success", "ingest_key": ingest_key, "items": rows, "duplicate_of": duplicate_of}
+
+
+@router.post("/bulk")
+async def bulk_items_endpoint(payload: BulkItemsPayload):
     """
-    Retrieve all items belonging to a specific user by their UUID.
+    Edit, consume (mark eaten) and delete many items in one request and
+    one database round trip. Send each item's `updated_at` as `version`:
+    items changed by someone else since are left alone and listed under
+    `conflicts` with their current row. With `atomic` any conflict applies
+    nothing and returns 409.
     """
-    response = supabase.table("items").select("*").eq("user_uuid", str(user_uuid)).execute()
+    changes = [
+        {"id": c.id, "op": c.op, "version": c.version,
+         "set": c.set.model_dump(mode="json", exclude_unset=True) if c.set else {}}
+        for c in payload.changes
+    ]
+    try:
+        result = await apply_item_changes(str(payload.user_uuid), changes, atomic=payload.atomic)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not result["applied"]:
+        return JSONResponse(result, status_code=409)
+    return result
+
+
+@router.get("/get-items", responses={200: {"model": List[ItemSchema]}})
+async def get_items_endpoint(
+    user_uuid: UUID = Query(...),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit to get every item"),
+    after: Optional[int] = Query(None, description="Keyset cursor: return items with id greater than this"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    storage_location: Optional[Literal["F", "R", "S"]] = Query(None),
+    expiring_before: Optional[date] = Query(None),
+    since: Optional[str] = Query(None, description="Only items changed after this updated_at timestamp"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Retrieve items belonging to a specific user by their UUID. Each item has
+    `id` plus the columns named in `fields` (default: all of ITEM_FIELDS).
+    Paging: pass the `X-Next-Cursor` response header back as `after`.
+    Sync: pass `X-Sync-Cursor` back as `since` to get only changed rows, or
+    send the `ETag` as `If-None-Match` to get a 304 when nothing changed
+    (deletes change the ETag but are not returned by `since`).
+    """
+    user = str(user_uuid)
+    field_list = None
+    if fields:
+        field_list = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(field_list) - set(ITEM_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    tag, latest = await items_version(user)
+    params = (limit, after, fields, storage_location, expiring_before, since)
+    etag = 'W/"' + hashlib.sha1(repr((user, tag, params)).encode()).hexdigest() + '"'
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
 
-    if not response.data:  # Supabase Python client returns data directly
+    rows = await fetch_items(
+        user,
+        limit=limit,
+        after=after,
+        fields=field_list,
+        storage_location=storage_location,
+        expiring_before=expiring_before.isoformat() if expiring_before else None,
+        since=since,
+    )
+
+    is_plain_read = not any(params)
+    if not rows and is_plain_read:  # Supabase Python client returns data directly
         raise HTTPException(status_code=404, detail="No items found for this user")
 
-    return response.data
\ No newline at end of file
+    headers = {"ETag": etag}
+    if limit is not None and len(rows) == limit:
+        headers["X-Next-Cursor"] = str(rows[-1]["id"])
+    if latest:
+        headers["X-Sync-Cursor"] = latest
+    # Rows come straight from Postgres; ItemSchema only documents them (see
+    # `responses`) rather than re-validating every one as a response_model would
+    return JSONResponse(rows, headers=headers)
+
+
+@router.get("/stats")
+async def item_stats_endpoint(user_uuid: UUID = Query(...)):
+    """
+    Spend, consumption and savings for the dashboard, served from per-user
+    rollup tables that a database trigger keeps current as items are written.
+    """
+    return await user_stats(str(user_uuid))
+
+
+@router.get("/expiring")
+async def expiring_items_endpoint(
+    user_uuid: UUID = Query(...),
+    days: int = Query(7, ge=0, le=365, description="Look this many days ahead"),
+    include_expired: bool = Query(False, description="Also return items already past their date"),
+):
+    """Unconsumed items expiring within `days` days, soonest first, from the in-memory expiry index."""
+    return await expiring_items(str(user_uuid), days, include_expired)
+
+
+@router.get("/expiring/digest")
+async def expiring_digest_endpoint(user_uuid: UUID = Query(...)):
+    """The latest batched "expiring soon" digest built by the background scheduler."""
+    digest = digest_scheduler.digest(str(user_uuid))
+    if digest is None:
+        raise HTTPException(status_code=404, detail="No digest for this user yet")
+    return digest
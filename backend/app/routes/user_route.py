@@ -1,6 +1,8 @@
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, Query
 from pydantic import BaseModel
-from services.user_service import create_profile_in_db, save_recipe_in_db
+from services.user_service import create_profile_in_db, save_recipe_in_db, list_recipes_in_db
+from services.matching_service import cookable_recipes
 
 router = APIRouter()
 
@@ -21,4 +23,22 @@ async def create_profile_endpoint(profile: ProfileCreateRequest):
 async def save_recipe_endpoint(data: RecipeRequest):
     # You will implement save_recipe_in_db in your services
     result = await save_recipe_in_db(data.userId, data.recipe)
-    return result
\ No newline at end of file
+    return result
+
+@router.get("/recipes")
+async def list_recipes_endpoint(
+    user_uuid: str = Query(...),
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[int] = Query(None, description="Cursor: return recipes with id below this"),
+):
+    return await list_recipes_in_db(user_uuid, limit, before)
+
+
+@router.get("/recipes/cookable")
+async def cookable_recipes_endpoint(
+    user_uuid: str = Query(...),
+    limit: int = Query(20, ge=1, le=200),
+    min_coverage: float = Query(0.0, ge=0.0, le=1.0, description="Only recipes with at least this share of ingredients on hand"),
+):
+    """Saved recipes ranked by how much of each the user's inventory covers, then by what expires soonest."""
+    return await cookable_recipes(user_uuid, limit, min_coverage)
@@ -0,0 +1,93 @@
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
+from datetime import date
+from typing import Literal, Optional
+
+
+def _keep_valid(adapter: TypeAdapter, entries) -> list:
+    """Drop list entries that don't validate (e.g. the cut-off last item of a truncated response)."""
+    kept = []
+    for entry in entries if isinstance(entries, list) else []:
+        try:
+            kept.append(adapter.validate_python(entry))
+        except ValidationError:
+            continue
+    return kept
+
+
+class ReceiptItem(BaseModel):
+    name: str = Field(..., description="The item's name as printed, expanded if abbreviated")
+    date_bought: Optional[str] = Field(None, description="Purchase date, YYYY-MM-DD")
+    price: float = Field(0.0, description="Price in dollars")
+    estimated_expiration: Optional[str] = Field(None, description="YYYY-MM-DD, or null if non-perishable")
+    storage_option: Optional[Literal["F", "R", "S"]] = Field(None, description="F freezer, R refrigerator, S shelf")
+
+    @field_validator("storage_option", mode="before")
+    @classmethod
+    def _known_storage(cls, value):
+        # An unexpected code shouldn't cost us the whole item
+        return value if value in ("F", "R", "S") else None
+
+
+_RECEIPT_ITEM = TypeAdapter(ReceiptItem)
+
+
+class ReceiptParse(BaseModel):
+    items: list[ReceiptItem] = []
+
+    @field_validator("items", mode="before")
+    @classmethod
+    def _valid_items(cls, value):
+        return _keep_valid(_RECEIPT_ITEM, value)
+
+
+class AnalyzedItem(BaseModel):
+    name: str
+    shelf_life_days: int = Field(0, description="Estimated shelf life in days")
+    num_of_occurences: int = Field(1, description="How many of this item are in the photo")
+
+
+_ANALYZED_ITEM = TypeAdapter(AnalyzedItem)
+
+
+class ImageAnalysis(BaseModel):
+    items: list[AnalyzedItem] = []
+
+    @field_validator("items", mode="before")
+    @classmethod
+    def _valid_items(cls, value):
+        return _keep_valid(_ANALYZED_ITEM, value)
+
+
+class PredictedExpiration(BaseModel):
+    name: str
+    storage_location: Optional[Literal["F", "R", "S"]] = Field(None, description="Echoed from the input item")
+    estimated_expiration: Optional[str] = Field(None, description="YYYY-MM-DD")
+
+    @field_validator("estimated_expiration")
+    @classmethod
+    def _iso_date(cls, value):
+        # These are learned as shelf lives, so a garbled date must not get through
+        if value is not None:
+            date.fromisoformat(value[:10])
+        return value
+
+
+_PREDICTED_EXPIRATION = TypeAdapter(PredictedExpiration)
+
+
+class ExpirationPredictions(BaseModel):
+    items: list[PredictedExpiration] = []
+
+    @field_validator("items", mode="before")
+    @classmethod
+    def _valid_items(cls, value):
+        return _keep_valid(_PREDICTED_EXPIRATION, value)
+
+
+class Recipe(BaseModel):
+    title: str
+    ingredients: list[str]
+    steps: list[str]
+    cookTime: str
+    servings: int
+    difficulty: str
@@ -0,0 +1,19 @@
+from datetime import date
+from typing import Any, Dict, Optional
+
+from db import get_supabase
+from services.executor import execute
+
+
+async def user_stats(user_uuid: str, today: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Spend / consumption / waste totals for one user, read from the rollup
+    tables a trigger on `items` keeps current (the `item_stats` function in
+    supabase/migrations). Every write updates them in the same transaction,
+    so all workers read the same numbers and a read costs one round trip
+    however many items the user has.
+    """
+    response = await execute(get_supabase().rpc(
+        "item_stats", {"p_user_uuid": user_uuid, "p_today": (today or date.today()).isoformat()}
+    ))
+    return response.data[0] if isinstance(response.data, list) else response.data
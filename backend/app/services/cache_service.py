@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+
+def content_key(*parts: bytes | str) -> str:
+    """
+    Build a content-addressed cache key from raw bytes and strings
+    (image bytes, prompt text, model name, ...).
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        # Length prefix so ("ab", "c") and ("a", "bc") never collide
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier result cache: a size-bounded in-memory LRU in front of an
+    optional SQLite store. Entries expire after `ttl_seconds` in both tiers.
+    Values written to the SQLite tier must be JSON-serializable.
+    """
+
+    def __init__(self, name: str, max_entries: int = 256, ttl_seconds: float = 7 * 24 * 3600,
+                 db_path: Optional[str] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid = os.getpid()
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " cache TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, PRIMARY KEY (cache, key))"
+            )
+            self._db.commit()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        # Caller holds the lock. A SQLite connection must not be used across
+        # fork(), and gunicorn builds the caches in the master, so each
+        # worker reopens the file on first use.
+        if self._db is not None and self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db_pid = os.getpid()
+        return self._db
+
+    def get(self, key: str, refresh: bool = False) -> Optional[Any]:
+        """
+        Look up `key`. `refresh=True` skips the memory tier when there is a
+        disk tier, for entries that another process keeps updating.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            entry = None if refresh and db is not None else self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._entries[key]
+
+            if db is not None:
+                row = db.execute(
+                    "SELECT value, expires_at FROM cache_entries WHERE cache = ? AND key = ?",
+                    (self.name, key),
+                ).fetchone()
+                if row and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self._disk_hits += 1
+                    return value
+
+            self._misses += 1
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, value)
+            db = self._connection()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO cache_entries (cache, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (self.name, key, json.dumps(value), expires_at),
+                )
+                db.commit()
+
+    def claim(self, key: str, value: Any, keep: Callable[[Any], bool]) -> tuple[bool, Any]:
+        """
+        Store `value` unless a live entry exists that `keep(entry)` says to
+        leave alone. Returns (stored, entry now under `key`). With a disk
+        tier the read and write happen in one IMMEDIATE transaction, so two
+        processes sharing the file can't both claim the same key.
+        """
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now and keep(entry[1]):
+                    return False, entry[1]
+                self._remember(key, expires_at, value)
+                return True, value
+
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT value, expires_at FROM cache_entries WHERE cache = ? AND key = ?",
+                    (self.name, key),
+                ).fetchone()
+                if row and row[1] > now:
+                    current = json.loads(row[0])
+                    if keep(current):
+                        db.commit()
+                        self._remember(key, row[1], current)
+                        return False, current
+                db.execute(
+                    "INSERT OR REPLACE INTO cache_entries (cache, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (self.name, key, json.dumps(value), expires_at),
+                )
+                db.commit()
+            except BaseException:
+                db.rollback()
+                raise
+            self._remember(key, expires_at, value)
+            return True, value
+
+    def evict_expired(self) -> int:
+        """Drop expired entries from both tiers. Returns the number of rows removed."""
+        now = time.time()
+        with self._lock:
+            stale = [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]
+            for k in stale:
+                del self._entries[k]
+            removed = len(stale)
+            db = self._connection()
+            if db is not None:
+                cur = db.execute(
+                    "DELETE FROM cache_entries WHERE cache = ? AND expires_at <= ?", (self.name, now)
+                )
+                db.commit()
+                removed += cur.rowcount
+            return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            db = self._connection()
+            if db is not None:
+                db.execute("DELETE FROM cache_entries WHERE cache = ?", (self.name,))
+                db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits + self._disk_hits) / lookups if lookups else 0.0,
+                "disk_tier": self.db_path is not None,
+            }
+
+    def _remember(self, key: str, expires_at: float, value: Any) -> None:
+        # Caller holds the lock
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def cache_from_env(name: str, prefix: str, default_size: int = 256,
+                   default_ttl: float = 7 * 24 * 3600, default_db: Optional[str] = None) -> ResultCache:
+    """
+    Build a ResultCache configured from `<PREFIX>_SIZE`, `<PREFIX>_TTL_SECONDS`
+    and `<PREFIX>_DB` (SQLite path, falling back to `default_db`; empty or
+    unset with no default disables the disk tier).
+    """
+    cache = ResultCache(
+        name,
+        max_entries=int(os.getenv(f"{prefix}_SIZE", default_size)),
+        ttl_seconds=float(os.getenv(f"{prefix}_TTL_SECONDS", default_ttl)),
+        db_path=os.getenv(f"{prefix}_DB", default_db) or None,
+    )
+    cache.evict_expired()
+    return cache
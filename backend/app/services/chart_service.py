@@ -0,0 +1,105 @@
+import asyncio
+import io
+import json
+import os
+from typing import Any, Dict, List, Literal, Optional
+
+from services.cache_service import ResultCache, content_key
+from services.executor import BoundedExecutor
+
+ChartFormat = Literal["png", "svg"]
+
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+# Rendered charts are small and fully determined by their data, so keep them in memory
+chart_cache = ResultCache(
+    "charts",
+    max_entries=int(os.getenv("CHART_CACHE_SIZE", 512)),
+    ttl_seconds=float(os.getenv("CHART_CACHE_TTL_SECONDS", 24 * 3600)),
+)
+
+
+def _init_worker() -> None:
+    # Headless backend; must be picked before pyplot is imported
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401  (pay the import once per worker)
+
+
+# matplotlib's pyplot state is global and not thread-safe, so render in
+# separate processes. Each worker handles one figure at a time.
+CHART_MAX_WORKERS = int(os.getenv("CHART_MAX_WORKERS", 2))
+
+chart_executor = BoundedExecutor("charts", CHART_MAX_WORKERS, processes=True, initializer=_init_worker)
+
+_inflight: Dict[str, "asyncio.Future[bytes]"] = {}
+
+
+def render_bar_chart(spec: Dict[str, Any], fmt: ChartFormat) -> bytes:
+    """Draw a bar chart with an average line and return the encoded image. Runs in a worker process."""
+    import matplotlib.pyplot as plt
+
+    values: List[float] = spec["values"]
+    labels: Optional[List[str]] = spec.get("labels")
+    fig, ax = plt.subplots(figsize=(8, 6))
+    try:
+        x_positions = range(len(values))
+        ax.bar(x_positions, values, color="green", alpha=0.7, label="Values")
+        if values:
+            avg_value = sum(values) / len(values)
+            ax.axhline(avg_value, color="#32a852", linestyle="--", label=f"Average: {avg_value:.2f}")
+        if labels:
+            ax.set_xticks(list(x_positions))
+            ax.set_xticklabels(labels, rotation=45, ha="right")
+        ax.set_xlabel(spec.get("xlabel", ""))
+        ax.set_ylabel(spec.get("ylabel", ""))
+        ax.set_title(spec.get("title", ""))
+        ax.legend()
+        fig.tight_layout()
+
+        buffer = io.BytesIO()
+        # Fixed metadata so the same data always encodes to the same bytes
+        metadata = {"Software": None} if fmt == "png" else {"Date": None}
+        fig.savefig(buffer, format=fmt, metadata=metadata)
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def chart_key(spec: Dict[str, Any], fmt: ChartFormat) -> str:
+    """Cache key and ETag for a chart; depends only on the data and format."""
+    return content_key("bar", fmt, json.dumps(spec, sort_keys=True, separators=(",", ":")))
+
+
+async def get_bar_chart(spec: Dict[str, Any], fmt: ChartFormat = "png") -> tuple[str, bytes]:
+    """
+    Return (key, image bytes) for a bar chart, rendering it at most once:
+    cached results are reused, and concurrent requests for the same chart
+    wait on the render already in flight.
+    """
+    key = chart_key(spec, fmt)
+    cached = chart_cache.get(key)
+    if cached is not None:
+        return key, cached
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        return key, await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        image = await chart_executor.run(render_bar_chart, spec, fmt)
+        chart_cache.set(key, image)
+        future.set_result(image)
+        return key, image
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Nobody else may be waiting; don't let the loop warn about it
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
@@ -0,0 +1,197 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Receipt fingerprints (image_service.phash, 128 bits) this many bits apart or
+# fewer count as a suspected rescan. On synthetic receipts (see
+# benchmarks/bench_receipt_dedup.py) about 60% of rescans fall within 24 bits
+# and no two receipts of different layouts did, but a third of the pairs from
+# one store (same paper and header, different items) did too, and a smaller
+# radius loses rescans as fast as look-alikes. So a match is reported, and
+# only acted on where the caller opts in (dedupe on /parse-receipt and
+# /items/ingest-receipt).
+RECEIPT_DEDUP_RADIUS = int(os.getenv("RECEIPT_DEDUP_RADIUS", 24))
+RECEIPT_DEDUP_MAX_PER_USER = int(os.getenv("RECEIPT_DEDUP_MAX_PER_USER", 1000))
+RECEIPT_DEDUP_WINDOW_SECONDS = float(os.getenv("RECEIPT_DEDUP_WINDOW_SECONDS", 7 * 24 * 3600))
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(width: int, radius: int) -> Tuple[int, ...]:
+    """Every XOR mask of `width` bits with at most `radius` bits set."""
+    return tuple(
+        sum(1 << bit for bit in bits)
+        for r in range(radius + 1)
+        for bits in itertools.combinations(range(width), r)
+    )
+
+
+class MultiIndexHashTable:
+    """
+    Hamming-distance search over fixed-width hashes (multi-index hashing).
+
+    Each hash is cut into `chunks` substrings, with one dict per substring
+    position. If two hashes are within r = s * chunks + a bits, then one of
+    the first a + 1 substrings is within s bits, or one of the others is
+    within s - 1 (pigeonhole). A query probes each dict with every
+    substring that close and computes the full distance only for what it
+    finds. When that is more probes than there are entries (small tables,
+    large radii) it compares against every entry instead.
+
+    >>> table = MultiIndexHashTable(bits=16, chunks=4)
+    >>> table.add(0b1010_1010_1010_1010, "a")
+    0
+    >>> table.add(0b0000_0000_1111_1111, "b")
+    1
+    >>> table.search(0b1010_1010_1010_1000, radius=3)
+    [(1, 'a')]
+    >>> table.search(0b0000_0000_1111_0000, radius=3)
+    []
+    >>> table.search(0b0000_0000_1111_0000, radius=4)
+    [(4, 'b')]
+    """
+
+    def __init__(self, bits: int = 128, chunks: int = 8):
+        if bits % chunks:
+            raise ValueError("bits must be a multiple of chunks")
+        self.bits = bits
+        self.chunks = chunks
+        self.width = bits // chunks
+        self._mask = (1 << self.width) - 1
+        self._tables: List[Dict[int, set[int]]] = [{} for _ in range(chunks)]
+        self._entries: Dict[int, Tuple[int, Any]] = {}
+        self._ids = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _substrings(self, value: int):
+        for i in range(self.chunks):
+            yield i, (value >> (i * self.width)) & self._mask
+
+    def add(self, value: int, payload: Any) -> int:
+        """Store `payload` under hash `value`; returns an entry id for remove()."""
+        entry_id = next(self._ids)
+        self._entries[entry_id] = (value, payload)
+        for i, sub in self._substrings(value):
+            self._tables[i].setdefault(sub, set()).add(entry_id)
+        return entry_id
+
+    def remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for i, sub in self._substrings(entry[0]):
+            bucket = self._tables[i][sub]
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._tables[i][sub]
+
+    def _probe_radii(self, radius: int) -> List[int]:
+        s, a = divmod(radius, self.chunks)
+        return [s if i <= a else s - 1 for i in range(self.chunks)]
+
+    def _candidates(self, value: int, radius: int):
+        radii = self._probe_radii(radius)
+        probes = sum(len(_flip_masks(self.width, r)) for r in radii if r >= 0)
+        if probes >= len(self._entries):
+            return self._entries.keys()
+        found: set[int] = set()
+        for (i, sub), r in zip(self._substrings(value), radii):
+            if r < 0:
+                continue
+            get = self._tables[i].get
+            for mask in _flip_masks(self.width, r):
+                bucket = get(sub ^ mask)
+                if bucket:
+                    found |= bucket
+        return found
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, Any]]:
+        """(distance, payload) for every stored hash within `radius` bits, nearest first."""
+        found = []
+        for entry_id in self._candidates(value, radius):
+            stored, payload = self._entries[entry_id]
+            distance = (stored ^ value).bit_count()
+            if distance <= radius:
+                found.append((distance, entry_id, payload))
+        found.sort(key=lambda f: (f[0], f[1]))
+        return [(distance, payload) for distance, _, payload in found]
+
+
+class NearDuplicateIndex:
+    """
+    Per-user perceptual hashes of recently scanned images, for "have I seen
+    this receipt before?" lookups. Each user keeps their `max_per_user`
+    most recent scans from the last `window_seconds`; older ones are
+    evicted, since a look-alike scanned weeks later is more likely a new
+    receipt from the same store than a rescan.
+    """
+
+    def __init__(self, radius: int, max_per_user: int, window_seconds: float, bits: int = 128, chunks: int = 8):
+        self.radius = radius
+        self.max_per_user = max_per_user
+        self.window_seconds = window_seconds
+        self.bits = bits
+        self.chunks = chunks
+        self._tables: Dict[str, MultiIndexHashTable] = {}
+        # Per user: key -> (entry id, added at), oldest first
+        self._entries: Dict[str, OrderedDict[str, Tuple[int, float]]] = {}
+        self._lock = threading.Lock()
+        self._counts = {"lookups": 0, "matches": 0}
+
+    def _evict(self, user: str, now: float) -> None:
+        # Caller holds the lock
+        table, entries = self._tables[user], self._entries[user]
+        while entries and (len(entries) > self.max_per_user or now - next(iter(entries.values()))[1] > self.window_seconds):
+            _, (entry_id, _) = entries.popitem(last=False)
+            table.remove(entry_id)
+
+    def add(self, user: str, key: str, value: int, payload: Dict[str, Any]) -> None:
+        """Remember the image `key` (a rescan of it should resolve to `payload`); re-adding replaces."""
+        now = time.time()
+        with self._lock:
+            table = self._tables.setdefault(user, MultiIndexHashTable(self.bits, self.chunks))
+            entries = self._entries.setdefault(user, OrderedDict())
+            if key in entries:
+                table.remove(entries.pop(key)[0])
+            entries[key] = (table.add(value, {**payload, "key": key}), now)
+            self._evict(user, now)
+
+    def __contains__(self, user_key: Tuple[str, str]) -> bool:
+        user, key = user_key
+        with self._lock:
+            return key in self._entries.get(user, ())
+
+    def nearest(self, user: str, value: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """(distance, payload) of the closest recent scan within `radius`, or None."""
+        with self._lock:
+            self._counts["lookups"] += 1
+            table = self._tables.get(user)
+            if table is None:
+                return None
+            self._evict(user, time.time())
+            matches = table.search(value, self.radius)
+            if not matches:
+                return None
+            self._counts["matches"] += 1
+            return matches[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counts,
+                "users": len(self._tables),
+                "entries": sum(len(e) for e in self._entries.values()),
+                "radius": self.radius,
+            }
+
+
+# Kept in process: each worker only matches rescans it parsed itself, which
+# costs an extra Gemini call at worst
+receipt_fingerprints = NearDuplicateIndex(
+    RECEIPT_DEDUP_RADIUS, RECEIPT_DEDUP_MAX_PER_USER, RECEIPT_DEDUP_WINDOW_SECONDS
+)
@@ -0,0 +1,130 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from services.inference_client import RetryLater, gemini
+from services.telemetry import timed
+
+T = TypeVar("T")
+
+# Every pool created, so shutdown_executors() can stop them all
+_executors: list["BoundedExecutor"] = []
+
+
+class BoundedExecutor:
+    """
+    Dedicated thread pool for one blocking backend (Gemini, Supabase, ...).
+    The pool size is the concurrency limit for that backend, so a burst of
+    slow Gemini calls queues here instead of stalling the event loop or
+    starving database calls.
+
+    The pool itself is created on first use, in the process that uses it.
+    Under gunicorn's preload the app is imported in the master and then
+    forked; a pool created there would hand every worker the same threads'
+    queues or, for process pools, the same call and result pipes.
+    """
+
+    def __init__(self, name: str, max_workers: int, processes: bool = False,
+                 initializer: Callable[[], None] | None = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.processes = processes
+        self.initializer = initializer
+        self._pool: Executor | None = None
+        self._pool_pid: int | None = None
+        self._lock = threading.Lock()
+        _executors.append(self)
+
+    def _create_pool(self) -> Executor:
+        if self.processes:
+            # For CPU-bound or non-thread-safe work (matplotlib). "spawn" so
+            # workers don't inherit the server's threads and locks.
+            return ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.initializer,
+            )
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name,
+                                  initializer=self.initializer)
+
+    @property
+    def pool(self) -> Executor:
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with self._lock:
+                if self._pool is None or self._pool_pid != pid:
+                    # A pool inherited across fork belongs to the parent; leave it alone
+                    self._pool, self._pool_pid = self._create_pool(), pid
+        return self._pool
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, functools.partial(fn, *args, **kwargs))
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> "Future[T]":
+        """Schedule from synchronous code, e.g. a job already running on another pool."""
+        return self.pool.submit(fn, *args, **kwargs)
+
+    def shutdown(self) -> None:
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+
+gemini_executor = BoundedExecutor("gemini", int(os.getenv("GEMINI_MAX_CONCURRENCY", 8)))
+supabase_executor = BoundedExecutor("supabase", int(os.getenv("SUPABASE_MAX_CONCURRENCY", 16)))
+
+
+async def run_gemini(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking Gemini / transcript call off the event loop. Gemini
+    retries back off here, on the event loop, so a rate-limited call
+    doesn't hold one of the pool's threads while it waits; `fn` is run
+    again from the start.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await gemini_executor.run(gemini.deferring_backoff, attempt, fn, *args, **kwargs)
+        except RetryLater as e:
+            await asyncio.sleep(e.delay)
+            attempt = e.attempt
+
+
+async def run_supabase(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking Supabase call off the event loop."""
+    return await supabase_executor.run(fn, *args, **kwargs)
+
+
+def _query_label(query) -> str:
+    # PostgREST builders carry the path ("/items", "/rpc/save_recipe") and verb;
+    # the in-memory backend keeps the table and operation
+    path = getattr(query, "path", None)
+    if path is not None:
+        return f"{getattr(query, 'http_method', '')} {path}".strip()
+    if hasattr(query, "_table"):
+        return f"{query._op} /{query._table}"
+    return f"rpc /{getattr(query, '_name', type(query).__name__)}"
+
+
+def _timed_execute(query) -> Any:
+    with timed("supabase", _query_label(query)):
+        return query.execute()
+
+
+async def execute(query) -> Any:
+    """
+    Async wrapper for a Supabase query builder, e.g.
+    `await execute(supabase.table("items").select("*").eq("user_uuid", uid))`.
+    Each call is timed in `dependency_duration_seconds{dependency="supabase"}`.
+    """
+    return await supabase_executor.run(_timed_execute, query)
+
+
+def shutdown_executors() -> None:
+    for executor in _executors:
+        executor.shutdown()
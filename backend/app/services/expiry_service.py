@@ -0,0 +1,277 @@
+import asyncio
+import bisect
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from db import get_supabase
+from services.cache_service import cache_from_env
+from services.executor import execute
+from services.telemetry import get_logger
+
+logger = get_logger("expiry")
+
+# Per-user indexes are rebuilt after this long so writes from other workers show up
+INDEX_TTL_SECONDS = float(os.getenv("EXPIRY_INDEX_TTL_SECONDS", 300))
+# How often the scheduler wakes up, and how far ahead a digest looks
+SCHEDULER_INTERVAL_SECONDS = float(os.getenv("EXPIRY_SCHEDULER_INTERVAL_SECONDS", 3600))
+DIGEST_LOOKAHEAD_DAYS = int(os.getenv("EXPIRY_DIGEST_LOOKAHEAD_DAYS", 3))
+# Only the process holding this lock builds digests; standbys retry this often
+DIGEST_LOCK_PATH = os.getenv("EXPIRY_DIGEST_LOCK", os.path.join(tempfile.gettempdir(), "gobble-expiry-digest.lock"))
+LEADER_RETRY_SECONDS = float(os.getenv("EXPIRY_DIGEST_LEADER_RETRY_SECONDS", 60))
+PAGE_SIZE = 1000  # PostgREST's default max-rows
+
+EXPIRY_COLUMNS = "id,user_uuid,name,estimated_expiration,storage_location"
+
+
+# Digests by user, plus the list of users that got one in the last run. Built
+# by one worker and served by all of them, so the SQLite tier is on by default
+digest_cache = cache_from_env(
+    "expiry_digests", "EXPIRY_DIGEST_CACHE", default_size=4096, default_ttl=2 * 24 * 3600,
+    default_db=os.path.join(tempfile.gettempdir(), "gobble-expiry-digests.sqlite"),
+)
+_DIGEST_USERS_KEY = ":users"
+
+
+def _ordinal(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def _summary(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": row.get("id"),
+        "name": row.get("name"),
+        "estimated_expiration": str(row.get("estimated_expiration"))[:10],
+        "storage_location": row.get("storage_location"),
+    }
+
+
+class ExpiryIndex:
+    """
+    One user's unconsumed items ordered by expiration date. `(ordinal, id)`
+    keys are kept sorted, so a date-window query is two bisects plus the
+    slice it returns; inserts and removals are O(log n) searches.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.built_at = time.time()
+        self.lock = threading.Lock()
+        self._items: Dict[Any, Dict[str, Any]] = {}
+        self._keys: List[tuple[int, Any]] = []
+        for row in rows:
+            ordinal = _ordinal(row.get("estimated_expiration"))
+            if ordinal is not None:
+                self._items[row.get("id")] = _summary(row)
+                self._keys.append((ordinal, row.get("id")))
+        self._keys.sort()
+
+    def add(self, rows: List[Dict[str, Any]]) -> None:
+        with self.lock:
+            for row in rows:
+                ordinal = _ordinal(row.get("estimated_expiration"))
+                if ordinal is None or row.get("consumed_at"):
+                    continue
+                self._remove(row.get("id"))
+                self._items[row.get("id")] = _summary(row)
+                bisect.insort(self._keys, (ordinal, row.get("id")))
+
+    def remove(self, item_ids: List[Any]) -> None:
+        with self.lock:
+            for item_id in item_ids:
+                self._remove(item_id)
+
+    def _remove(self, item_id) -> None:
+        # Caller holds the lock
+        item = self._items.pop(item_id, None)
+        if item is None:
+            return
+        key = (_ordinal(item["estimated_expiration"]), item_id)
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+    def window(self, start: Optional[int], end: int) -> List[Dict[str, Any]]:
+        """Items expiring in [start, end] (ordinals), soonest first; start=None means no lower bound."""
+        with self.lock:
+            lo = 0 if start is None else bisect.bisect_left(self._keys, (start,))
+            hi = bisect.bisect_left(self._keys, (end + 1,))
+            return [self._items[item_id] for _, item_id in self._keys[lo:hi]]
+
+
+_indexes: Dict[str, ExpiryIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+async def _load_rows(user_uuid: str) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    after = None
+    while True:
+        query = (
+            get_supabase().table("items").select(EXPIRY_COLUMNS)
+            .eq("user_uuid", user_uuid).is_("consumed_at", "null")
+        )
+        if after is not None:
+            query = query.gt("id", after)
+        response = await execute(query.order("id").limit(PAGE_SIZE))
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        after = page[-1]["id"]
+
+
+async def get_index(user_uuid: str) -> ExpiryIndex:
+    index = _indexes.get(user_uuid)
+    if index is None or time.time() - index.built_at > INDEX_TTL_SECONDS:
+        index = ExpiryIndex(await _load_rows(user_uuid))
+        with _indexes_lock:
+            _indexes[user_uuid] = index
+    return index
+
+
+async def expiring_items(user_uuid: str, days: int, include_expired: bool = False) -> List[Dict[str, Any]]:
+    """The user's unconsumed items expiring within `days` days, soonest first."""
+    today = date.today().toordinal()
+    index = await get_index(user_uuid)
+    return index.window(None if include_expired else today, today + days)
+
+
+class DigestScheduler:
+    """
+    Background task that batches "expiring soon" digests.
+
+    Every worker starts one, but only the process holding the lock file
+    (`lock_path`, an exclusive flock) builds digests; the others check
+    every LEADER_RETRY_SECONDS and take over when it exits, e.g. when
+    gunicorn recycles it. Each run reads the items expiring between today
+    and the end of the lookahead window, a range query over just those
+    days, so writes from any worker show up and consumed items drop out.
+    Digests go to `digest_cache`, whose SQLite tier (EXPIRY_DIGEST_CACHE_DB)
+    lets every worker serve them.
+    """
+
+    def __init__(self, lookahead_days: int = DIGEST_LOOKAHEAD_DAYS, lock_path: str = DIGEST_LOCK_PATH):
+        self.lookahead_days = lookahead_days
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _lead(self) -> bool:
+        """Take the scheduler lock if no other process holds it."""
+        if self._lock_file is not None or fcntl is None:
+            # Held already, or no flock (Windows, where only the dev server runs)
+            return True
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        logger.info("expiry digest scheduler running in this process")
+        return True
+
+    def _release(self) -> None:
+        if self._lock_file is not None:
+            # Closing the file drops the flock
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def _window_rows(self, start: date, end: date) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        after = None
+        while True:
+            query = (
+                get_supabase().table("items").select(EXPIRY_COLUMNS)
+                .gte("estimated_expiration", start.isoformat())
+                .lte("estimated_expiration", end.isoformat())
+                .is_("consumed_at", "null")
+            )
+            if after is not None:
+                query = query.gt("id", after)
+            response = await execute(query.order("id").limit(PAGE_SIZE))
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                return rows
+            after = page[-1]["id"]
+
+    async def run_once(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Build digests for everything expiring within the lookahead window."""
+        today = date.today()
+        rows = await self._window_rows(today, date.fromordinal(today.toordinal() + self.lookahead_days))
+
+        batch: Dict[str, List[Dict[str, Any]]] = {}
+        for row in sorted(rows, key=lambda r: (str(r.get("estimated_expiration"))[:10], r.get("id"))):
+            batch.setdefault(str(row.get("user_uuid")), []).append(_summary(row))
+
+        generated_at = today.isoformat()
+        for user_uuid, items in batch.items():
+            digest_cache.set(user_uuid, {"generated_at": generated_at, "items": items})
+        # Users with a digest last run but nothing in the window now get an empty one
+        for user_uuid in set(digest_cache.get(_DIGEST_USERS_KEY, refresh=True) or ()) - batch.keys():
+            digest_cache.set(user_uuid, {"generated_at": generated_at, "items": []})
+        digest_cache.set(_DIGEST_USERS_KEY, sorted(batch))
+        if batch:
+            logger.info("expiry digests built",
+                        extra={"users": len(batch), "items": sum(len(v) for v in batch.values())})
+        return batch
+
+    def digest(self, user_uuid: str) -> Optional[Dict[str, Any]]:
+        """The user's latest digest, whichever process built it."""
+        return digest_cache.get(user_uuid, refresh=True)
+
+    async def _loop(self, interval: float) -> None:
+        while True:
+            if not self._lead():
+                await asyncio.sleep(min(interval, LEADER_RETRY_SECONDS))
+                continue
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("expiry digest run failed")
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float = SCHEDULER_INTERVAL_SECONDS) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._release()
+
+
+digest_scheduler = DigestScheduler()
+
+
+def track_inserted_items(user_uuid: str, rows: List[Dict[str, Any]]) -> None:
+    """Fold freshly inserted rows into the loaded index."""
+    index = _indexes.get(user_uuid)
+    if index is not None:
+        index.add(rows)
+
+
+def untrack_items(user_uuid: str, item_ids: List[Any]) -> None:
+    """Drop consumed or deleted items from the loaded index."""
+    index = _indexes.get(user_uuid)
+    if index is not None:
+        index.remove(item_ids)
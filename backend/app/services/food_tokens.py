@@ -0,0 +1,66 @@
+import re
+from functools import lru_cache
+
+# Receipt abbreviations and spelling variants mapped to their canonical word
+ABBREVIATIONS = {
+    "chkn": "chicken", "chk": "chicken", "brst": "breast", "bnls": "boneless",
+    "grnd": "ground", "bf": "beef", "org": "organic", "veg": "vegetable",
+    "tom": "tomato", "tomatoe": "tomato", "pot": "potato", "potatoe": "potato",
+    "bnn": "banana", "strwb": "strawberry", "yog": "yogurt", "yogurts": "yogurt",
+    "chs": "cheese", "mlk": "milk", "brd": "bread",
+    "ckn": "chicken", "trky": "turkey", "sal": "salmon", "shrmp": "shrimp",
+    "lettuc": "lettuce", "avo": "avocado", "pb": "peanut butter",
+}
+
+# Words that say nothing about what the food is
+STOPWORDS = {
+    "a", "an", "and", "of", "the", "with", "in", "for", "to",
+    "organic", "fresh", "natural", "large", "small", "medium", "whole", "lg", "sm",
+    "pack", "pk", "ct", "count", "oz", "lb", "lbs", "g", "kg", "ml", "l", "gal", "qt", "pt",
+    "fl", "ea", "each", "bag", "box", "can", "jar", "bottle", "btl", "family", "size",
+    "value", "brand", "store", "great", "kirkland", "signature", "select",
+}
+
+# Plurals the suffix rules below get wrong
+IRREGULAR_SINGULARS = {
+    "cookies": "cookie", "brownies": "brownie", "smoothies": "smoothie", "pies": "pie",
+    "veggies": "veggie", "leaves": "leaf", "loaves": "loaf", "knives": "knife",
+}
+
+_NON_WORD = re.compile(r"[^a-z\s]+")
+
+
+def singularize(word: str) -> str:
+    if word in IRREGULAR_SINGULARS:
+        return IRREGULAR_SINGULARS[word]
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("oes"):
+        return word[:-2]
+    if word.endswith(("ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+@lru_cache(maxsize=8192)
+def food_tokens(name: str) -> tuple[str, ...]:
+    """
+    Normalize a food or ingredient name into canonical tokens, e.g.
+    "ORG GRND BEEF 1LB" -> ("ground", "beef").
+    """
+    tokens = []
+    for raw in _NON_WORD.sub(" ", name.lower()).split():
+        word = ABBREVIATIONS.get(raw, raw)
+        for part in word.split():
+            part = singularize(part)
+            if part not in STOPWORDS:
+                tokens.append(part)
+    return tuple(tokens)
+
+
+def normalized_name(name: str) -> str:
+    return " ".join(food_tokens(name))
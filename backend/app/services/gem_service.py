@@ -2,10 +2,7 @@ import os
 import io
 import json
 import re
-from PIL import Image
 from dotenv import load_dotenv
-import google.generativeai as genai
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound, VideoUnavailable
 
 # Extract YouTube video ID from URL
 def extract_youtube_video_id(url: str) -> str | None:
@@ -20,144 +17,522 @@ def extract_youtube_video_id(url: str) -> str | None:
             return match.group(1)
     return None
 
-# Generate recipe from video URL (YouTube only for now)
-def generate_recipe(video_url: str, platform: str) -> dict:
+def fetch_transcript(video_url: str, platform: str) -> tuple[str | None, str | None]:
+    """Return (transcript_text, error) for a video URL from YouTube captions or an earlier audio transcription."""
     transcript_text = None
     error = None
     if platform.lower() == "youtube":
         video_id = extract_youtube_video_id(video_url)
         if not video_id:
-            return {"success": False, "error": "Invalid YouTube URL or unable to extract video ID."}
+            return None, "Invalid YouTube URL or unable to extract video ID."
+        transcript_text = transcript_cache.get(video_id)
+        if transcript_text is not None:
+            return transcript_text, None
+        # Imported here so startup doesn't pay for it; most requests never need it
+        from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound, VideoUnavailable
         try:
             ytt_api = YouTubeTranscriptApi()
-            fetched_transcript = ytt_api.fetch(video_id)
+            with timed("youtube", "transcript"):
+                fetched_transcript = ytt_api.fetch(video_id)
             transcript_text = " ".join([snippet.text for snippet in fetched_transcript])
+            transcript_cache.set(video_id, transcript_text)
         except (TranscriptsDisabled, NoTranscriptFound, VideoUnavailable) as e:
             error = f"Could not fetch transcript: {str(e)}"
         except Exception as e:
             error = f"Transcript extraction error: {str(e)}"
     else:
-        error = "Only YouTube video links are supported for now."
+        # No caption API for other sites; only an earlier audio transcription can help
+        transcript_text = transcript_cache.get(video_url)
+        if transcript_text is None:
+            error = f"No captions available for {platform} videos."
+    return transcript_text, error
 
-    if not transcript_text:
-        return {"success": False, "error": error or "No transcript available.", "transcript": None}
 
-    # Send transcript to Gemini
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    prompt = (
+def partial_recipe_prompt(transcript_window: str) -> str:
+    return (
+        "You are a world-class chef AI. The following is one section of a longer cooking video transcript. "
+        "Extract only the ingredients and steps mentioned in this section, in order, and the title, cook time, servings "
+        "and difficulty if they are mentioned here. Do not invent steps from other parts of the video.\n"
+        "Return JSON ONLY in this format: { 'title': str, 'ingredients': [str], 'steps': [str], 'cookTime': str, 'servings': int, 'difficulty': str }\n"
+        "Use empty strings, 0 or empty lists for anything not in this section.\n"
+        f"Transcript section: {transcript_window}"
+    )
+
+
+def recipe_prompt(transcript_text: str) -> str:
+    return (
         "You are a world-class chef AI. Given the following transcript of a cooking video, extract and infer a complete, detailed recipe. "
         "If the transcript is incomplete, do your best to infer missing steps and ingredients. "
         "Return JSON ONLY in this format: { 'title': str, 'ingredients': [str], 'steps': [str], 'cookTime': str, 'servings': int, 'difficulty': str }\n"
         "If you cannot infer a recipe, return an empty ingredients and steps list.\n"
         f"Transcript: {transcript_text}"
     )
-    response = model.generate_content(prompt)
-    recipe = safe_parse_gemini_response(response.text)
+
+
+def split_transcript(transcript_text: str, window_chars: int, overlap_chars: int) -> list[str]:
+    """Split a transcript into overlapping windows, breaking on word boundaries."""
+    words = transcript_text.split()
+    windows, current, size = [], [], 0
+    for word in words:
+        current.append(word)
+        size += len(word) + 1
+        if size >= window_chars:
+            windows.append(" ".join(current))
+            # Carry the tail over so a step spanning the boundary is seen whole
+            tail, tail_size = [], 0
+            for w in reversed(current):
+                if tail_size >= overlap_chars:
+                    break
+                tail.insert(0, w)
+                tail_size += len(w) + 1
+            current, size = tail, tail_size
+    if current and (not windows or size > overlap_chars):
+        windows.append(" ".join(current))
+    return windows
+
+
+def merge_partial_recipes(partials: list[dict]) -> dict:
+    """
+    Reduce per-window recipes into one: first title/metadata found, ingredients
+    de-duplicated by normalized name, steps in window order with the repeats
+    caused by window overlap removed.
+    """
+    merged = {"title": "", "ingredients": [], "steps": [], "cookTime": "", "servings": 0, "difficulty": ""}
+    seen_ingredients: set[str] = set()
+    seen_steps: set[str] = set()
+    for partial in partials:
+        for field in ("title", "cookTime", "servings", "difficulty"):
+            if not merged[field] and partial.get(field):
+                merged[field] = partial[field]
+        for ingredient in partial.get("ingredients") or []:
+            key = normalized_name(str(ingredient)) or str(ingredient).lower()
+            if key not in seen_ingredients:
+                seen_ingredients.add(key)
+                merged["ingredients"].append(ingredient)
+        for step in partial.get("steps") or []:
+            key = " ".join(str(step).lower().split())
+            if key not in seen_steps:
+                seen_steps.add(key)
+                merged["steps"].append(step)
+    return merged
+
+
+def _extract_recipe(transcript_text: str) -> dict:
+    if len(transcript_text) <= RECIPE_WINDOW_CHARS:
+        response = gemini.generate(recipe_prompt(transcript_text), generation_config=json_config(Recipe))
+        return parse_structured(response.text, Recipe)
+
+    # Map: extract a partial recipe from each window in parallel. Reduce: merge locally.
+    windows = split_transcript(transcript_text, RECIPE_WINDOW_CHARS, RECIPE_WINDOW_OVERLAP)
+
+    def extract_window(window: str) -> dict:
+        response = gemini.generate(partial_recipe_prompt(window), generation_config=json_config(Recipe))
+        return parse_structured(response.text, Recipe)
+
+    with ThreadPoolExecutor(max_workers=min(RECIPE_MAP_PARALLELISM, len(windows))) as pool:
+        partials = list(pool.map(extract_window, windows))
+    partials = [p for p in partials if p]
+    return merge_partial_recipes(partials) if partials else {}
+
+
+def _recipe_cache_key(video_key: str) -> str:
+    return content_key(GEMINI_MODEL, recipe_prompt(""), video_key)
+
+
+def _recipe_from_audio(video_url: str, video_key: str, recipe_key: str, progress) -> dict:
+    """Background job: transcribe the audio track with Whisper, then extract the recipe as usual."""
+    transcript_text = transcribe_url(video_url, progress)
+    if not transcript_text:
+        raise AudioUnavailable("No speech found in the video's audio.")
+    transcript_cache.set(video_key, transcript_text)
+    progress(stage="extracting")
+    recipe = _extract_recipe(transcript_text)
+    if not recipe:
+        raise ValueError("Gemini did not return a valid recipe.")
+    recipe_cache.set(recipe_key, recipe)
+    return {"recipe": recipe, "transcript": transcript_text}
+
+
+def submit_audio_recipe(video_url: str, video_key: str, recipe_key: str) -> dict | None:
+    """
+    Queue the Whisper fallback for a video without captions and return its
+    job record (poll /gem/transcription-jobs/{id}). None when the media
+    packages aren't installed. Raises JobQueueFull when the queue is full.
+    """
+    if not audio_transcription_available():
+        return None
+    return transcription_jobs.submit(
+        recipe_key[:32], lambda progress: _recipe_from_audio(video_url, video_key, recipe_key, progress)
+    )
+
+
+# Generate recipe from video URL: YouTube captions, else a queued audio transcription
+def generate_recipe(video_url: str, platform: str) -> dict:
+    video_id = extract_youtube_video_id(video_url) if platform.lower() == "youtube" else None
+    if platform.lower() == "youtube" and not video_id:
+        return {"success": False, "error": "Invalid YouTube URL or unable to extract video ID."}
+    video_key = video_id or video_url
+    recipe_key = _recipe_cache_key(video_key)
+    cached = recipe_cache.get(recipe_key)
+    if cached is not None:
+        # Only what's cached: a hit makes no network call (transcript may be None)
+        return {"success": True, "recipe": cached, "transcript": transcript_cache.get(video_key)}
+
+    transcript_text, error = fetch_transcript(video_url, platform)
+    if not transcript_text:
+        job = submit_audio_recipe(video_url, video_key, recipe_key)
+        if job is not None and job["status"] == "done":
+            return {"success": True, **job["result"]}
+        if job is not None:
+            return {"success": False, "pending": True, "job": job, "transcript": None}
+        return {"success": False, "error": error or "No transcript available.", "transcript": None}
+
+    # Send transcript to Gemini
+    recipe = _extract_recipe(transcript_text)
     if not recipe:
         return {"success": False, "error": "Gemini did not return a valid recipe.", "transcript": transcript_text}
+    recipe_cache.set(recipe_key, recipe)
     return {"success": True, "recipe": recipe, "transcript": transcript_text}
 
+
+def stream_recipe(video_url: str, platform: str):
+    """
+    Streaming variant of generate_recipe. Yields `(event, data)` pairs as parts
+    of the recipe become parseable: `title`, one `ingredient` / `step` per list
+    entry, `meta` for cookTime/servings/difficulty, then the full `recipe`
+    (or `error`). A video without captions yields a single `job` event
+    instead: the queued audio transcription to poll.
+    """
+    video_id = extract_youtube_video_id(video_url) if platform.lower() == "youtube" else None
+    video_key = video_id or video_url
+    recipe_key = _recipe_cache_key(video_key)
+    cached = recipe_cache.get(recipe_key)
+    if cached is not None:
+        yield "recipe", cached
+        return
+
+    transcript_text, error = fetch_transcript(video_url, platform)
+    if not transcript_text:
+        job = submit_audio_recipe(video_url, video_key, recipe_key)
+        if job is not None and job["status"] == "done":
+            yield "recipe", job["result"]["recipe"]
+        elif job is not None:
+            # Transcribing takes minutes; the client polls the job instead of holding the stream
+            yield "job", job
+        else:
+            yield "error", {"error": error or "No transcript available."}
+        return
+
+    parser = IncrementalJSONParser()
+    sent_title = False
+    sent_counts = {"ingredients": 0, "steps": 0}
+    sent_meta: set[str] = set()
+    recipe = None
+
+    for chunk in gemini.generate_stream(recipe_prompt(transcript_text), generation_config=json_config(Recipe)):
+        recipe = parser.feed(chunk.text)
+        if not isinstance(recipe, dict):
+            continue
+        if not sent_title and isinstance(recipe.get("title"), str):
+            sent_title = True
+            yield "title", {"title": recipe["title"]}
+        for field, event in (("ingredients", "ingredient"), ("steps", "step")):
+            entries = recipe.get(field)
+            if isinstance(entries, list):
+                for index in range(sent_counts[field], len(entries)):
+                    yield event, {"index": index, "text": entries[index]}
+                sent_counts[field] = max(sent_counts[field], len(entries))
+        for field in ("cookTime", "servings", "difficulty"):
+            if field in recipe and field not in sent_meta:
+                sent_meta.add(field)
+                yield "meta", {field: recipe[field]}
+
+    if not recipe:
+        yield "error", {"error": "Gemini did not return a valid recipe."}
+        return
+    try:
+        recipe = Recipe.model_validate(recipe).model_dump()
+    except ValidationError as e:
+        # Never cached: a bad stream is retried next time instead of replayed
+        yield "error", {"error": "Gemini did not return a valid recipe.", "detail": e.errors(include_url=False)}
+        return
+    if parser.done:
+        recipe_cache.set(recipe_key, recipe)
+    yield "recipe", recipe
+
+
 import os
 import io
 import json
-from PIL import Image
 from dotenv import load_dotenv
-import google.generativeai as genai
 import re
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from services.cache_service import cache_from_env, content_key
+from services.dedup_service import receipt_fingerprints
+from services.image_service import PreprocessConfig, RECEIPT_PREPROCESS, PHOTO_PREPROCESS, preprocess_image
+from services.executor import run_gemini
+from services.shelf_life_service import fill_expirations, learn_expiration
+from services.json_stream import IncrementalJSONParser
+from services.food_tokens import normalized_name
+from services.inference_client import gemini, GEMINI_MODEL, GeminiUnavailable, Priority
+from services.structured_output import json_config, parse_structured
+from services.telemetry import get_logger, timed
+from services.transcription_service import AudioUnavailable, audio_transcription_available, transcribe_url, transcription_jobs
+
+logger = get_logger("gem")
+from pydantic import ValidationError
+from schemas.gemini_schema import ReceiptParse, ImageAnalysis, ExpirationPredictions, Recipe
 
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+RECEIPT_PROMPT = (
+    "You are given a receipt image. Extract structured information about each item.\n"
+    "For each item, provide:\n"
+    "1. name - the item's name\n"
+    "2. date_bought - purchase date (YYYY-MM-DD). If unavailable, use today's date\n"
+    "3. price - price in dollars. If unknown, use 0.00\n"
+    "4. estimated_expiration - expiration date for perishable items (YYYY-MM-DD). Use null if unknown or non-perishable\n"
+    "5. storage_option - automatically predict storage location: 'F' for freezer, 'R' for refrigerator, 'S' for shelf/pantry.\n"
+    "Return strictly valid JSON with double quotes, no extra text. Example:\n"
+    "{\n"
+    "  \"items\": [\n"
+    "    {\n"
+    "      \"name\": \"Milk\",\n"
+    "      \"date_bought\": \"2025-09-13\",\n"
+    "      \"price\": 3.50,\n"
+    "      \"estimated_expiration\": \"2025-09-20\",\n"
+    "      \"storage_option\": \"R\"\n"
+    "    },\n"
+    "    {\n"
+    "      \"name\": \"Canned Beans\",\n"
+    "      \"date_bought\": \"2025-09-13\",\n"
+    "      \"price\": 1.20,\n"
+    "      \"estimated_expiration\": null,\n"
+    "      \"storage_option\": \"S\"\n"
+    "    }\n"
+    "  ]\n"
+    "}\n"
+    "Do not include explanations or extra text. Predict the most likely storage for each item."
+)
+
+IMAGE_ANALYSIS_PROMPT = (
+    "1. Extract food items from the image and their estimated shelf life in days. 2. Return the number of each item in the photo"
+    "Return **ONLY** valid JSON in this format:\n"
+    '{"items": [{"name": "string", "shelf_life_days": int, "num_of_occurences": int}]}'
+)
+
+# Transcripts keyed by YouTube video ID, and generated recipes keyed by video ID
+# + prompt + model. Set TRANSCRIPT_CACHE_DB / RECIPE_CACHE_DB to persist them.
+transcript_cache = cache_from_env("youtube_transcripts", "TRANSCRIPT_CACHE", default_size=256, default_ttl=30 * 24 * 3600)
+recipe_cache = cache_from_env("video_recipes", "RECIPE_CACHE", default_size=512, default_ttl=30 * 24 * 3600)
+
+# Transcripts longer than this are summarized map-reduce style in overlapping windows
+RECIPE_WINDOW_CHARS = int(os.getenv("RECIPE_WINDOW_CHARS", 24000))
+RECIPE_WINDOW_OVERLAP = int(os.getenv("RECIPE_WINDOW_OVERLAP", 1500))
+RECIPE_MAP_PARALLELISM = int(os.getenv("RECIPE_MAP_PARALLELISM", 4))
+
+# Results of image analysis keyed by image content + prompt + model, so retried
+# uploads of the same photo skip the Gemini round trip entirely.
+analysis_cache = cache_from_env("gemini_analysis", "GEM_CACHE", default_size=512)
+
+
+def _image_key(image_bytes: bytes, prompt: str, preprocess: PreprocessConfig, schema) -> str:
+    return content_key(GEMINI_MODEL, prompt, schema.__name__, repr(preprocess), image_bytes)
+
 
-def parse_receipt(image_bytes: bytes) -> dict:
+def _cached_image_call(image_bytes: bytes, prompt: str, preprocess: PreprocessConfig, schema,
+                       priority: Priority = Priority.INTERACTIVE) -> dict:
+    key = _image_key(image_bytes, prompt, preprocess, schema)
+    cached = analysis_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with timed("pillow", "preprocess"):
+        image = preprocess_image(image_bytes, preprocess)
+    response = gemini.generate([prompt, image.as_part()], priority, json_config(schema))
+    parsed = parse_structured(response.text, schema)
+    # Don't pin failed parses; the next retry should hit Gemini again
+    if parsed:
+        analysis_cache.set(key, parsed)
+    return parsed
+
+
+def parse_receipt(image_bytes: bytes, priority: Priority = Priority.INTERACTIVE) -> dict:
     """
     Send receipt image bytes to Gemini and return structured JSON with
     automatic storage prediction.
     """
-    import io
-    from PIL import Image
+    parsed = _cached_image_call(image_bytes, RECEIPT_PROMPT, RECEIPT_PREPROCESS, ReceiptParse, priority)
+    logger.info("receipt parsed", extra={"items": len(parsed.get("items", []))})
+    return parsed
 
-    # Convert bytes to a PIL Image
-    image = Image.open(io.BytesIO(image_bytes))
 
-    model = genai.GenerativeModel("gemini-2.5-flash")
+def _remember_receipt(user_uuid: str, key: str, image_bytes: bytes, fingerprint: int,
+                      ingest_key: str | None = None) -> None:
+    receipt_fingerprints.add(user_uuid, key, fingerprint, {
+        "image_sha256": content_key(image_bytes),
+        "scanned_at": datetime.now(timezone.utc).isoformat(),
+        "ingest_key": ingest_key,
+    })
 
-    prompt = (
-        "You are given a receipt image. Extract structured information about each item.\n"
-        "For each item, provide:\n"
-        "1. name - the item's name\n"
-        "2. date_bought - purchase date (YYYY-MM-DD). If unavailable, use today's date\n"
-        "3. price - price in dollars. If unknown, use 0.00\n"
-        "4. estimated_expiration - expiration date for perishable items (YYYY-MM-DD). Use null if unknown or non-perishable\n"
-        "5. storage_option - automatically predict storage location: 'F' for freezer, 'R' for refrigerator, 'S' for shelf/pantry.\n"
-        "Return strictly valid JSON with double quotes, no extra text. Example:\n"
-        "{\n"
-        "  \"items\": [\n"
-        "    {\n"
-        "      \"name\": \"Milk\",\n"
-        "      \"date_bought\": \"2025-09-13\",\n"
-        "      \"price\": 3.50,\n"
-        "      \"estimated_expiration\": \"2025-09-20\",\n"
-        "      \"storage_option\": \"R\"\n"
-        "    },\n"
-        "    {\n"
-        "      \"name\": \"Canned Beans\",\n"
-        "      \"date_bought\": \"2025-09-13\",\n"
-        "      \"price\": 1.20,\n"
-        "      \"estimated_expiration\": null,\n"
-        "      \"storage_option\": \"S\"\n"
-        "    }\n"
-        "  ]\n"
-        "}\n"
-        "Do not include explanations or extra text. Predict the most likely storage for each item."
-    )
 
-    # Generate content
-    response = model.generate_content([prompt, image])
-    parsed = safe_parse_gemini_response(response.text)
-    print(parsed)
-    return parsed
+def parse_receipt_for_user(image_bytes: bytes, user_uuid: str,
+                           priority: Priority = Priority.INTERACTIVE,
+                           reuse: bool = False, ingest_key: str | None = None) -> tuple[dict, dict | None]:
+    """
+    parse_receipt() that also recognises rescans. The preprocessed image's
+    phash is looked up among the user's recent receipts and the closest
+    one within RECEIPT_DEDUP_RADIUS bits is reported; the image is parsed
+    anyway unless `reuse` is set, in which case the earlier parse is
+    returned without a Gemini call. Returns (parsed, match), where match
+    describes the earlier scan (None if this one is new). `ingest_key` is
+    remembered with the scan so a later match can name the rows it was
+    ingested as.
+    """
+    key = _image_key(image_bytes, RECEIPT_PROMPT, RECEIPT_PREPROCESS, ReceiptParse)
+    cached = analysis_cache.get(key)
+    if cached is not None:
+        # Parsed before, but maybe for another user, without one or under another key
+        if ingest_key is not None or (user_uuid, key) not in receipt_fingerprints:
+            with timed("pillow", "preprocess"):
+                image = preprocess_image(image_bytes, RECEIPT_PREPROCESS, fingerprint=True)
+            _remember_receipt(user_uuid, key, image_bytes, image.fingerprint, ingest_key)
+        return cached, None
 
+    with timed("pillow", "preprocess"):
+        image = preprocess_image(image_bytes, RECEIPT_PREPROCESS, fingerprint=True)
+    match = None
+    nearest = receipt_fingerprints.nearest(user_uuid, image.fingerprint)
+    if nearest is not None:
+        distance, earlier = nearest
+        match = {
+            "distance": distance,
+            "similarity": round(1 - distance / receipt_fingerprints.bits, 3),
+            "scanned_at": earlier["scanned_at"],
+            "image_sha256": earlier["image_sha256"],
+            "ingest_key": earlier["ingest_key"],
+        }
+        logger.info("receipt rescan matched", extra={"distance": distance})
+        parsed = analysis_cache.get(earlier["key"]) if reuse else None
+        # The earlier parse may have been evicted since; then parse this one afresh
+        if parsed is not None:
+            return parsed, match
 
-def predict_expirations(items_payload: dict) -> dict:
+    response = gemini.generate([RECEIPT_PROMPT, image.as_part()], priority, json_config(ReceiptParse))
+    parsed = parse_structured(response.text, ReceiptParse)
+    if parsed:
+        analysis_cache.set(key, parsed)
+        _remember_receipt(user_uuid, key, image_bytes, image.fingerprint, ingest_key)
+    logger.info("receipt parsed", extra={"items": len(parsed.get("items", []))})
+    return parsed, match
+
+
+BATCH_PARALLELISM = int(os.getenv("GEM_BATCH_PARALLELISM", 3))
+
+
+async def iter_parsed_receipts(images: list[bytes], parallelism: int = BATCH_PARALLELISM):
     """
-    Takes the user's submitted items JSON and predicts/fills in missing expiration dates
-    using Gemini, without changing other fields.
+    Parse several receipts concurrently, at most `parallelism` at a time.
+    Yields `(index, parsed, error)` in completion order.
     """
-    model = genai.GenerativeModel("gemini-2.5-flash")
+    semaphore = asyncio.Semaphore(max(1, parallelism))
 
-    prompt = (
-        "You are a food AI assistant. Here is a json with an estimated_expiration date:\n"
-        f"{json.dumps(items_payload)}\n and other items. Return the exact same JSON except for estimated_expiration date, predict a realistic expiration date based on the state of storage_location they are in (R stands for refridgerated food, F is for freezer, and S is for shelf)."
-    )
+    async def parse_one(index: int, image_bytes: bytes):
+        async with semaphore:
+            try:
+                # Quota backoff happens in the inference client; batch work queues behind single scans
+                return index, await run_gemini(parse_receipt, image_bytes, Priority.BATCH), None
+            except Exception as e:
+                return index, None, str(e)
 
-    response = model.generate_content(prompt)
-    return safe_parse_gemini_response(response.text)
+    for next_done in asyncio.as_completed([parse_one(i, data) for i, data in enumerate(images)]):
+        yield await next_done
 
-def analyze_image(image_bytes: bytes) -> dict:
-    image = Image.open(io.BytesIO(image_bytes))
-    model = genai.GenerativeModel("gemini-2.5-flash")
+
+def merge_receipt_items(parsed_receipts: list[dict]) -> dict:
+    """
+    Merge items from several parsed receipts into one list. An item that shows
+    up on more than one receipt (e.g. overlapping photos of one long receipt)
+    is kept as many times as it appears on any single receipt, so repeated
+    lines within a receipt survive but cross-receipt duplicates don't.
+    """
+    merged: dict[tuple, list[dict]] = {}
+    for parsed in parsed_receipts:
+        per_receipt: dict[tuple, list[dict]] = {}
+        for item in (parsed or {}).get("items", []):
+            name = " ".join(str(item.get("name") or "").lower().split())
+            if not name:
+                continue
+            key = (name, item.get("date_bought"), item.get("price"))
+            per_receipt.setdefault(key, []).append(item)
+        for key, items in per_receipt.items():
+            if len(items) > len(merged.get(key, [])):
+                merged[key] = items
+    return {"items": [item for items in merged.values() for item in items]}
+
+
+def predict_expirations(items_payload: dict) -> dict:
+    """
+    Fill in expiration dates for the user's submitted items without changing
+    other fields. Dates come from the local shelf-life table; only items it
+    can't match are sent to Gemini, and those answers are learned for next time.
+    """
+    items = [dict(item) for item in items_payload.get("items", [])]
+    unmatched = fill_expirations(items)
+    if not unmatched:
+        return {**items_payload, "items": items}
+
+    fallback_payload = {"items": [items[i] for i in unmatched]}
     prompt = (
-        "1. Extract food items from the image and their estimated shelf life in days. 2. Return the number of each item in the photo"
-        "Return **ONLY** valid JSON in this format:\n"
-        '{"items": [{"name": "string", "shelf_life_days": int, "num_of_occurences": int}]}'
+        "You are a food AI assistant. Here is a json with an estimated_expiration date:\n"
+        f"{json.dumps(fallback_payload)}\n and other items. Return the exact same JSON except for estimated_expiration date, predict a realistic expiration date based on the state of storage_location they are in (R stands for refridgerated food, F is for freezer, and S is for shelf)."
     )
-    response = model.generate_content([prompt, image])
-    print(safe_parse_gemini_response(response.text))
-    return safe_parse_gemini_response(response.text)
 
+    try:
+        response = gemini.generate(prompt, Priority.BACKGROUND, json_config(ExpirationPredictions))
+    except GeminiUnavailable as e:
+        # Save what the local table could fill rather than failing the whole write
+        logger.warning("expiration prediction skipped", extra={"error": str(e), "items": len(unmatched)})
+        return {**items_payload, "items": items}
+    predicted = parse_structured(response.text, ExpirationPredictions).get("items", [])
+    # Match answers to our items by name (and storage, when echoed back), never
+    # by position: the model may drop, reorder or add items, and whatever is
+    # matched here is learned for every later request
+    waiting: dict[str, list[int]] = {}
+    for i in unmatched:
+        waiting.setdefault(normalized_name(items[i].get("name") or ""), []).append(i)
+    for predicted_item in predicted:
+        if not predicted_item.get("estimated_expiration"):
+            continue
+        candidates = waiting.get(normalized_name(predicted_item["name"]), [])
+        storage = predicted_item.get("storage_location")
+        i = next((i for i in candidates if storage is None or items[i].get("storage_location") == storage), None)
+        if i is None:
+            continue
+        candidates.remove(i)
+        items[i]["estimated_expiration"] = predicted_item["estimated_expiration"]
+        learn_expiration(items[i])
+    return {**items_payload, "items": items}
 
-#fixes critical error where front end returns empty json bc there were spaces in the gemini response. Deletes any whitespace
-def safe_parse_gemini_response(response_text: str) -> dict:
+def receipt_items(parsed: dict) -> list[dict]:
     """
-    Extracts JSON object from Gemini response text safely.
+    Turn a parsed receipt into inventory items in a single pass: the receipt
+    prompt already asks for expiration and storage, so only dates the model
+    left out are filled, from the local shelf-life table (no second call).
     """
-    match = re.search(r"\{.*\}", response_text, re.DOTALL)
-    if not match:
-        print("No JSON object found in Gemini response:", response_text)
-        return {}
-    try:
-        return json.loads(match.group(0))
-    except json.JSONDecodeError:
-        print("Failed to decode JSON from Gemini response:", response_text)
-        return {}
+    items = []
+    for item in (parsed or {}).get("items", []):
+        item = dict(item)
+        item["storage_location"] = item.pop("storage_option", None) or item.get("storage_location")
+        items.append(item)
+    missing = [item for item in items if not item.get("estimated_expiration")]
+    fill_expirations(missing)
+    return items
+
+
+def analyze_image(image_bytes: bytes) -> dict:
+    result = _cached_image_call(image_bytes, IMAGE_ANALYSIS_PROMPT, PHOTO_PREPROCESS, ImageAnalysis)
+    logger.info("image analyzed", extra={"items": len(result.get("items", []))})
+    return result
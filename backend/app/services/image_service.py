@@ -0,0 +1,182 @@
+import io
+import os
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+# Upload and decode limits. Anything above these is rejected before we
+# spend memory or CPU on it.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 15 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", 60_000_000))
+
+
+class ImageRejected(ValueError):
+    """Raised when an upload is too large, too many pixels, or not an image."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class PreprocessConfig:
+    max_long_edge: int = 1600
+    grayscale: bool = False
+    format: str = "JPEG"  # JPEG or WEBP
+    quality: int = 80
+
+    @classmethod
+    def from_env(cls, prefix: str, **defaults) -> "PreprocessConfig":
+        """Read `<PREFIX>_MAX_EDGE`, `_GRAYSCALE`, `_FORMAT` and `_QUALITY` overrides."""
+        base = cls(**defaults)
+        return cls(
+            max_long_edge=int(os.getenv(f"{prefix}_MAX_EDGE", base.max_long_edge)),
+            grayscale=os.getenv(f"{prefix}_GRAYSCALE", str(base.grayscale)).lower() in ("1", "true", "yes"),
+            format=os.getenv(f"{prefix}_FORMAT", base.format).upper(),
+            quality=int(os.getenv(f"{prefix}_QUALITY", base.quality)),
+        )
+
+    @property
+    def mime_type(self) -> str:
+        return "image/webp" if self.format == "WEBP" else "image/jpeg"
+
+
+# Receipts are text on paper: grayscale loses nothing and halves the payload
+RECEIPT_PREPROCESS = PreprocessConfig.from_env("RECEIPT_IMAGE", max_long_edge=1600, grayscale=True)
+PHOTO_PREPROCESS = PreprocessConfig.from_env("PHOTO_IMAGE", max_long_edge=1280, grayscale=False)
+
+
+@dataclass
+class PreprocessedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    decode_ms: float
+    # phash() of the processed image, when preprocess_image was asked for it
+    fingerprint: Optional[int] = None
+
+    def as_part(self) -> dict:
+        """Inline blob part accepted by `GenerativeModel.generate_content`."""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+
+# Pillow loads on the first upload, not at startup. Under gunicorn the master
+# preloads it before forking; see main.preload_shared_state.
+@lru_cache(maxsize=None)
+def load_pillow():
+    """PIL.Image, with its decompression-bomb limit set to ours (once, process-wide)."""
+    from PIL import Image
+
+    # Pillow warns above this and raises DecompressionBombError above twice
+    # it; preprocess_image rejects anything above it from the header anyway
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    return Image
+
+
+@lru_cache(maxsize=None)
+def _dct_basis(size: int) -> np.ndarray:
+    i = np.arange(size)
+    return np.cos(np.pi * (2 * i[None, :] + 1) * i[:, None] / (2 * size))
+
+
+@lru_cache(maxsize=None)
+def _low_frequencies(size: int, count: int) -> tuple[np.ndarray, np.ndarray]:
+    # The `count` lowest-frequency DCT coefficients, skipping the DC term
+    coords = sorted(((u, v) for u in range(size) for v in range(size)), key=lambda c: (c[0] + c[1], c))[1:count + 1]
+    return np.array([u for u, _ in coords]), np.array([v for _, v in coords])
+
+
+def phash(image, size: int = 32, bits: int = 128) -> int:
+    """
+    Perceptual hash of a PIL image: whether each of its `bits` lowest 2D DCT
+    coefficients (of a size x size grayscale thumbnail) is above their
+    median. Low frequencies describe the overall layout, so rescans of the
+    same receipt (re-framed, slightly rotated, exposed differently) land
+    far fewer bits apart than two different receipts.
+    """
+    Image = load_pillow()
+    pixels = np.asarray(image.convert("L").resize((size, size), Image.Resampling.BOX), dtype=np.float64)
+    basis = _dct_basis(size)
+    u, v = _low_frequencies(size, bits)
+    coefficients = (basis @ pixels @ basis.T)[u, v]
+    return int.from_bytes(np.packbits(coefficients > np.median(coefficients)).tobytes(), "big")
+
+
+def preprocess_image(image_bytes: bytes, config: PreprocessConfig, fingerprint: bool = False) -> PreprocessedImage:
+    """
+    Auto-orient, downscale and re-encode an uploaded image before inference.
+    JPEG sources are decoded at reduced scale via `Image.draft`, so a 12 MP
+    phone photo never gets fully decoded. `fingerprint` also computes the
+    image's phash() for near-duplicate lookups.
+    """
+    if len(image_bytes) > MAX_UPLOAD_BYTES:
+        raise ImageRejected("Image upload is too large", status_code=413)
+
+    Image = load_pillow()
+    from PIL import ImageOps, UnidentifiedImageError
+
+    start = time.perf_counter()
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        # Header only so far; check the pixel count before decoding anything
+        width, height = image.size
+        if width * height > MAX_IMAGE_PIXELS:
+            raise ImageRejected("Image has too many pixels", status_code=413)
+
+        mode = "L" if config.grayscale else "RGB"
+        long_edge = max(width, height)
+        if long_edge > config.max_long_edge:
+            scale = config.max_long_edge / long_edge
+            # Ask for at least the target size; the JPEG decoder picks the
+            # largest 1/2, 1/4 or 1/8 reduction that still covers it
+            image.draft(mode, (max(1, int(width * scale)), max(1, int(height * scale))))
+
+        image = ImageOps.exif_transpose(image)
+        if image.mode != mode:
+            image = image.convert(mode)
+        image.thumbnail((config.max_long_edge, config.max_long_edge), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    except ImageRejected:
+        raise
+    except Image.DecompressionBombError as e:
+        raise ImageRejected(f"Image rejected: {e}", status_code=413)
+    except UnidentifiedImageError:
+        raise ImageRejected("Uploaded file is not a supported image", status_code=415)
+    except (OSError, SyntaxError, ValueError):
+        # Decoding is lazy, so a truncated or corrupt body only fails once the
+        # pixels are read; Pillow's decoders raise any of these for bad data
+        raise ImageRejected("Uploaded image is truncated or corrupt", status_code=400)
+    decode_ms = (time.perf_counter() - start) * 1000
+
+    out = io.BytesIO()
+    image.save(out, format=config.format, quality=config.quality, optimize=config.format == "JPEG")
+    return PreprocessedImage(
+        data=out.getvalue(),
+        mime_type=config.mime_type,
+        width=image.width,
+        height=image.height,
+        decode_ms=decode_ms,
+        fingerprint=phash(image) if fingerprint else None,
+    )
+
+
+async def read_upload(file, max_bytes: int = MAX_UPLOAD_BYTES, chunk_size: int = 1024 * 1024) -> bytes:
+    """
+    Read an UploadFile in chunks, bailing out as soon as it exceeds `max_bytes`
+    instead of pulling an arbitrarily large body into memory with `file.read()`.
+    """
+    if getattr(file, "size", None) is not None and file.size > max_bytes:
+        raise ImageRejected("Image upload is too large", status_code=413)
+
+    buf = bytearray()
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        buf.extend(chunk)
+        if len(buf) > max_bytes:
+            raise ImageRejected("Image upload is too large", status_code=413)
+    return bytes(buf)
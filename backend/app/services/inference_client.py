@@ -0,0 +1,342 @@
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from enum import IntEnum
+from functools import lru_cache
+from typing import Any, Callable, Iterator, Optional
+
+from dotenv import load_dotenv
+
+from services.cache_service import content_key
+from services.telemetry import get_logger, timed
+
+load_dotenv()
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+# Match these to the project's quota: steady requests per minute and burst size
+RATE_PER_MINUTE = float(os.getenv("GEMINI_RATE_PER_MINUTE", 60))
+BURST = int(os.getenv("GEMINI_BURST", 10))
+MAX_INFLIGHT = int(os.getenv("GEMINI_MAX_INFLIGHT", os.getenv("GEMINI_MAX_CONCURRENCY", 8)))
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 4))
+BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", 1.0))
+BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", 30.0))
+# Give up waiting for a rate-limit slot after this long
+ADMIT_TIMEOUT_SECONDS = float(os.getenv("GEMINI_ADMIT_TIMEOUT_SECONDS", 60.0))
+# Send a duplicate of a slow interactive request after this many seconds; 0 disables hedging
+HEDGE_AFTER_SECONDS = float(os.getenv("GEMINI_HEDGE_AFTER_SECONDS", 0))
+
+logger = get_logger("gemini")
+
+
+class Priority(IntEnum):
+    """Lower runs first when requests are queued for a rate-limit slot."""
+    INTERACTIVE = 0  # a user is waiting on the response (receipt scan, recipe)
+    BATCH = 1  # multi-receipt uploads
+    BACKGROUND = 2  # expiration predictions and other fill-ins
+
+
+class GeminiUnavailable(Exception):
+    """Gemini stayed rate-limited or unavailable after all retries."""
+
+    def __init__(self, message: str, retry_after: float = BACKOFF_MAX_SECONDS):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RetryLater(BaseException):
+    """
+    A retryable Gemini error inside InferenceClient.deferring_backoff():
+    the caller should wait `delay` seconds and run the call again as
+    `attempt`. A BaseException, like CancelledError, so service code that
+    catches Exception doesn't swallow it on the way out.
+    """
+
+    def __init__(self, delay: float, attempt: int):
+        super().__init__(f"retry in {delay:.2f}s")
+        self.delay = delay
+        self.attempt = attempt
+
+
+# google.generativeai takes about a second to import, so it (and google.api_core)
+# is loaded on the first Gemini call instead of at startup. Under gunicorn the
+# master preloads both before forking; see gunicorn.conf.py.
+@lru_cache(maxsize=None)
+def retryable_errors() -> tuple[type[Exception], ...]:
+    """Quota and transient server errors worth retrying."""
+    from google.api_core.exceptions import DeadlineExceeded, InternalServerError, ResourceExhausted, ServiceUnavailable
+    return (ResourceExhausted, ServiceUnavailable, DeadlineExceeded, InternalServerError)
+
+
+def _configure():
+    import google.generativeai as genai
+
+    options = {}
+    # Point the SDK at another server, e.g. a local fake model for tests and load runs
+    endpoint = os.getenv("GEMINI_API_ENDPOINT")
+    if endpoint:
+        options = {"transport": "rest", "client_options": {"api_endpoint": endpoint}}
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"), **options)
+    return genai
+
+
+class _Admission:
+    """
+    Token bucket plus a cap on in-flight calls, granted in priority order.
+    A waiter proceeds only when it is first in the queue, a slot is free and
+    a token is available, so background work can't jump ahead of a scan.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, max_inflight: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.max_inflight = max(1, max_inflight)
+        self._tokens = float(self.capacity)
+        self._refilled_at = time.monotonic()
+        self._inflight = 0
+        self._queue: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self, priority: int, timeout: float) -> None:
+        entry = (int(priority), next(self._seq))
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    self._refill()
+                    if self._queue[0] == entry and self._inflight < self.max_inflight and self._tokens >= 1:
+                        heapq.heappop(self._queue)
+                        self._tokens -= 1
+                        self._inflight += 1
+                        # The next waiter may be able to go too
+                        self._cond.notify_all()
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise GeminiUnavailable("Timed out waiting for a Gemini rate-limit slot",
+                                                retry_after=1 / self.rate if self.rate else BACKOFF_MAX_SECONDS)
+                    wait_for = remaining
+                    if self._tokens < 1 and self.rate:
+                        wait_for = min(wait_for, (1 - self._tokens) / self.rate)
+                    self._cond.wait(wait_for)
+            except BaseException:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+                raise
+
+    def release(self) -> None:
+        with self._cond:
+            self._inflight -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._refill()
+            return {"inflight": self._inflight, "queued": len(self._queue), "tokens": round(self._tokens, 2)}
+
+
+def _part_key(part: Any) -> bytes | str:
+    if isinstance(part, dict):
+        return content_key(str(part.get("mime_type")), part.get("data") or b"")
+    return str(part)
+
+
+class InferenceClient:
+    """
+    The one way this backend talks to Gemini.
+
+    - one cached `GenerativeModel` instead of one per call
+    - a token bucket and in-flight cap matched to the quota, served in
+      `Priority` order
+    - retries with exponential backoff and full jitter on quota / 5xx errors,
+      then `GeminiUnavailable` (routes turn it into 503 + Retry-After); under
+      `deferring_backoff` the wait is left to the async caller (run_gemini)
+      instead of sleeping in a pool thread
+    - identical concurrent requests share one call (single-flight)
+    - optional hedging: a slow interactive request gets a second copy and
+      the first answer wins
+
+    `model_factory` builds the model from its name; tests and load runs pass
+    a fake (or set GEMINI_API_ENDPOINT to a local fake server).
+    """
+
+    def __init__(
+        self,
+        model_name: str = GEMINI_MODEL,
+        model_factory: Optional[Callable[[str], Any]] = None,
+        rate_per_minute: float = RATE_PER_MINUTE,
+        burst: int = BURST,
+        max_inflight: int = MAX_INFLIGHT,
+        max_retries: int = MAX_RETRIES,
+        hedge_after: float = HEDGE_AFTER_SECONDS,
+    ):
+        self.model_name = model_name
+        self.max_retries = max_retries
+        self.hedge_after = hedge_after
+        self._model_factory = model_factory
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._admission = _Admission(rate_per_minute, burst, max_inflight)
+        self._inflight: dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max(2, max_inflight), thread_name_prefix="gemini-hedge")
+        self._counts = {"calls": 0, "coalesced": 0, "retries": 0, "hedged": 0, "failures": 0}
+        # Per thread: the attempt number while inside deferring_backoff(), else None
+        self._local = threading.local()
+
+    def _count(self, name: str) -> None:
+        with self._inflight_lock:
+            self._counts[name] += 1
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    if self._model_factory is None:
+                        self._model = _configure().GenerativeModel(self.model_name)
+                    else:
+                        self._model = self._model_factory(self.model_name)
+        return self._model
+
+    def generate(self, contents: Any, priority: Priority = Priority.INTERACTIVE,
+                 generation_config: Optional[dict] = None) -> Any:
+        """Blocking `generate_content` with admission, retries, coalescing and hedging."""
+        parts = contents if isinstance(contents, list) else [contents]
+        key = content_key(self.model_name, json.dumps(generation_config, sort_keys=True),
+                          *(_part_key(p) for p in parts))
+        with self._inflight_lock:
+            leader = key not in self._inflight
+            if leader:
+                self._inflight[key] = Future()
+            future = self._inflight[key]
+        if not leader:
+            self._count("coalesced")
+            try:
+                return future.result()
+            except RetryLater:
+                # The call we joined backs off in its own caller; make our own
+                return self.generate(contents, priority, generation_config)
+
+        # Unregister before settling the future: a follower woken by it that
+        # calls generate() again must start a new call, not rejoin this one
+        try:
+            result = self._with_retries(lambda: self._hedged(contents, priority, generation_config), priority)
+        except BaseException as e:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+        future.set_result(result)
+        return result
+
+    def generate_stream(self, contents: Any, priority: Priority = Priority.INTERACTIVE,
+                        generation_config: Optional[dict] = None) -> Iterator[Any]:
+        """Streaming `generate_content`. Retries only cover opening the stream."""
+        def open_stream():
+            self._admission.acquire(priority, ADMIT_TIMEOUT_SECONDS)
+            try:
+                self._count("calls")
+                with timed("gemini", "stream_open"):
+                    stream = iter(self.model.generate_content(contents, generation_config=generation_config, stream=True))
+                    # Errors like quota exhaustion surface on the first chunk
+                    first = next(stream, None)
+                return stream, first
+            except BaseException:
+                self._admission.release()
+                raise
+
+        # The stream is opened inside the caller's generator, which can't be
+        # re-run from outside, so this one backs off in place
+        stream, first = self._with_retries(open_stream, priority, defer=False)
+        try:
+            if first is not None:
+                yield first
+            yield from stream
+        finally:
+            self._admission.release()
+
+    def _call_once(self, contents: Any, priority: Priority, generation_config: Optional[dict]) -> Any:
+        self._admission.acquire(priority, ADMIT_TIMEOUT_SECONDS)
+        try:
+            self._count("calls")
+            with timed("gemini", "generate"):
+                return self.model.generate_content(contents, generation_config=generation_config)
+        finally:
+            self._admission.release()
+
+    def _hedged(self, contents: Any, priority: Priority, generation_config: Optional[dict]) -> Any:
+        if not self.hedge_after or priority != Priority.INTERACTIVE:
+            return self._call_once(contents, priority, generation_config)
+        primary = self._hedge_pool.submit(self._call_once, contents, priority, generation_config)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        self._count("hedged")
+        backup = self._hedge_pool.submit(self._call_once, contents, priority, generation_config)
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    return attempt.result()
+                error = attempt.exception()
+        raise error
+
+    def _with_retries(self, call: Callable[[], Any], priority: Priority, defer: bool = True) -> Any:
+        deferred = getattr(self._local, "attempt", None) if defer else None
+        for attempt in range(deferred or 0, self.max_retries + 1):
+            try:
+                return call()
+            except retryable_errors() as e:
+                if attempt == self.max_retries:
+                    self._count("failures")
+                    raise GeminiUnavailable(f"Gemini unavailable after {attempt + 1} attempts: {e}") from e
+                self._count("retries")
+                logger.warning("gemini retry", extra={"attempt": attempt + 1, "error": str(e)})
+                # Full jitter keeps a burst of 429s from retrying in lockstep
+                delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+                if deferred is not None:
+                    raise RetryLater(delay, attempt + 1) from e
+                time.sleep(delay)
+
+    def deferring_backoff(self, attempt: int, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run `fn` with its generate() retries handed back to the caller: a
+        retryable error raises RetryLater instead of sleeping in this
+        thread. Attempts count from `attempt`, so the caller's re-runs share
+        one retry budget.
+        """
+        self._local.attempt = attempt
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._local.attempt = None
+
+    def stats(self) -> dict:
+        with self._inflight_lock:
+            counts = dict(self._counts)
+        return {"model": self.model_name, **counts, **self._admission.stats()}
+
+    def shutdown(self) -> None:
+        self._hedge_pool.shutdown(wait=False, cancel_futures=True)
+
+
+gemini = InferenceClient()
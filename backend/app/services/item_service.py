@@ -1,46 +1,238 @@
-from datetime import datetime
-from supabase import create_client, Client
 import os
-from dotenv import load_dotenv
-from typing import Optional, Dict, Any
-import asyncio
+import tempfile
+import uuid
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+from db import get_supabase
+from services.cache_service import cache_from_env
+from services.executor import execute
+from services.expiry_service import track_inserted_items, untrack_items
+from services.matching_service import index_inserted_items, unindex_items
 
-# Load environment variables
-load_dotenv()
 
-# Initialize Supabase client
-supabase: Client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+def _item_row(user_uuid: str, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    name: Optional[str] = item.get("name")
+    if not name:
+        return None
 
-async def insert_items_into_supabase(user_uuid: str, items_json: Dict[str, Any]) -> Dict[str, Any]:
-    """Insert items into Supabase with user association"""
-    rows_to_insert = []
+    date_str: Optional[str] = item.get("date_bought")
+    date_bought = date_str if date_str else datetime.today().strftime("%Y-%m-%d")
+
+    return {
+        "user_uuid": user_uuid,
+        "name": name,
+        "date_bought": date_bought,
+        "price": item.get("price", 0.0),
+        "estimated_expiration": item.get("estimated_expiration"),
+        "storage_location": item.get("storage_location"),
+    }
+
+
+# Per-user change marker behind the /get-items ETag: a random tag, replaced
+# after every write made through this module, plus the newest updated_at for
+# the sync cursor. The disk tier is what every worker reads, so a write in one
+# worker changes the ETag in all of them; the TTL bounds how long a write made
+# outside the app (e.g. in the Supabase dashboard) can go unnoticed.
+item_versions = cache_from_env(
+    "item_versions", "ITEM_VERSION_CACHE", default_size=4096, default_ttl=600,
+    default_db=os.path.join(tempfile.gettempdir(), "gobble-item-versions.sqlite"),
+)
 
-    for item in items_json.get("items", []):
-        name: Optional[str] = item.get("name")
-        if not name:
-            continue
 
-        date_str: Optional[str] = item.get("date_bought")
-        date_bought = date_str if date_str else datetime.today().strftime("%Y-%m-%d")
+def _bump_items_version(user_uuid: str, rows: List[Dict[str, Any]]) -> None:
+    current = item_versions.get(user_uuid, refresh=True)
+    if current is None:
+        return  # the next items_version() reads it from the database
+    stamps = [row["updated_at"] for row in rows if row.get("updated_at")]
+    if current["latest"]:
+        stamps.append(current["latest"])
+    # A racing writer can leave `latest` a little behind; an early sync
+    # cursor only re-sends rows, it never skips any
+    item_versions.set(user_uuid, {"tag": uuid.uuid4().hex, "latest": max(stamps, default=None)})
 
-        row = {
-            "user_uuid": user_uuid,
-            "name": name,
-            "date_bought": date_bought,
-            "price": item.get("price", 0.0),
-            "estimated_expiration": item.get("estimated_expiration"),
-            "storage_location": item.get("storage_location"),
-        }
 
-        rows_to_insert.append(row)
+def _items_written(user_uuid: str, rows: List[Dict[str, Any]]) -> None:
+    """Fold new rows into the in-memory expiry and recipe-matching indexes."""
+    if rows:
+        _bump_items_version(user_uuid, rows)
+    track_inserted_items(user_uuid, rows)
+    index_inserted_items(user_uuid, rows)
+
+
+def _items_changed(user_uuid: str, after: List[Dict[str, Any]], deleted: List[Dict[str, Any]]) -> None:
+    """Apply edited (as they are now) and deleted rows to the same indexes."""
+    if after or deleted:
+        _bump_items_version(user_uuid, after)
+    ids = [row.get("id") for row in (*after, *deleted)]
+    untrack_items(user_uuid, ids)
+    unindex_items(user_uuid, ids)
+    # Re-added as they are now; consumed rows are skipped by both
+    track_inserted_items(user_uuid, after)
+    index_inserted_items(user_uuid, after)
+
+
+async def insert_items_into_supabase(user_uuid: str, items_json: Dict[str, Any]) -> Dict[str, Any]:
+    """Insert items into Supabase with user association"""
+    rows_to_insert = [row for row in (_item_row(user_uuid, item) for item in items_json.get("items", [])) if row]
 
     if not rows_to_insert:
         return {"status": "no items to insert"}
 
     try:
-        # Run synchronous Supabase insert in a thread to avoid blocking the event loop
-        response = await asyncio.to_thread(lambda: supabase.table("items").insert(rows_to_insert).execute())
+        # Run synchronous Supabase insert on the Supabase executor to avoid blocking the event loop
+        response = await execute(get_supabase().table("items").insert(rows_to_insert))
+        _items_written(user_uuid, response.data or [])
         return {"status": "success", "result": response.data}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+
+async def fetch_ingested_items(user_uuid: str, ingest_key: str) -> List[Dict[str, Any]]:
+    """Rows already written for an upload key, in receipt line order."""
+    response = await execute(
+        get_supabase().table("items").select(",".join(ITEM_FIELDS))
+        .eq("user_uuid", user_uuid).eq("ingest_key", ingest_key).order("ingest_line")
+    )
+    return response.data or []
+
+
+async def ingest_items_into_supabase(user_uuid: str, items: List[Dict[str, Any]], ingest_key: str) -> List[Dict[str, Any]]:
+    """
+    Bulk insert one receipt's items, idempotently: each row carries
+    (ingest_key, line number) and the unique index on them turns a retried
+    upload into a no-op. Returns every row stored for the key.
+    """
+    rows = []
+    for line, item in enumerate(items):
+        row = _item_row(user_uuid, item)
+        if row:
+            rows.append({**row, "ingest_key": ingest_key, "ingest_line": line})
+    if not rows:
+        return []
+    response = await execute(
+        get_supabase().table("items")
+        .upsert(rows, on_conflict="user_uuid,ingest_key,ingest_line", ignore_duplicates=True)
+    )
+    # Only rows that were actually new come back; a concurrent retry gets []
+    _items_written(user_uuid, response.data or [])
+    if len(response.data or []) == len(rows):
+        return response.data
+    return await fetch_ingested_items(user_uuid, ingest_key)
+
+
+
+# Columns clients may ask for with `fields=`; `id` is always returned for paging
+ITEM_FIELDS = ("id", "name", "date_bought", "estimated_expiration", "price", "storage_location", "user_uuid", "updated_at", "consumed_at")
+
+
+async def fetch_items(
+    user_uuid: str,
+    limit: Optional[int] = None,
+    after: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+    storage_location: Optional[str] = None,
+    expiring_before: Optional[str] = None,
+    since: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Read a user's items in id order, optionally one keyset page at a time
+    (`after` = last id seen), projected to `fields` and filtered server-side.
+    `since` returns only rows changed after that `updated_at` timestamp.
+    """
+    columns = ",".join(dict.fromkeys(["id", *(fields or ITEM_FIELDS)]))
+    query = get_supabase().table("items").select(columns).eq("user_uuid", user_uuid)
+    if after is not None:
+        query = query.gt("id", after)
+    if storage_location:
+        query = query.eq("storage_location", storage_location)
+    if expiring_before:
+        query = query.lt("estimated_expiration", expiring_before)
+    if since:
+        query = query.gt("updated_at", since)
+    query = query.order("id")
+    if limit is not None:
+        query = query.limit(limit)
+    response = await execute(query)
+    return response.data or []
+
+
+async def items_version(user_uuid: str) -> tuple[str, Optional[str]]:
+    """
+    Change marker for a user's inventory: (tag, latest updated_at). Served
+    from `item_versions`; the database is only asked when the user has no
+    live entry, and whatever entry a concurrent write stored first wins.
+    """
+    version = item_versions.get(user_uuid, refresh=True)
+    if version is None:
+        response = await execute(
+            get_supabase().table("items").select("updated_at")
+            .eq("user_uuid", user_uuid).order("updated_at", desc=True).limit(1)
+        )
+        latest = response.data[0]["updated_at"] if response.data else None
+        _, version = item_versions.claim(
+            user_uuid, {"tag": uuid.uuid4().hex, "latest": latest}, keep=lambda current: True
+        )
+    return version["tag"], version["latest"]
+
+
+def collapse_changes(changes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Fold a batch of `update` / `consume` / `delete` changes into one entry
+    per item, in first-seen order: later `set` fields win, consume sticks,
+    and delete absorbs everything else. The first `version` given for an
+    item is the one checked.
+
+    >>> collapse_changes([
+    ...     {"op": "update", "id": 1, "version": "v1", "set": {"storage_location": "F"}},
+    ...     {"op": "update", "id": 1, "set": {"storage_location": "R", "price": 2.5}},
+    ...     {"op": "consume", "id": 2},
+    ...     {"op": "consume", "id": 1},
+    ...     {"op": "update", "id": 2, "set": {"name": "Milk"}},
+    ...     {"op": "delete", "id": 2, "version": "v7"},
+    ... ])  # doctest: +NORMALIZE_WHITESPACE
+    [{'id': 1, 'version': 'v1', 'set': {'storage_location': 'R', 'price': 2.5}, 'consume': True, 'delete': False},
+     {'id': 2, 'version': 'v7', 'set': {}, 'consume': False, 'delete': True}]
+    """
+    merged: Dict[Any, Dict[str, Any]] = {}
+    for change in changes:
+        entry = merged.setdefault(change["id"], {"id": change["id"], "version": None, "set": {}, "consume": False, "delete": False})
+        if entry["version"] is None:
+            entry["version"] = change.get("version")
+        if entry["delete"]:
+            continue
+        if change["op"] == "delete":
+            entry.update({"set": {}, "consume": False, "delete": True})
+        elif change["op"] == "consume":
+            entry["consume"] = True
+        entry["set"].update(change.get("set") or {})
+    return list(merged.values())
+
+
+async def apply_item_changes(user_uuid: str, changes: List[Dict[str, Any]], atomic: bool = False) -> Dict[str, Any]:
+    """
+    Apply a batch of item edits, consumes and deletes in one database round
+    trip (the `bulk_mutate_items` function): one UPDATE and one DELETE
+    however many items are involved, and rows whose values wouldn't change
+    aren't written. Changes carrying a `version` (the row's `updated_at` as
+    the client last saw it) are skipped and returned under `conflicts` if
+    the row has changed since; with `atomic` a conflict skips the batch.
+    """
+    collapsed = collapse_changes(changes)
+    response = await execute(get_supabase().rpc(
+        "bulk_mutate_items", {"p_user_uuid": user_uuid, "p_changes": collapsed, "p_atomic": atomic}
+    ))
+    result = response.data or {}
+    updated, deleted = result.get("updated") or [], result.get("deleted") or []
+    conflicts = result.get("conflicts") or []
+    _items_changed(user_uuid, updated, deleted)
+
+    applied = not (atomic and conflicts)
+    settled = {row["id"] for row in updated} | {row["id"] for row in deleted} | {c["id"] for c in conflicts}
+    return {
+        "status": "conflict" if conflicts else "success",
+        "applied": applied,
+        "updated": updated,
+        "deleted": [row["id"] for row in deleted],
+        "unchanged": [c["id"] for c in collapsed if c["id"] not in settled] if applied else [],
+        "conflicts": conflicts,
+    }
@@ -0,0 +1,123 @@
+import json
+from typing import Any, Optional
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class IncrementalJSONParser:
+    """
+    Parse a JSON object that arrives in chunks (e.g. a streamed model response).
+
+    `feed()` returns the largest prefix of the object that is complete so far,
+    with unfinished strings, numbers and keys dropped and open containers
+    closed. Partial values never show up, so a list only grows by whole
+    elements. Text before the first `{` (like a ```json fence) is skipped.
+    Each character is scanned once across all feeds.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._started = False
+        self._start = 0
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._string_is_key = False
+        self._expect_key = False  # inside an object, the next string is a key
+        self._in_scalar = False  # inside a number / true / false / null
+        # (buffer index, closers) of the last point where the prefix is valid JSON
+        self._safe: Optional[tuple[int, str]] = None
+        self._done = False
+        self._cached: tuple[Optional[tuple[int, str]], Any] = (None, None)
+
+    @property
+    def done(self) -> bool:
+        """True once the top-level object has been closed."""
+        return self._done
+
+    def feed(self, chunk: str) -> Optional[Any]:
+        self.buffer += chunk
+        self._scan()
+        return self.snapshot()
+
+    def snapshot(self) -> Optional[Any]:
+        if self._safe is None:
+            return None
+        if self._cached[0] == self._safe:
+            return self._cached[1]
+        end, closers = self._safe
+        try:
+            value = json.loads(self.buffer[self._start:end] + closers)
+        except json.JSONDecodeError:
+            value = None
+        self._cached = (self._safe, value)
+        return value
+
+    def _mark_safe(self, index: int) -> None:
+        self._safe = (index, "".join(_CLOSERS[c] for c in reversed(self._stack)))
+
+    def _end_value(self, index: int) -> None:
+        # A value just ended at `index`; in an object the next string is a key again
+        if self._stack and self._stack[-1] == "{":
+            self._expect_key = True
+        self._mark_safe(index)
+
+    def _scan(self) -> None:
+        buf = self.buffer
+        while self._pos < len(buf) and not self._done:
+            i = self._pos
+            ch = buf[i]
+            self._pos += 1
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._start = i
+                    self._stack.append("{")
+                    self._expect_key = True
+                    self._mark_safe(i + 1)
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        self._expect_key = False
+                    else:
+                        self._end_value(i + 1)
+                continue
+
+            if self._in_scalar:
+                if ch in ",]} \t\r\n":
+                    self._in_scalar = False
+                    self._end_value(i)
+                else:
+                    continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_is_key = self._expect_key and self._stack[-1] == "{"
+            elif ch in "{[":
+                self._stack.append(ch)
+                self._expect_key = ch == "{"
+                self._mark_safe(i + 1)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if not self._stack:
+                    self._safe = (i + 1, "")
+                    self._done = True
+                else:
+                    self._end_value(i + 1)
+            elif ch in "-0123456789tfn":
+                self._in_scalar = True
+
+
+def parse_partial_json(text: str) -> Optional[Any]:
+    """One-shot version of IncrementalJSONParser: best-effort parse of truncated JSON."""
+    return IncrementalJSONParser().feed(text)
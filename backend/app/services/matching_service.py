@@ -0,0 +1,314 @@
+import heapq
+import os
+import re
+import threading
+import time
+from datetime import date
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from db import get_supabase
+from services.executor import execute
+from services.food_tokens import food_tokens
+from services.shelf_life_service import SHELF_LIFE_TABLE
+
+# Rebuild per-user indexes after this long so writes from other workers show up
+INDEX_TTL_SECONDS = float(os.getenv("MATCHING_INDEX_TTL_SECONDS", 300))
+PAGE_SIZE = 1000  # PostgREST's default max-rows
+
+# Measures and preparation words in recipe ingredient lines
+INGREDIENT_STOPWORDS = {
+    "cup", "tbsp", "tsp", "tablespoon", "teaspoon", "pinch", "dash", "clove", "slice", "piece",
+    "handful", "sprig", "stick", "inch", "cm", "about", "plus", "more", "optional", "taste",
+    "chopped", "diced", "minced", "sliced", "grated", "shredded", "crushed", "peeled",
+    "cubed", "halved", "quartered", "julienned", "melted", "softened", "beaten", "cooked", "raw",
+    "finely", "roughly", "thinly", "freshly", "lightly", "packed", "divided", "room", "temperature",
+    "cold", "warm", "extra", "virgin", "boneless", "skinless", "ripe", "pound", "ounce",
+    "gram", "package", "bunch",
+}
+
+# Always assumed to be in the kitchen; never count against a recipe
+STAPLE_TOKENS = {"salt", "water", "ice", "pepper", "black", "kosher", "sea", "table"}
+
+# Multi-word foods that must match as a whole ("peanut butter" is not "butter")
+EXTRA_COMPOUNDS = (
+    "olive oil", "vegetable oil", "sesame oil", "bell pepper", "brown sugar", "powdered sugar",
+    "baking soda", "baking powder", "coconut milk", "chicken broth", "chicken stock",
+    "beef broth", "vegetable broth", "tomato sauce", "tomato paste", "lemon juice", "lime juice",
+    "maple syrup", "fish sauce", "oyster sauce", "sesame seed", "chili powder", "garlic powder",
+)
+_COMPOUNDS = frozenset(
+    tokens
+    for phrases in [EXTRA_COMPOUNDS, *(keywords for keywords, _, _ in SHELF_LIFE_TABLE.values())]
+    for tokens in (food_tokens(p) for p in phrases)
+    if len(tokens) > 1
+)
+_LONGEST_COMPOUND = max(len(c) for c in _COMPOUNDS)
+
+_PARENTHETICAL = re.compile(r"\([^)]*\)")
+
+
+def _food_parts(tokens: tuple[str, ...]) -> tuple[str, ...]:
+    """The tokens in order, with each known compound food joined into one part."""
+    parts, i = [], 0
+    while i < len(tokens):
+        for size in range(min(_LONGEST_COMPOUND, len(tokens) - i), 1, -1):
+            if tokens[i:i + size] in _COMPOUNDS:
+                parts.append(" ".join(tokens[i:i + size]))
+                i += size
+                break
+        else:
+            parts.append(tokens[i])
+            i += 1
+    return tuple(parts)
+
+
+@lru_cache(maxsize=8192)
+def item_keys(name: str) -> frozenset[str]:
+    """
+    Canonical keys an inventory item provides: compound foods found in the
+    name, plus every remaining token ("CHKN BRST BNLS" -> chicken, breast,
+    boneless; "peanut butter" -> only "peanut butter").
+    """
+    return frozenset(_food_parts(food_tokens(name)))
+
+
+@lru_cache(maxsize=8192)
+def ingredient_key(line: str) -> Optional[str]:
+    """
+    Canonical key for a recipe ingredient line: its whole normalized noun
+    phrase, measures and preparation words dropped. An item covers it only
+    if it provides every part of the phrase (`item_keys(key)`), so a
+    modifier can't be ignored. None for pantry staples.
+
+    >>> ingredient_key("2 boneless chicken breasts, cut into strips")
+    'chicken breast'
+    >>> ingredient_key("1 tbsp extra virgin olive oil")
+    'olive oil'
+    >>> ingredient_key("Salt and pepper to taste") is None
+    True
+    >>> item_keys("Turkey breast") >= item_keys("chicken breast")
+    False
+    >>> item_keys("CHKN BRST BNLS") >= item_keys("chicken breast")
+    True
+    """
+    text = _PARENTHETICAL.sub(" ", line).split(",")[0]
+    tokens = tuple(t for t in food_tokens(text) if t not in INGREDIENT_STOPWORDS)
+    if not tokens or set(tokens) <= STAPLE_TOKENS:
+        return None
+    return " ".join(_food_parts(tokens))
+
+
+class RecipeIndex:
+    """
+    Inverted index from canonical ingredient key to the user's recipes that
+    need it, with each key also filed under its last part (`by_head`).
+    Ranking only walks the keys filed under parts the user actually has,
+    so the cost tracks the inventory, not recipes x ingredients x items.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.built_at = time.time()
+        self.lock = threading.Lock()
+        self.recipes: Dict[Any, Dict[str, Any]] = {}
+        self.postings: Dict[str, set] = {}
+        self.by_head: Dict[str, set] = {}
+        for row in rows:
+            self._add(row["id"], row.get("title"), [i["ingredient"] for i in row.get("recipe_ingredients") or []])
+
+    def add(self, recipe_id, title: Optional[str], ingredients: List[str]) -> None:
+        with self.lock:
+            self._add(recipe_id, title, ingredients)
+
+    def _add(self, recipe_id, title, ingredients) -> None:
+        # Caller holds the lock (or is the constructor)
+        needs: Dict[str, str] = {}
+        for line in ingredients:
+            key = ingredient_key(line)
+            if key:
+                needs.setdefault(key, line)
+        self.recipes[recipe_id] = {"title": title, "needs": needs}
+        for key in needs:
+            self.postings.setdefault(key, set()).add(recipe_id)
+            self.by_head.setdefault(key.rsplit(" ", 1)[-1], set()).add(key)
+
+    def covered(self, have: Dict[frozenset, Optional[int]]) -> Dict[str, Optional[int]]:
+        """
+        Ingredient keys some item covers (provides every part of), each with
+        the soonest expiration among the items covering it. Caller holds the lock.
+        """
+        covered: Dict[str, Optional[int]] = {}
+        for keys, expires in have.items():
+            for part in keys:
+                for key in self.by_head.get(part.rsplit(" ", 1)[-1], ()):
+                    if keys >= item_keys(key):
+                        _note_soonest(covered, key, expires)
+        return covered
+
+    def remove(self, recipe_id) -> None:
+        with self.lock:
+            recipe = self.recipes.pop(recipe_id, None)
+            for key in (recipe or {}).get("needs", {}):
+                self.postings.get(key, set()).discard(recipe_id)
+
+
+def _note_soonest(soonest: Dict[Any, Optional[int]], key, expires: Optional[int]) -> None:
+    current = soonest.get(key)
+    if key not in soonest or current is None or (expires is not None and expires < current):
+        soonest[key] = expires
+
+
+class Inventory:
+    """
+    A user's unconsumed items as their item_keys() set -> soonest expiration
+    ordinal (or None). Keys stay grouped per item so an ingredient is only
+    covered by one item providing all of its parts, never by several
+    items' parts combined.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.built_at = time.time()
+        self.lock = threading.Lock()
+        self.items: Dict[Any, tuple[frozenset[str], Optional[int]]] = {}
+        self.soonest: Dict[frozenset[str], Optional[int]] = {}
+        self._dirty = False
+        self._add(rows)
+
+    def add(self, rows: List[Dict[str, Any]]) -> None:
+        with self.lock:
+            self._add(rows)
+
+    def _add(self, rows) -> None:
+        for row in rows:
+            if row.get("consumed_at"):
+                continue
+            entry = (item_keys(row.get("name") or ""), _ordinal(row.get("estimated_expiration")))
+            self.items[row.get("id")] = entry
+            _note_soonest(self.soonest, *entry)
+
+    def remove(self, item_ids: List[Any]) -> None:
+        with self.lock:
+            for item_id in item_ids:
+                if self.items.pop(item_id, None) is not None:
+                    self._dirty = True
+
+    def keys(self) -> Dict[frozenset[str], Optional[int]]:
+        with self.lock:
+            if self._dirty:
+                # A minimum can't be un-applied; recompute from the remaining items
+                self.soonest = {}
+                for keys, expires in self.items.values():
+                    _note_soonest(self.soonest, keys, expires)
+                self._dirty = False
+            return dict(self.soonest)
+
+
+def _ordinal(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+_recipe_indexes: Dict[str, RecipeIndex] = {}
+_inventories: Dict[str, Inventory] = {}
+_lock = threading.Lock()
+
+
+async def _load_pages(query_for_page) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    after = None
+    while True:
+        query = query_for_page()
+        if after is not None:
+            query = query.gt("id", after)
+        response = await execute(query.order("id").limit(PAGE_SIZE))
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        after = page[-1]["id"]
+
+
+async def _get_recipe_index(user_uuid: str) -> RecipeIndex:
+    index = _recipe_indexes.get(user_uuid)
+    if index is None or time.time() - index.built_at > INDEX_TTL_SECONDS:
+        rows = await _load_pages(lambda: get_supabase().table("recipes")
+                                 .select("id,title,recipe_ingredients(ingredient)").eq("user_uuid", user_uuid))
+        index = RecipeIndex(rows)
+        with _lock:
+            _recipe_indexes[user_uuid] = index
+    return index
+
+
+async def _get_inventory(user_uuid: str) -> Inventory:
+    inventory = _inventories.get(user_uuid)
+    if inventory is None or time.time() - inventory.built_at > INDEX_TTL_SECONDS:
+        rows = await _load_pages(lambda: get_supabase().table("items")
+                                 .select("id,name,estimated_expiration").eq("user_uuid", user_uuid)
+                                 .is_("consumed_at", "null"))
+        inventory = Inventory(rows)
+        with _lock:
+            _inventories[user_uuid] = inventory
+    return inventory
+
+
+async def cookable_recipes(user_uuid: str, limit: int = 20, min_coverage: float = 0.0) -> List[Dict[str, Any]]:
+    """
+    Rank the user's saved recipes by how much of each the current inventory
+    covers, breaking ties toward recipes that use up items expiring soonest.
+    """
+    index = await _get_recipe_index(user_uuid)
+    inventory = (await _get_inventory(user_uuid)).keys()
+    today = date.today().toordinal()
+
+    matched: Dict[Any, List[str]] = {}
+    urgency: Dict[Any, float] = {}
+    with index.lock:
+        have = index.covered(inventory)
+        for key, expires in have.items():
+            # 1.0 for something expiring today, fading over about two weeks
+            weight = 0.0 if expires is None else 1.0 / (1 + max(expires - today, 0) / 7)
+            for recipe_id in index.postings.get(key, ()):
+                matched.setdefault(recipe_id, []).append(key)
+                urgency[recipe_id] = urgency.get(recipe_id, 0.0) + weight
+
+        # Score everything, but only build response rows for the top `limit`
+        scored = []
+        for recipe_id, keys in matched.items():
+            coverage = len(keys) / len(index.recipes[recipe_id]["needs"])
+            if coverage >= min_coverage:
+                scored.append((coverage, urgency[recipe_id], recipe_id))
+        ranked = []
+        for coverage, score, recipe_id in heapq.nlargest(limit, scored):
+            recipe = index.recipes[recipe_id]
+            needs = recipe["needs"]
+            ranked.append({
+                "recipe_id": recipe_id,
+                "title": recipe["title"],
+                "coverage": round(coverage, 3),
+                "urgency": round(score, 3),
+                "have": [needs[k] for k in matched[recipe_id]],
+                "missing": [line for k, line in needs.items() if k not in have],
+            })
+    return ranked
+
+
+def index_saved_recipe(user_uuid: str, recipe_id, title: Optional[str], ingredients: List[str]) -> None:
+    index = _recipe_indexes.get(user_uuid)
+    if index is not None:
+        index.add(recipe_id, title, ingredients)
+
+
+def index_inserted_items(user_uuid: str, rows: List[Dict[str, Any]]) -> None:
+    inventory = _inventories.get(user_uuid)
+    if inventory is not None:
+        inventory.add(rows)
+
+
+def unindex_items(user_uuid: str, item_ids: List[Any]) -> None:
+    inventory = _inventories.get(user_uuid)
+    if inventory is not None:
+        inventory.remove(item_ids)
@@ -0,0 +1,42 @@
+import re
+
+DEFAULT_COOK_TIME = "30 minutes"
+
+# "10-15 min", "1 to 2 hours", "45–60 minutes"
+_RANGE = re.compile(r"(\d+(?:\.\d+)?)\s*([a-z]*)\s*(?:-|–|—|to)\s*(\d+(?:\.\d+)?)\s*([a-z]*)", re.IGNORECASE)
+_HOUR_UNITS = {"h", "hr", "hrs", "hour", "hours"}
+
+
+def _to_minutes(value: str, unit: str) -> float:
+    return float(value) * (60 if unit.lower() in _HOUR_UNITS else 1)
+
+
+def normalize_cook_time(cook_time: str | None) -> str:
+    """
+    Collapse a cook-time range into its average in minutes; anything that
+    isn't a range is returned unchanged.
+
+    >>> normalize_cook_time("10-20 minutes")
+    '15 minutes'
+    >>> normalize_cook_time("1 to 2 hours")
+    '90 minutes'
+    >>> normalize_cook_time("30 min - 1 hr")
+    '45 minutes'
+    >>> normalize_cook_time("25 minutes")
+    '25 minutes'
+    >>> normalize_cook_time("quick - easy")
+    '30 minutes'
+    >>> normalize_cook_time(None)
+    '0 minutes'
+    """
+    if not cook_time:
+        return "0 minutes"
+    match = _RANGE.search(cook_time)
+    if not match:
+        # A dash without two numbers around it is unparseable
+        return DEFAULT_COOK_TIME if "-" in cook_time else cook_time
+    low, low_unit, high, high_unit = match.groups()
+    # "1-2 hours": the trailing unit applies to both ends
+    low_unit = low_unit or high_unit
+    avg = (_to_minutes(low, low_unit) + _to_minutes(high, high_unit)) / 2
+    return f"{int(avg)} minutes"
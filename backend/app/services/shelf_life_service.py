@@ -0,0 +1,175 @@
+import difflib
+import os
+import tempfile
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Optional
+
+from services.cache_service import cache_from_env
+from services.food_tokens import food_tokens, normalized_name
+
+STORAGE_LOCATIONS = ("F", "R", "S")
+
+# category: (keywords, default storage, {storage: shelf-life days})
+# Days are conservative "best quality" estimates for unopened food.
+SHELF_LIFE_TABLE: dict[str, tuple[tuple[str, ...], str, dict[str, int]]] = {
+    "milk": (("milk", "half and half", "oat milk", "almond milk"), "R", {"R": 7, "F": 90, "S": 1}),
+    "cream": (("cream", "whipping cream", "heavy cream", "creamer"), "R", {"R": 10, "F": 60, "S": 1}),
+    "sour_cream": (("sour cream", "cream cheese", "cottage cheese"), "R", {"R": 14, "F": 60, "S": 1}),
+    "yogurt": (("yogurt", "kefir"), "R", {"R": 14, "F": 60, "S": 1}),
+    "cheese": (("cheese", "cheddar", "mozzarella", "parmesan", "swiss"), "R", {"R": 28, "F": 180, "S": 2}),
+    "butter": (("butter", "margarine"), "R", {"R": 60, "F": 270, "S": 7}),
+    "egg": (("egg",), "R", {"R": 35, "F": 365, "S": 7}),
+    "chicken": (("chicken", "wing", "thigh", "drumstick", "breast"), "R", {"R": 2, "F": 270, "S": 1}),
+    "ground_meat": (("ground beef", "ground turkey", "ground pork", "mince", "burger", "patty"), "R", {"R": 2, "F": 120, "S": 1}),
+    "beef": (("beef", "steak", "roast", "brisket", "lamb"), "R", {"R": 4, "F": 270, "S": 1}),
+    "pork": (("pork", "chop", "rib", "sausage"), "R", {"R": 4, "F": 180, "S": 1}),
+    "bacon": (("bacon",), "R", {"R": 7, "F": 30, "S": 1}),
+    "deli": (("ham", "turkey", "salami", "deli", "pepperoni", "hot dog"), "R", {"R": 5, "F": 60, "S": 1}),
+    "fish": (("fish", "salmon", "tuna steak", "cod", "tilapia", "shrimp", "crab"), "R", {"R": 2, "F": 180, "S": 1}),
+    "tofu": (("tofu", "tempeh"), "R", {"R": 5, "F": 150, "S": 1}),
+    "bread": (("bread", "bagel", "bun", "roll", "baguette", "muffin", "croissant"), "S", {"S": 5, "R": 10, "F": 90}),
+    "tortilla": (("tortilla", "pita", "naan", "wrap"), "S", {"S": 7, "R": 21, "F": 180}),
+    "leafy_greens": (("lettuce", "spinach", "kale", "arugula", "greens", "salad", "cabbage"), "R", {"R": 7, "F": 30, "S": 1}),
+    "berries": (("strawberry", "blueberry", "raspberry", "blackberry", "berry", "grape", "cherry"), "R", {"R": 5, "F": 240, "S": 1}),
+    "banana": (("banana",), "S", {"S": 5, "R": 7, "F": 90}),
+    "apple": (("apple", "pear"), "S", {"S": 14, "R": 42, "F": 240}),
+    "citrus": (("orange", "lemon", "lime", "grapefruit", "clementine", "mandarin"), "S", {"S": 10, "R": 28, "F": 120}),
+    "stone_fruit": (("peach", "plum", "nectarine", "mango", "kiwi", "melon", "pineapple"), "S", {"S": 4, "R": 7, "F": 240}),
+    "avocado": (("avocado",), "S", {"S": 4, "R": 7, "F": 120}),
+    "tomato": (("tomato",), "S", {"S": 5, "R": 10, "F": 60}),
+    "root_veg": (("potato", "sweet potato", "yam", "onion", "garlic", "shallot"), "S", {"S": 30, "R": 45, "F": 300}),
+    "fresh_veg": (("carrot", "celery", "broccoli", "cauliflower", "pepper", "cucumber", "zucchini", "mushroom", "corn", "bean sprout", "asparagus", "green bean"), "R", {"R": 7, "F": 240, "S": 2}),
+    "herbs": (("cilantro", "parsley", "basil", "mint", "scallion", "green onion"), "R", {"R": 7, "F": 90, "S": 1}),
+    "juice": (("juice", "lemonade"), "R", {"R": 10, "F": 240, "S": 3}),
+    "frozen": (("frozen", "ice cream", "pizza", "popsicle", "gelato"), "F", {"F": 180, "R": 3, "S": 1}),
+    "dry_goods": (("rice", "pasta", "noodle", "flour", "sugar", "cereal", "oat", "quinoa", "lentil", "spaghetti"), "S", {"S": 365, "R": 365, "F": 730}),
+    "canned": (("canned", "bean", "soup", "tuna", "broth", "stock", "sauce", "salsa"), "S", {"S": 730, "R": 5, "F": 90}),
+    "snacks": (("chip", "cracker", "cookie", "pretzel", "popcorn", "granola", "bar", "nut", "almond", "cashew"), "S", {"S": 90, "R": 120, "F": 180}),
+    "spreads": (("peanut butter", "jam", "jelly", "honey", "nutella", "syrup"), "S", {"S": 180, "R": 365, "F": 365}),
+    "condiments": (("ketchup", "mustard", "mayo", "mayonnaise", "dressing", "hot sauce", "soy sauce", "vinegar", "oil"), "S", {"S": 180, "R": 365, "F": 365}),
+    "beverages": (("soda", "water", "coffee", "tea", "sparkling", "beer", "wine", "kombucha"), "S", {"S": 270, "R": 270, "F": 270}),
+    "hummus": (("hummus", "guacamole", "dip", "pesto"), "R", {"R": 7, "F": 60, "S": 1}),
+}
+
+
+def _build_index() -> tuple[dict[tuple[str, ...], str], int, frozenset[str]]:
+    index: dict[tuple[str, ...], str] = {}
+    for category, (keywords, _, _) in SHELF_LIFE_TABLE.items():
+        for keyword in keywords:
+            index.setdefault(food_tokens(keyword), category)
+    longest = max(len(tokens) for tokens in index)
+    vocabulary = frozenset(token for tokens in index for token in tokens)
+    return index, longest, vocabulary
+
+
+# Token phrase -> category, built once at import time
+_KEYWORD_INDEX, _LONGEST_KEYWORD, _VOCABULARY = _build_index()
+_SORTED_VOCABULARY = sorted(_VOCABULARY)
+
+# normalized name -> {storage: days}, learned from Gemini fallback answers.
+# Bounded (LRU + TTL), and shared by every worker through the SQLite tier, so
+# a food learned in one worker is answered locally in all of them
+learned_shelf_lives = cache_from_env(
+    "learned_shelf_lives", "LEARNED_SHELF_LIFE", default_size=4096, default_ttl=30 * 24 * 3600,
+    default_db=os.path.join(tempfile.gettempdir(), "gobble-shelf-lives.sqlite"),
+)
+
+
+@lru_cache(maxsize=4096)
+def _closest_token(token: str) -> Optional[str]:
+    """Fuzzy-correct a token that isn't in the keyword vocabulary (e.g. OCR typos)."""
+    if len(token) < 4:
+        return None
+    matches = difflib.get_close_matches(token, _SORTED_VOCABULARY, n=1, cutoff=0.84)
+    return matches[0] if matches else None
+
+
+@lru_cache(maxsize=8192)
+def match_category(name: str) -> Optional[str]:
+    """
+    Map a food name to a SHELF_LIFE_TABLE category. Longer phrases win
+    ("peanut butter" over "butter"); among equal lengths the later token wins,
+    since the head noun comes last ("chocolate milk" is milk).
+    """
+    tokens = tuple(
+        token if token in _VOCABULARY else (_closest_token(token) or token)
+        for token in food_tokens(name)
+    )
+    best: Optional[tuple[int, int, str]] = None
+    for size in range(min(_LONGEST_KEYWORD, len(tokens)), 0, -1):
+        for start in range(len(tokens) - size + 1):
+            category = _KEYWORD_INDEX.get(tokens[start:start + size])
+            if category and (best is None or (size, start) > best[:2]):
+                best = (size, start, category)
+        if best:
+            break
+    return best[2] if best else None
+
+
+def default_storage(name: str) -> Optional[str]:
+    category = match_category(name)
+    return SHELF_LIFE_TABLE[category][1] if category else None
+
+
+def shelf_life_days(name: str, storage_location: Optional[str]) -> Optional[int]:
+    """Shelf life in days for `name` stored at `storage_location`, or None if unknown."""
+    learned = learned_shelf_lives.get(normalized_name(name)) or {}
+    category = match_category(name)
+    storage = storage_location if storage_location in STORAGE_LOCATIONS else None
+    if storage is None:
+        storage = SHELF_LIFE_TABLE[category][1] if category else next(iter(learned), None)
+    if storage in learned:
+        return learned[storage]
+    if category:
+        return SHELF_LIFE_TABLE[category][2].get(storage)
+    return None
+
+
+def _parse_date(value) -> Optional[date]:
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_expiration(item: dict) -> Optional[str]:
+    """Return an ISO expiration date for an item dict, or None if it can't be matched."""
+    days = shelf_life_days(item.get("name") or "", item.get("storage_location"))
+    if days is None:
+        return None
+    bought = _parse_date(item.get("date_bought")) or date.today()
+    return (bought + timedelta(days=days)).isoformat()
+
+
+def learn_expiration(item: dict) -> None:
+    """Remember a model-predicted shelf life so the same food is answered locally next time."""
+    bought = _parse_date(item.get("date_bought")) or date.today()
+    expires = _parse_date(item.get("estimated_expiration"))
+    storage = item.get("storage_location")
+    key = normalized_name(item.get("name") or "")
+    if not key or expires is None or storage not in STORAGE_LOCATIONS:
+        return
+    days = (expires - bought).days
+    if days <= 0:
+        return
+    # Another worker may have learned a different storage for the same food
+    learned = learned_shelf_lives.get(key, refresh=True) or {}
+    learned_shelf_lives.set(key, {**learned, storage: days})
+
+
+def fill_expirations(items: list[dict]) -> list[int]:
+    """
+    Fill `estimated_expiration` in place for every item we can match.
+    Returns the indexes of items that still need a prediction.
+    """
+    unmatched = []
+    for i, item in enumerate(items):
+        expiration = estimate_expiration(item)
+        if expiration is None:
+            unmatched.append(i)
+        else:
+            item["estimated_expiration"] = expiration
+    return unmatched
@@ -0,0 +1,92 @@
+import json
+from functools import lru_cache
+from typing import Any, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+from services.json_stream import parse_partial_json
+from services.telemetry import get_logger
+
+logger = get_logger("structured_output")
+
+try:
+    import orjson
+
+    def loads(text: str | bytes) -> Any:
+        return orjson.loads(text)
+
+    DECODE_ERRORS: tuple[type[Exception], ...] = (orjson.JSONDecodeError, json.JSONDecodeError)
+except ImportError:  # orjson is optional; the stdlib decoder gives the same results, slower
+    loads = json.loads
+    DECODE_ERRORS = (json.JSONDecodeError,)
+
+# Keys of a Pydantic JSON schema that Gemini's response_schema understands
+_SCHEMA_KEYS = ("type", "enum", "format", "description")
+
+
+def _to_gemini_schema(schema: dict, defs: dict) -> dict:
+    if "$ref" in schema:
+        return _to_gemini_schema(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+    if "anyOf" in schema:
+        # Optional[X] -> X with nullable
+        options = [s for s in schema["anyOf"] if s.get("type") != "null"]
+        converted = _to_gemini_schema(options[0], defs)
+        if len(options) < len(schema["anyOf"]):
+            converted["nullable"] = True
+        return converted
+    converted = {k: schema[k] for k in _SCHEMA_KEYS if k in schema}
+    if "properties" in schema:
+        converted["properties"] = {k: _to_gemini_schema(v, defs) for k, v in schema["properties"].items()}
+        # Ask for every field; defaults only matter when validating our side
+        converted["required"] = list(schema["properties"])
+    if "items" in schema:
+        converted["items"] = _to_gemini_schema(schema["items"], defs)
+    return converted
+
+
+@lru_cache(maxsize=None)
+def response_schema(model: Type[BaseModel]) -> dict:
+    """The Gemini `response_schema` (OpenAPI subset) for a Pydantic model."""
+    schema = model.model_json_schema()
+    return _to_gemini_schema(schema, schema.get("$defs", {}))
+
+
+def json_config(model: Type[BaseModel]) -> dict:
+    """generation_config that puts Gemini in JSON mode constrained to `model`."""
+    return {"response_mime_type": "application/json", "response_schema": response_schema(model)}
+
+
+def decode_json_object(text: str) -> Optional[Any]:
+    """
+    Decode a model response to JSON. JSON-mode output decodes directly;
+    otherwise the outermost {...} is tried (markdown fences, chatter), and
+    finally truncated output is repaired by closing what was left open.
+    """
+    try:
+        return loads(text)
+    except DECODE_ERRORS:
+        pass
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        try:
+            return loads(text[start:end + 1])
+        except DECODE_ERRORS:
+            pass
+    return parse_partial_json(text)
+
+
+def parse_structured(text: Optional[str], model: Type[BaseModel]) -> dict:
+    """
+    Decode and validate a Gemini response into `model`, returned as a plain
+    dict (what the caches and routes store). Returns {} when nothing usable
+    could be recovered.
+    """
+    data = decode_json_object(text or "")
+    if not isinstance(data, dict):
+        logger.warning("no JSON object in Gemini response", extra={"schema": model.__name__, "text": (text or "")[:200]})
+        return {}
+    try:
+        return model.model_validate(data).model_dump()
+    except ValidationError as e:
+        logger.warning("Gemini response failed validation", extra={"schema": model.__name__, "errors": e.error_count()})
+        return {}
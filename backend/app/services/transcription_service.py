@@ -0,0 +1,279 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import as_completed
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.cache_service import cache_from_env
+from services.executor import BoundedExecutor
+from services.telemetry import get_logger, timed
+
+logger = get_logger("transcription")
+
+# Audio fallback for videos without captions: yt-dlp fetches the audio track,
+# ffmpeg resamples it to 16 kHz mono, an energy VAD cuts it into speech
+# chunks and CPU Whisper transcribes the chunks in parallel worker processes.
+# Needs requirements-media.txt and an ffmpeg binary; off when either is missing.
+WHISPER_ENABLED = os.getenv("WHISPER_ENABLED", "1") == "1"
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_LANGUAGE = os.getenv("WHISPER_LANGUAGE") or None  # None lets Whisper detect it
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", 2))
+# Torch threads per worker; workers x threads should not exceed the cores
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", max(1, (os.cpu_count() or 1) // max(1, WHISPER_WORKERS))))
+
+SAMPLE_RATE = 16000
+# Longer videos are refused rather than tying up the pool for an hour
+AUDIO_MAX_SECONDS = int(os.getenv("AUDIO_MAX_SECONDS", 45 * 60))
+# Whisper decodes 30 s windows, so chunks up to that length cost one pass each
+CHUNK_MAX_SECONDS = float(os.getenv("WHISPER_CHUNK_SECONDS", 30))
+VAD_FRAME_MS = 30
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", 12))  # above the noise floor counts as speech
+VAD_SILENCE_DB = -50.0  # never speech, however quiet the recording
+VAD_MIN_SILENCE_MS = int(os.getenv("VAD_MIN_SILENCE_MS", 300))  # shorter pauses don't split speech
+VAD_PAD_MS = int(os.getenv("VAD_PAD_MS", 150))
+
+# Whole-video jobs: few at once, since each one fans out over every Whisper worker
+JOB_WORKERS = int(os.getenv("TRANSCRIPTION_JOB_WORKERS", 1))
+JOB_MAX_QUEUED = int(os.getenv("TRANSCRIPTION_MAX_QUEUED", 20))
+# A queued/running record this old belongs to a worker that died; allow a resubmit
+JOB_STALE_SECONDS = float(os.getenv("TRANSCRIPTION_JOB_STALE_SECONDS", 15 * 60))
+
+
+class AudioUnavailable(Exception):
+    """The video's audio could not be downloaded, decoded or is too long."""
+
+
+class JobQueueFull(Exception):
+    """Too many transcription jobs are already waiting."""
+
+
+@lru_cache(maxsize=None)
+def audio_transcription_available() -> bool:
+    """True when yt-dlp, Whisper, ffmpeg-python and the ffmpeg binary are all installed."""
+    if not WHISPER_ENABLED:
+        return False
+    modules = all(importlib.util.find_spec(m) is not None for m in ("yt_dlp", "whisper", "ffmpeg"))
+    return modules and shutil.which("ffmpeg") is not None
+
+
+def download_audio(video_url: str, workdir: str) -> str:
+    """Download only the audio stream of `video_url` into `workdir`; returns the file path."""
+    import yt_dlp
+
+    options = {
+        "format": "bestaudio/best",
+        "outtmpl": os.path.join(workdir, "audio.%(ext)s"),
+        "noplaylist": True,
+        "quiet": True,
+        "no_warnings": True,
+    }
+    try:
+        with yt_dlp.YoutubeDL(options) as ydl, timed("yt_dlp", "download"):
+            info = ydl.extract_info(video_url, download=False)
+            duration = info.get("duration") or 0
+            if duration > AUDIO_MAX_SECONDS:
+                raise AudioUnavailable(f"Video is {duration // 60} minutes long; the limit is {AUDIO_MAX_SECONDS // 60}.")
+            info = ydl.process_ie_result(info, download=True)
+            return ydl.prepare_filename(info)
+    except yt_dlp.utils.DownloadError as e:
+        raise AudioUnavailable(f"Could not download the video's audio: {e}") from e
+
+
+def decode_audio(path: str) -> np.ndarray:
+    """Decode any audio file to 16 kHz mono float32 in [-1, 1], the input Whisper expects."""
+    import ffmpeg
+
+    try:
+        with timed("ffmpeg", "decode"):
+            pcm, _ = (
+                ffmpeg.input(path, t=AUDIO_MAX_SECONDS)
+                .output("pipe:", format="s16le", acodec="pcm_s16le", ac=1, ar=SAMPLE_RATE)
+                .run(capture_stdout=True, capture_stderr=True)
+            )
+    except ffmpeg.Error as e:
+        raise AudioUnavailable(f"Could not decode the audio: {e.stderr.decode(errors='replace')[-300:]}") from e
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def speech_chunks(samples: np.ndarray, sample_rate: int = SAMPLE_RATE,
+                  max_chunk_seconds: float = CHUNK_MAX_SECONDS) -> List[Tuple[int, int]]:
+    """
+    Split audio at pauses into (start, end) sample ranges of at most
+    `max_chunk_seconds`, dropping silence. Frames louder than the noise
+    floor by VAD_MARGIN_DB are speech; pauses shorter than
+    VAD_MIN_SILENCE_MS stay inside a chunk.
+
+    >>> sr = 16000
+    >>> tone = 0.3 * np.sin(np.linspace(0, 2000 * np.pi, 2 * sr)).astype(np.float32)
+    >>> quiet = np.zeros(sr, dtype=np.float32)
+    >>> audio = np.concatenate([quiet, tone, quiet, tone, quiet])
+    >>> [(round(s / sr, 2), round(e / sr, 2)) for s, e in speech_chunks(audio, sr, max_chunk_seconds=2.5)]
+    [(0.84, 3.15), (3.84, 6.15)]
+    >>> len(speech_chunks(audio, sr, max_chunk_seconds=30))
+    1
+    >>> speech_chunks(quiet, sr)
+    []
+    >>> speech_chunks(tone, sr, max_chunk_seconds=1.5)  # no pauses: fixed-length cuts
+    [(0, 24000), (24000, 31680)]
+    """
+    frame = int(sample_rate * VAD_FRAME_MS / 1000)
+    count = len(samples) // frame
+    if count == 0:
+        return []
+    frames = samples[:count * frame].reshape(count, frame)
+    level = 20 * np.log10(np.sqrt(np.mean(frames ** 2, axis=1)) + 1e-10)
+    # Digital silence sits near -200 dB; don't let it drag the floor down to nothing
+    floor = max(float(np.percentile(level, 5)), VAD_SILENCE_DB - 10)
+    loud = float(np.percentile(level, 95))
+    # Between the quiet and loud ends, so audio with almost no pauses is still all speech
+    threshold = max(min(floor + VAD_MARGIN_DB, loud - VAD_MARGIN_DB), VAD_SILENCE_DB)
+    speech = level > threshold
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], speech.astype(np.int8), [0]))))
+    segments: List[List[int]] = []
+    min_gap = VAD_MIN_SILENCE_MS // VAD_FRAME_MS
+    for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+        if segments and start - segments[-1][1] < min_gap:
+            segments[-1][1] = end
+        else:
+            segments.append([start, end])
+
+    pad = VAD_PAD_MS // VAD_FRAME_MS
+    max_frames = max(1, int(max_chunk_seconds * 1000 / VAD_FRAME_MS))
+    chunks: List[Tuple[int, int]] = []
+    for start, end in segments:
+        start, end = max(0, start - pad), min(count, end + pad)
+        if chunks and end - chunks[-1][0] <= max_frames:
+            # Fits in the current chunk; a short pause inside it costs Whisper little
+            chunks[-1] = (chunks[-1][0], end)
+            continue
+        # Speech longer than a chunk is cut at fixed length
+        for piece in range(start, end, max_frames):
+            chunks.append((piece, min(end, piece + max_frames)))
+    return [(start * frame, end * frame) for start, end in chunks]
+
+
+_model = None
+
+
+def _init_worker() -> None:
+    # Runs once per worker process: load the model and size torch's thread pool
+    global _model
+    import torch
+    import whisper
+
+    torch.set_num_threads(WHISPER_THREADS)
+    _model = whisper.load_model(WHISPER_MODEL, device="cpu")
+
+
+def _transcribe_chunk(samples: np.ndarray) -> str:
+    result = _model.transcribe(samples, language=WHISPER_LANGUAGE, fp16=False, condition_on_previous_text=False)
+    return result["text"].strip()
+
+
+# Whisper holds the GIL for much of its work and each model is a few hundred MB,
+# so a small pool of processes, each keeping its model loaded between chunks.
+whisper_executor = BoundedExecutor("whisper", WHISPER_WORKERS, processes=True, initializer=_init_worker)
+
+
+def transcribe_audio(samples: np.ndarray, progress: Callable[..., None] = lambda **_: None) -> str:
+    """Transcribe decoded audio, chunk by chunk across the Whisper workers."""
+    chunks = speech_chunks(samples)
+    progress(stage="transcribing", chunks_done=0, chunks_total=len(chunks))
+    texts = [""] * len(chunks)
+    with timed("whisper", "transcribe"):
+        futures = {whisper_executor.submit(_transcribe_chunk, samples[start:end]): index
+                   for index, (start, end) in enumerate(chunks)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            texts[futures[future]] = future.result()
+            progress(chunks_done=done)
+    return " ".join(text for text in texts if text)
+
+
+def transcribe_url(video_url: str, progress: Callable[..., None] = lambda **_: None) -> str:
+    """Download, decode and transcribe a video's audio track."""
+    with tempfile.TemporaryDirectory(prefix="gobble-audio-") as workdir:
+        progress(stage="downloading")
+        path = download_audio(video_url, workdir)
+        progress(stage="decoding")
+        samples = decode_audio(path)
+    return transcribe_audio(samples, progress)
+
+
+class JobQueue:
+    """
+    Slow work that shouldn't hold a request open. Jobs run on a small thread
+    pool and their status records (`queued`, `running`, `done`, `failed`,
+    plus progress fields) live in a ResultCache, so clients poll by id.
+    Set TRANSCRIPTION_JOBS_DB to share the records between gunicorn workers.
+    """
+
+    def __init__(self, name: str, workers: int, max_queued: int):
+        self.max_queued = max_queued
+        self._executor = BoundedExecutor(name, workers)
+        self._records = cache_from_env(name, "TRANSCRIPTION_JOBS", default_size=1024, default_ttl=24 * 3600)
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._records.get(job_id, refresh=True)
+
+    def submit(self, job_id: str, fn: Callable[[Callable[..., None]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Queue `fn(progress)` under `job_id` unless that job is already queued,
+        running or done; returns the job's record. `fn` returns the result
+        stored on the record and may call `progress(**fields)` as it goes.
+        """
+        def still_valid(record: Dict[str, Any]) -> bool:
+            return record["status"] == "done" or (
+                record["status"] in ("queued", "running") and time.time() - record["updated_at"] < JOB_STALE_SECONDS
+            )
+
+        with self._lock:
+            if self._pending >= self.max_queued:
+                record = self.get(job_id)
+                if record is not None and still_valid(record):
+                    return record
+                raise JobQueueFull("Too many transcription jobs are queued; try again later.")
+            now = time.time()
+            # Atomic across the workers sharing TRANSCRIPTION_JOBS_DB: only one
+            # of them gets to start a given job
+            claimed, record = self._records.claim(
+                job_id, {"id": job_id, "status": "queued", "created_at": now, "updated_at": now}, still_valid
+            )
+            if not claimed:
+                return record
+            self._pending += 1
+        self._executor.submit(self._run, job_id, fn)
+        return record
+
+    def _update(self, job_id: str, **fields: Any) -> Dict[str, Any]:
+        with self._lock:
+            record = {**(self._records.get(job_id) or {"id": job_id}), **fields, "updated_at": time.time()}
+            self._records.set(job_id, record)
+            return record
+
+    def _run(self, job_id: str, fn: Callable[[Callable[..., None]], Dict[str, Any]]) -> None:
+        self._update(job_id, status="running")
+        try:
+            result = fn(lambda **fields: self._update(job_id, **fields))
+            self._update(job_id, status="done", stage=None, result=result)
+        except Exception as e:
+            logger.exception("transcription job failed", extra={"job_id": job_id})
+            self._update(job_id, status="failed", error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": self._pending, "max_queued": self.max_queued, **self._records.stats()}
+
+
+transcription_jobs = JobQueue("transcription_jobs", JOB_WORKERS, JOB_MAX_QUEUED)
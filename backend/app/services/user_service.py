@@ -1,138 +1,111 @@
-from supabase import create_client, Client
 import os
+import tempfile
+import uuid
 from typing import Optional
+from db import get_supabase
+from services.cache_service import ResultCache, cache_from_env
+from services.executor import execute
+from services.recipe_utils import normalize_cook_time
+from services.matching_service import index_saved_recipe
+from services.telemetry import get_logger
 
-# Initialize Supabase client
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # use service role key for server-side
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+logger = get_logger("user")
 
 async def create_profile_in_db(user_id: str, username: str, avatar: Optional[str] = None):
     """
     Inserts a new profile into the 'profiles' table.
     """
     try:
-        response = supabase.table("profiles").insert({
+        response = await execute(get_supabase().table("profiles").insert({
             "id": user_id,
             "username": username,
             "avatar": avatar
-        }).execute()
+        }))
         if response.error:
-            print("Supabase error:", response.error)
+            logger.error("supabase error creating profile", extra={"error": str(response.error)})
             return {"error": response.error.message}
         return response.data
     except Exception as e:
-        print("Unexpected error creating profile:", e)
+        logger.exception("unexpected error creating profile")
         return {"error": str(e)}
     
 async def save_recipe_in_db(user_id: str, recipe: dict):
-    print("Starting recipe save...")
+    """
+    Saves a recipe with its ingredients and steps through the `save_recipe`
+    Postgres function: one round trip, one transaction, no partial recipes.
+    """
     try:
-        # Handle cook time ranges
-        cook_time = recipe.get("cookTime", "0 minutes")
-        if '-' in cook_time:
-            try:
-                times = cook_time.split('-')
-                numbers = []
-                for t in times:
-                    num = int(''.join(filter(str.isdigit, t.strip())))
-                    numbers.append(num)
-                avg_minutes = sum(numbers) // len(numbers)
-                cook_time = f"{avg_minutes} minutes"
-            except Exception as e:
-                print(f"Error parsing cook time range: {e}")
-                cook_time = "30 minutes"
-
-        # 1. Insert main recipe
-        recipe_insert = {
-            "user_uuid": user_id,
+        payload = {
             "title": recipe.get("title", "Untitled"),
-            "cook_time": cook_time,
+            "cook_time": normalize_cook_time(recipe.get("cookTime", "0 minutes")),
             "difficulty": recipe.get("difficulty", "Easy"),
             "servings": recipe.get("servings", 1),
-            "url": recipe.get("url", None)
+            "url": recipe.get("url", None),
+            "ingredients": list(recipe.get("ingredients", [])),
+            "steps": list(recipe.get("steps", [])),
         }
-        print("Inserting recipe:", recipe_insert)
-        recipe_resp = supabase.table("recipes").insert(recipe_insert).execute()
-        recipe_id = recipe_resp.data[0]["id"]
-        print("Recipe saved with ID:", recipe_id)
-
-        # 2. Insert ingredients
-        ingredients = recipe.get("ingredients", [])
-        if ingredients:
-            print(f"Inserting {len(ingredients)} ingredients")
-            ingredient_rows = [{"recipe_id": recipe_id, "ingredient": ing} for ing in ingredients]
-            supabase.table("recipe_ingredients").insert(ingredient_rows).execute()
-            print("Ingredients saved successfully")
-
-        # 3. Insert steps
-        steps = recipe.get("steps", [])
-        if steps:
-            print(f"Inserting {len(steps)} steps")
-            step_rows = [{"recipe_id": recipe_id, "step_number": i+1, "instruction": step} for i, step in enumerate(steps)]
-            supabase.table("recipe_steps").insert(step_rows).execute()
-            print("Steps saved successfully")
-
+        response = await execute(get_supabase().rpc("save_recipe", {"p_user_uuid": user_id, "p_recipe": payload}))
+        recipe_id = response.data[0] if isinstance(response.data, list) else response.data
+        index_saved_recipe(user_id, recipe_id, payload["title"], payload["ingredients"])
+        recipe_versions.set(user_id, uuid.uuid4().hex)
         return {"success": True, "recipe_id": recipe_id}
     except Exception as e:
-        print("Error saving recipe:", str(e))
+        logger.exception("error saving recipe")
         return {"success": False, "error": str(e)}
-        # Handle time ranges by taking the average
-        if '-' in cook_time:
-            try:
-                times = cook_time.split('-')
-                # Extract numbers from each part
-                numbers = []
-                for t in times:
-                    num = int(''.join(filter(str.isdigit, t.strip())))
-                    numbers.append(num)
-                # Take average for the interval
-                avg_minutes = sum(numbers) // len(numbers)
-                cook_time = f"{avg_minutes} minutes"
-            except Exception as e:
-                print(f"Error parsing cook time range: {e}")
-                cook_time = "30 minutes"  # fallback
-        
-        recipe_insert = {
-            "user_uuid": user_id,
-            "title": recipe.get("title", "Untitled"),
-            "cook_time": cook_time,
-            "difficulty": recipe.get("difficulty", "Easy"),
-            "servings": recipe.get("servings", 1),
-            "url": recipe.get("url", None)
-        }
-        
-        print("Inserting main recipe:", recipe_insert)
-        recipe_resp = supabase.table("recipes").insert(recipe_insert).execute()
-        if recipe_resp.error:
-            print("Error inserting recipe:", recipe_resp.error)
-            return {"success": False, "error": recipe_resp.error.message}
-        
-        recipe_id = recipe_resp.data[0]["id"]
-        print("Recipe created with ID:", recipe_id)
-          # 2. Insert ingredients
-        ingredients = recipe.get("ingredients", [])
-        if ingredients:
-            print(f"Inserting {len(ingredients)} ingredients")
-            ingredient_rows = [{"recipe_id": recipe_id, "ingredient": ing} for ing in ingredients]
-            ing_resp = supabase.table("recipe_ingredients").insert(ingredient_rows).execute()
-            if ing_resp.error:
-                print("Error inserting ingredients:", ing_resp.error)
-                return {"success": False, "error": ing_resp.error.message}
-            print("Ingredients inserted successfully")
 
-        # 3. Insert steps
-        steps = recipe.get("steps", [])
-        if steps:
-            print(f"Inserting {len(steps)} steps")
-            step_rows = [{"recipe_id": recipe_id, "step_number": i+1, "instruction": step} for i, step in enumerate(steps)]
-            step_resp = supabase.table("recipe_steps").insert(step_rows).execute()
-            if step_resp.error:
-                print("Error inserting steps:", step_resp.error)
-                return {"success": False, "error": step_resp.error.message}
-            print("Steps inserted successfully")
 
-        return {"success": True, "recipe_id": recipe_id}
-    except Exception as e:
-        print("Error saving recipe:", e)
-        return {"success": False, "error": str(e)}
\ No newline at end of file
+# Recipes with their ingredients and steps embedded, fetched in one PostgREST request
+RECIPE_LIST_SELECT = (
+    "id,user_uuid,title,cook_time,difficulty,servings,url,"
+    "recipe_ingredients(ingredient),recipe_steps(step_number,instruction)"
+)
+
+# Listing pages per user. Keys carry the user's recipes_version() tag, which
+# save_recipe_in_db replaces in recipe_versions; every worker reads that
+# cache's disk tier, so a save through any of them invalidates every cached
+# page for the user at once, and a cache hit costs no database round trip.
+recipe_list_cache = ResultCache("user_recipes", max_entries=1024, ttl_seconds=600)
+recipe_versions = cache_from_env(
+    "recipe_versions", "RECIPE_VERSION_CACHE", default_size=4096, default_ttl=24 * 3600,
+    default_db=os.path.join(tempfile.gettempdir(), "gobble-recipe-versions.sqlite"),
+)
+
+
+def recipes_version(user_id: str) -> str:
+    """The user's current listing tag, starting a fresh one if there is none."""
+    tag = recipe_versions.get(user_id, refresh=True)
+    if tag is None:
+        # A save racing with this keeps its own tag
+        _, tag = recipe_versions.claim(user_id, uuid.uuid4().hex, keep=lambda current: True)
+    return tag
+
+
+def _assemble_recipe(row: dict) -> dict:
+    steps = sorted(row.pop("recipe_steps", None) or [], key=lambda s: s["step_number"])
+    ingredients = row.pop("recipe_ingredients", None) or []
+    row["ingredients"] = [i["ingredient"] for i in ingredients]
+    row["steps"] = [s["instruction"] for s in steps]
+    return row
+
+
+async def list_recipes_in_db(user_id: str, limit: int = 50, before: Optional[int] = None):
+    """
+    Returns a page of the user's saved recipes, newest first, each with its
+    ingredients and ordered steps. Pass `next_cursor` back as `before`.
+    """
+    key = f"{user_id}:{recipes_version(user_id)}:{limit}:{before}"
+    cached = recipe_list_cache.get(key)
+    if cached is not None:
+        return cached
+
+    query = get_supabase().table("recipes").select(RECIPE_LIST_SELECT).eq("user_uuid", user_id)
+    if before is not None:
+        query = query.lt("id", before)
+    response = await execute(query.order("id", desc=True).limit(limit))
+    recipes = [_assemble_recipe(row) for row in response.data or []]
+    page = {
+        "recipes": recipes,
+        "next_cursor": recipes[-1]["id"] if len(recipes) == limit else None,
+    }
+    recipe_list_cache.set(key, page)
+    return page
@@ -0,0 +1,70 @@
+"""
+Load test: blocking calls on the event loop vs. the bounded executors.
+
+Runs fully offline. `parse_receipt` is replaced by a stub that sleeps for
+--latency seconds (standing in for a Gemini round trip), then N concurrent
+requests are fired at two endpoints on the same app:
+
+  /bench/on-loop       calls the stub directly inside `async def` (old behaviour)
+  /gem/parse-receipt   the real route, which goes through `run_gemini`
+
+Usage (from backend/app):
+    python ../benchmarks/bench_async_routes.py --requests 32 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "bench.bench.bench")
+
+import httpx
+from fastapi import File, UploadFile
+
+import main
+from routes import gem_route
+
+
+def run(requests: int, latency: float) -> dict:
+    def slow_parse_receipt(image_bytes: bytes) -> dict:
+        time.sleep(latency)
+        return {"items": []}
+
+    gem_route.parse_receipt = slow_parse_receipt
+
+    @main.app.post("/bench/on-loop")
+    async def on_loop(file: UploadFile = File(...)):
+        image_bytes = await file.read()
+        return {"parsed": slow_parse_receipt(image_bytes)}
+
+    async def fire(path: str) -> float:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[
+                client.post(path, files={"file": ("r.jpg", b"x")}) for _ in range(requests)
+            ])
+            elapsed = time.perf_counter() - start
+        assert all(r.status_code == 200 for r in responses)
+        return elapsed
+
+    on_loop_s = asyncio.run(fire("/bench/on-loop"))
+    executor_s = asyncio.run(fire("/gem/parse-receipt"))
+    return {
+        "requests": requests,
+        "latency_s": latency,
+        "on_loop": {"wall_s": round(on_loop_s, 3), "rps": round(requests / on_loop_s, 2)},
+        "executor": {"wall_s": round(executor_s, 3), "rps": round(requests / executor_s, 2)},
+        "speedup": round(on_loop_s / executor_s, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests, args.latency), indent=2))
@@ -0,0 +1,129 @@
+"""
+End-to-end latency: three-step receipt flow vs. the single ingest call.
+
+Runs fully offline: Gemini is a fake model that sleeps for --model-latency
+seconds per call, and the database is the in-memory backend. Every client
+request also pays --rtt seconds, standing in for the phone <-> server
+round trip. Each receipt is a distinct image so no cache is hit.
+
+  three-step   POST /gem/parse-receipt, then POST /items/finalize-items
+               (which asks Gemini again for items the local shelf-life
+               table doesn't know)
+  ingest       POST /items/ingest-receipt
+
+Usage (from backend/app):
+    python ../benchmarks/bench_ingest.py --receipts 20 --model-latency 0.8 --rtt 0.15
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "bench.bench.bench")
+os.environ["SUPABASE_BACKEND"] = "memory"
+# Don't let the quota limiter shape the measurement
+os.environ.setdefault("GEMINI_RATE_PER_MINUTE", "100000")
+os.environ.setdefault("GEMINI_BURST", "1000")
+
+import httpx
+from PIL import Image
+
+import main
+from services.inference_client import gemini
+
+USER = "00000000-0000-0000-0000-00000000be4c"
+
+RECEIPT_RESPONSE = json.dumps({"items": [
+    {"name": "Whole Milk", "date_bought": "2026-10-18", "price": 3.49, "estimated_expiration": None, "storage_option": "R"},
+    {"name": "Bananas", "date_bought": "2026-10-18", "price": 1.29, "estimated_expiration": None, "storage_option": "S"},
+    {"name": "Chicken Thighs", "date_bought": "2026-10-18", "price": 7.80, "estimated_expiration": None, "storage_option": "R"},
+    # Not in the shelf-life table, so the old flow predicts it with a second call
+    {"name": "Gochujang", "date_bought": "2026-10-18", "price": 5.99, "estimated_expiration": None, "storage_option": "S"},
+]})
+PREDICTION_RESPONSE = json.dumps({"items": [{"name": "Gochujang", "estimated_expiration": "2027-04-18"}]})
+
+
+class FakeModel:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def generate_content(self, contents, generation_config=None, stream=False):
+        time.sleep(self.latency)
+        # Image requests are [prompt, image part]; expiration prediction is text only
+        return types.SimpleNamespace(text=RECEIPT_RESPONSE if isinstance(contents, list) else PREDICTION_RESPONSE)
+
+
+def receipt_image(n: int) -> bytes:
+    image = Image.new("RGB", (64, 64), (n % 256, (n // 256) % 256, 200))
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+async def three_step(client: httpx.AsyncClient, image: bytes, rtt: float) -> None:
+    await asyncio.sleep(rtt)
+    parsed = (await client.post("/gem/parse-receipt", files={"file": ("r.png", image, "image/png")})).json()["parsed"]
+    items = [
+        {**item, "storage_location": item.get("storage_option")}
+        for item in parsed["items"]
+    ]
+    await asyncio.sleep(rtt)
+    response = await client.post("/items/finalize-items", json={"user_uuid": USER, "items_json": {"items": items}})
+    assert response.json()["status"] == "success", response.text
+
+
+async def ingest(client: httpx.AsyncClient, image: bytes, rtt: float) -> None:
+    await asyncio.sleep(rtt)
+    response = await client.post(
+        "/items/ingest-receipt", files={"file": ("r.png", image, "image/png")}, data={"user_uuid": USER}
+    )
+    assert response.json()["status"] == "success", response.text
+
+
+def summarize(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(ordered) * 1000, 1),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 1),
+    }
+
+
+def run(receipts: int, model_latency: float, rtt: float) -> dict:
+    gemini._model = FakeModel(model_latency)
+
+    async def measure(flow, offset: int) -> list[float]:
+        samples = []
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+            for n in range(receipts):
+                start = time.perf_counter()
+                await flow(client, receipt_image(offset + n), rtt)
+                samples.append(time.perf_counter() - start)
+        return samples
+
+    three = asyncio.run(measure(three_step, 0))
+    single = asyncio.run(measure(ingest, receipts))
+    return {
+        "receipts": receipts,
+        "model_latency_s": model_latency,
+        "rtt_s": rtt,
+        "three_step": summarize(three),
+        "ingest": summarize(single),
+        "speedup_p50": round(statistics.median(three) / statistics.median(single), 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--receipts", type=int, default=20)
+    parser.add_argument("--model-latency", type=float, default=0.8)
+    parser.add_argument("--rtt", type=float, default=0.15)
+    args = parser.parse_args()
+    print(json.dumps(run(args.receipts, args.model_latency, args.rtt), indent=2))
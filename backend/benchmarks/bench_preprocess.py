@@ -0,0 +1,77 @@
+"""
+Benchmark the image preprocessing stage against forwarding the raw upload.
+
+Generates a synthetic phone-sized JPEG (or uses --image), then reports the
+payload size and decode time for the raw image vs. each preprocess config.
+Gemini latency tracks payload size, so the byte counts are the proxy here.
+
+Usage (from backend/app):
+    python ../benchmarks/bench_preprocess.py
+    python ../benchmarks/bench_preprocess.py --image receipt.jpg --repeat 10
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from PIL import Image, ImageDraw
+
+from services.image_service import PreprocessConfig, RECEIPT_PREPROCESS, PHOTO_PREPROCESS, preprocess_image
+
+
+def synthetic_receipt(width: int = 3024, height: int = 4032) -> bytes:
+    # Off-white paper with mild sensor noise, roughly the entropy of a real photo
+    noise = Image.effect_noise((width, height), 12).convert("RGB")
+    image = Image.blend(Image.new("RGB", (width, height), (236, 232, 222)), noise, 0.15)
+    draw = ImageDraw.Draw(image)
+    for y in range(100, height - 100, 60):
+        draw.text((200, y), f"ITEM {y:05d} ........ ${y % 97}.{y % 100:02d}", fill=(0, 0, 0))
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=95)
+    return out.getvalue()
+
+
+def time_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def run(image_bytes: bytes, repeat: int) -> dict:
+    def full_decode():
+        Image.open(io.BytesIO(image_bytes)).load()
+
+    configs = {
+        "receipt": RECEIPT_PREPROCESS,
+        "photo": PHOTO_PREPROCESS,
+        "receipt_webp": PreprocessConfig(max_long_edge=RECEIPT_PREPROCESS.max_long_edge, grayscale=True, format="WEBP"),
+    }
+    results = {"raw": {"bytes": len(image_bytes), "decode_ms": time_ms(full_decode, repeat)}}
+    for name, config in configs.items():
+        out = preprocess_image(image_bytes, config)
+        results[name] = {
+            "config": vars(config),
+            "bytes": len(out.data),
+            "size": [out.width, out.height],
+            "decode_ms": round(out.decode_ms, 2),
+            "preprocess_ms": time_ms(lambda: preprocess_image(image_bytes, config), repeat),
+            "size_reduction": round(len(image_bytes) / len(out.data), 1),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image", help="path to a real receipt photo")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    data = open(args.image, "rb").read() if args.image else synthetic_receipt()
+    print(json.dumps(run(data, args.repeat), indent=2))
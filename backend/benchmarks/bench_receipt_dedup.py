@@ -0,0 +1,234 @@
+"""
+Benchmark receipt rescan detection: lookup latency of the multi-index hash
+table, and how far apart phash puts rescans vs. different receipts.
+
+Lookups: --entries random 128-bit hashes are stored, and each query is a
+stored hash with up to --radius bits flipped (a hit) or a fresh random hash
+(a miss). "per_user" is the production layout, --per-user receipts per
+user; "single_table" puts everything in one table at a few radii and
+checks the results against a brute-force popcount scan.
+
+Distances: synthetic receipt photos are rescanned (rotated a few degrees,
+cropped, brightened, shifted, re-encoded) and compared with other
+receipts, through the real preprocess_image(..., fingerprint=True) path.
+"different" receipts vary in layout; "same_store" ones share the paper,
+position and printed header and differ only in their line items, like
+two trips to the same shop. "within_radius" is the share of rescans that
+would be caught, and of different-receipt pairs that would be wrongly
+matched.
+
+Usage (from backend/app):
+    python ../benchmarks/bench_receipt_dedup.py
+    python ../benchmarks/bench_receipt_dedup.py --entries 500000 --queries 5000 --radius 28
+"""
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from PIL import Image, ImageDraw, ImageEnhance
+
+from services.dedup_service import RECEIPT_DEDUP_MAX_PER_USER, RECEIPT_DEDUP_RADIUS, MultiIndexHashTable, NearDuplicateIndex
+from services.image_service import RECEIPT_PREPROCESS, preprocess_image
+
+
+def percentile(samples: list[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def flip_bits(value: int, count: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(128), count):
+        value ^= 1 << bit
+    return value
+
+
+def make_probes(hashes: list[int], queries: int, radius: int, rng: random.Random) -> list[int]:
+    # Half near a stored hash, half fresh (almost surely misses)
+    return [
+        flip_bits(rng.choice(hashes), rng.randint(0, radius), rng) if i % 2 == 0 else rng.getrandbits(128)
+        for i in range(queries)
+    ]
+
+
+def time_us(fn, probes: list) -> list[float]:
+    samples = []
+    for probe in probes:
+        start = time.perf_counter()
+        fn(probe)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def bench_per_user(entries: int, per_user: int, queries: int, radius: int, seed: int) -> dict:
+    """The production layout: `entries` receipts spread over users, each looked up in its own table."""
+    rng = random.Random(seed)
+    users = max(1, entries // per_user)
+    index = NearDuplicateIndex(radius, per_user, window_seconds=float("inf"))
+    hashes = {}
+    for u in range(users):
+        hashes[u] = [rng.getrandbits(128) for _ in range(per_user)]
+        for i, value in enumerate(hashes[u]):
+            index.add(str(u), str(i), value, {})
+    probes = [(str(u), value) for u in rng.choices(range(users), k=queries)
+              for value in make_probes(hashes[int(u)], 1, radius, rng)]
+    samples = time_us(lambda probe: index.nearest(*probe), probes)
+    return {
+        "entries": users * per_user,
+        "users": users,
+        "radius": radius,
+        "p50_us": round(percentile(samples, 0.5), 1),
+        "p99_us": round(percentile(samples, 0.99), 1),
+    }
+
+
+def bench_single_table(entries: int, queries: int, radii: list[int], seed: int) -> dict:
+    """Every receipt in one table, to show how multi-index probing scales with the radius."""
+    rng = random.Random(seed)
+    hashes = [rng.getrandbits(128) for _ in range(entries)]
+    table = MultiIndexHashTable()
+    for i, value in enumerate(hashes):
+        table.add(value, i)
+
+    def scan(value: int, radius: int) -> list[int]:
+        return [i for i, stored in enumerate(hashes) if (stored ^ value).bit_count() <= radius]
+
+    scan_us = time_us(lambda value: scan(value, max(radii)), make_probes(hashes, max(2, queries // 100), 0, rng))
+    result = {"entries": entries, "scan_p50_us": round(percentile(scan_us, 0.5), 1), "radii": {}}
+    for radius in radii:
+        probes = make_probes(hashes, queries, radius, rng)
+        samples = time_us(lambda value: table.search(value, radius), probes)
+        # Exactness check against the scan on a sample of the probes
+        exact = all(
+            sorted(payload for _, payload in table.search(value, radius)) == scan(value, radius)
+            for value in probes[:20]
+        )
+        result["radii"][radius] = {
+            "p50_us": round(percentile(samples, 0.5), 1),
+            "p99_us": round(percentile(samples, 0.99), 1),
+            "exact": exact,
+        }
+    return result
+
+
+def synthetic_receipt(rng: random.Random) -> Image.Image:
+    # A receipt of random length and layout lying on a darker table
+    width, height = 1512, 2016
+    image = Image.new("RGB", (width, height), tuple(rng.randint(60, 120) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    left, top = rng.randint(150, 450), rng.randint(80, 300)
+    right, bottom = left + rng.randint(700, 950), min(height - 60, top + rng.randint(1000, 1800))
+    draw.rectangle((left, top, right, bottom), fill=(238, 234, 224))
+    y = top + 60
+    while y < bottom - 60:
+        line = rng.randint(80, right - left - 120)
+        draw.rectangle((left + 50, y, left + 50 + line, y + rng.choice((14, 18, 30))), fill=(30, 30, 30))
+        y += rng.randint(35, 90)
+    return image
+
+
+def same_store_receipt(rng: random.Random, store: str) -> Image.Image:
+    # Same paper, placement and header for every receipt of `store`; only the
+    # number and length of the item lines change
+    layout = random.Random(store)
+    width, height = 1512, 2016
+    image = Image.new("RGB", (width, height), (90, 80, 70))
+    draw = ImageDraw.Draw(image)
+    left, top, right = 300, 150, 1200
+    bottom = top + rng.randint(1100, 1700)
+    draw.rectangle((left, top, right, bottom), fill=(238, 234, 224))
+    y = top + 40
+    for _ in range(4):
+        half = layout.randint(150, 350)
+        center = (left + right) // 2
+        draw.rectangle((center - half, y, center + half, y + 30), fill=(30, 30, 30))
+        y += 55
+    y += 40
+    while y < bottom - 200:
+        line = rng.randint(200, 600)
+        draw.rectangle((left + 50, y, left + 50 + line, y + 18), fill=(30, 30, 30))
+        draw.rectangle((right - 170, y, right - 50, y + 18), fill=(30, 30, 30))
+        y += 45
+    draw.rectangle((left + 50, bottom - 150, right - 50, bottom - 120), fill=(30, 30, 30))
+    return image
+
+
+def rescan(image: Image.Image, rng: random.Random) -> Image.Image:
+    width, height = image.size
+    angle = rng.uniform(-3, 3)
+    image = image.rotate(angle, resample=Image.Resampling.BILINEAR, fillcolor=image.getpixel((5, 5)))
+    crop = rng.uniform(0, 0.04)
+    dx, dy = rng.uniform(-0.02, 0.02), rng.uniform(-0.02, 0.02)
+    box = (
+        int(width * (crop + max(dx, 0))), int(height * (crop + max(dy, 0))),
+        int(width * (1 - crop + min(dx, 0))), int(height * (1 - crop + min(dy, 0))),
+    )
+    image = image.crop(box)
+    image = ImageEnhance.Brightness(image).enhance(rng.uniform(0.75, 1.3))
+    return image.resize((int(image.width * rng.uniform(0.7, 1.3)), int(image.height * rng.uniform(0.7, 1.3))))
+
+
+def jpeg(image: Image.Image, quality: int) -> bytes:
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def fingerprint(image: Image.Image, quality: int = 90) -> int:
+    return preprocess_image(jpeg(image, quality), RECEIPT_PREPROCESS, fingerprint=True).fingerprint
+
+
+def bench_distances(receipts: int, rescans: int, radius: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    originals = [synthetic_receipt(rng) for _ in range(receipts)]
+    hashes = [fingerprint(image) for image in originals]
+
+    same = [
+        (fingerprint(rescan(image, rng), rng.randint(60, 95)) ^ value).bit_count()
+        for image, value in zip(originals, hashes)
+        for _ in range(rescans)
+    ]
+    different = [(a ^ b).bit_count() for i, a in enumerate(hashes) for b in hashes[i + 1:]]
+    store = [fingerprint(same_store_receipt(rng, "store")) for _ in range(receipts)]
+    same_store = [(a ^ b).bit_count() for i, a in enumerate(store) for b in store[i + 1:]]
+
+    def summary(distances: list[int]) -> dict:
+        return {
+            "min": min(distances),
+            "p50": statistics.median(distances),
+            "p99": percentile(distances, 0.99),
+            "max": max(distances),
+            "within_radius": round(sum(d <= radius for d in distances) / len(distances), 3),
+        }
+
+    return {
+        "receipts": receipts,
+        "radius": radius,
+        "rescan": summary(same),
+        "different": summary(different),
+        "same_store": summary(same_store),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=300_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--radius", type=int, default=RECEIPT_DEDUP_RADIUS)
+    parser.add_argument("--per-user", type=int, default=RECEIPT_DEDUP_MAX_PER_USER)
+    parser.add_argument("--receipts", type=int, default=25)
+    parser.add_argument("--rescans", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(json.dumps({
+        "per_user": bench_per_user(args.entries, args.per_user, args.queries, args.radius, args.seed),
+        "single_table": bench_single_table(args.entries, args.queries, sorted({8, 12, 16, args.radius}), args.seed),
+        "phash_distances": bench_distances(args.receipts, args.rescans, args.radius, args.seed),
+    }, indent=2))
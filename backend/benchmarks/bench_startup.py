@@ -0,0 +1,102 @@
+"""
+Cold-start cost of the API: time to `import main` and peak RSS afterwards.
+
+Each sample is a fresh interpreter, so nothing is warm except the OS page
+cache. Two variants are measured:
+
+  lazy      `import main`, what a uvicorn worker (or a dev server) pays
+  preload   `import main` + `preload_shared_state()`, what the gunicorn
+            master pays once before forking (see app/gunicorn.conf.py)
+
+It also checks that the SDKs meant to load on first use (Gemini, Supabase,
+Pillow, transcripts, pyinstrument) are not imported by `import main`, and
+exits non-zero if they are or if a budget is exceeded, so it can run in CI:
+
+Usage (from backend/app):
+    python ../benchmarks/bench_startup.py --runs 5
+    python ../benchmarks/bench_startup.py --max-import-ms 1200 --max-rss-mb 200
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+# Must not be imported at startup; each is loaded by the first request that needs it
+LAZY_MODULES = ("google.generativeai", "google.api_core", "supabase", "PIL", "youtube_transcript_api", "pyinstrument")
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import main
+import_ms = (time.perf_counter() - start) * 1000
+if {preload}:
+    main.preload_shared_state()
+total_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{
+    "import_ms": import_ms,
+    "total_ms": total_ms,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+    "eager": [m for m in {lazy!r} if m in sys.modules],
+}}))
+"""
+
+
+def sample(preload: bool) -> dict:
+    env = {
+        **os.environ,
+        "SUPABASE_URL": os.environ.get("SUPABASE_URL", "http://localhost:54321"),
+        "SUPABASE_KEY": os.environ.get("SUPABASE_KEY", "bench.bench.bench"),
+        "PYTHONPATH": APP_DIR,
+        "PROFILING_ENABLED": "0",
+    }
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(preload=preload, lazy=LAZY_MODULES)],
+        cwd=APP_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples: list[dict]) -> dict:
+    return {
+        "import_ms_p50": round(statistics.median(s["import_ms"] for s in samples), 1),
+        "total_ms_p50": round(statistics.median(s["total_ms"] for s in samples), 1),
+        "rss_mb_p50": round(statistics.median(s["rss_mb"] for s in samples), 1),
+        "modules": samples[-1]["modules"],
+    }
+
+
+def run(runs: int) -> dict:
+    lazy = [sample(preload=False) for _ in range(runs)]
+    preload = [sample(preload=True) for _ in range(runs)]
+    return {
+        "runs": runs,
+        "lazy": summarize(lazy),
+        "preload": summarize(preload),
+        "eager_imports": lazy[-1]["eager"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=None, help="fail if `import main` p50 is slower")
+    parser.add_argument("--max-rss-mb", type=float, default=None, help="fail if RSS after `import main` p50 is larger")
+    args = parser.parse_args()
+
+    result = run(args.runs)
+    print(json.dumps(result, indent=2))
+
+    failures = []
+    if result["eager_imports"]:
+        failures.append(f"imported at startup: {', '.join(result['eager_imports'])}")
+    if args.max_import_ms is not None and result["lazy"]["import_ms_p50"] > args.max_import_ms:
+        failures.append(f"import {result['lazy']['import_ms_p50']}ms > {args.max_import_ms}ms")
+    if args.max_rss_mb is not None and result["lazy"]["rss_mb_p50"] > args.max_rss_mb:
+        failures.append(f"RSS {result['lazy']['rss_mb_p50']}MB > {args.max_rss_mb}MB")
+    if failures:
+        sys.exit("startup regression: " + "; ".join(failures))
@@ -0,0 +1,471 @@
+"""
+Load test: the whole API under a mixed workload at rising concurrency.
+
+Runs fully offline. The real app is served by uvicorn in a subprocess with
+two deterministic stand-ins:
+
+  Gemini     a fake model whose latency is log-normal (--model-latency-ms
+             median, --model-latency-sigma spread) and which fails with a
+             retryable ServiceUnavailable at --model-error-rate, so the
+             client's retries, backoff and 503s are exercised too
+  Supabase   the in-memory backend (db_memory.py), each call taking a
+             log-normal --db-latency-ms like a PostgREST round trip
+
+Both are seeded by --seed, as is the workload. Before measuring, --users
+users get an inventory and a few saved recipes. Then, for each
+concurrency level, that many clients issue requests back to back for
+--duration seconds, each request picked from the --mix weights:
+
+  scan        POST /items/ingest-receipt (dedupe on) with a new receipt
+              photo, or at --rescan-rate a re-shot of one the user scanned
+              before
+  items       GET  /items/get-items (first page of 100)
+  stats       GET  /items/stats
+  expiring    GET  /items/expiring
+  recipes     GET  /user/recipes
+  cookable    GET  /user/recipes/cookable
+  save        POST /user/save_recipe
+
+Per level it reports throughput, p50/p95/p99 latency overall and per
+operation, status codes, and the server's RSS. Results are JSON (stdout,
+and --output) stamped with the git commit, so runs can be compared:
+--baseline diffs against an earlier file and exits non-zero when a level's
+throughput drops, or its p95/p99 rise, by more than --max-regression.
+
+Usage (from backend/app):
+    python ../benchmarks/loadtest.py --levels 1,4,16,64 --duration 10 --output before.json
+    python ../benchmarks/loadtest.py --baseline before.json --max-regression 0.15
+    python ../benchmarks/loadtest.py --mix scan=1,items=1 --model-error-rate 0.05
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import types
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+OPERATIONS = ("scan", "items", "stats", "expiring", "recipes", "cookable", "save")
+DEFAULT_MIX = "scan=2,items=6,stats=2,expiring=2,recipes=2,cookable=1,save=1"
+
+# Names the shelf-life table knows, so ingest never needs a second Gemini pass
+FOODS = [
+    ("Whole Milk", "R"), ("Greek Yogurt", "R"), ("Cheddar Cheese", "R"), ("Butter", "R"),
+    ("Eggs", "R"), ("Chicken Thighs", "R"), ("Ground Beef", "R"), ("Salmon Fillet", "R"),
+    ("Bacon", "R"), ("Spinach", "R"), ("Strawberries", "R"), ("Sourdough Bread", "S"),
+    ("Bananas", "S"), ("Tortillas", "S"), ("Tofu", "R"), ("Heavy Cream", "R"),
+]
+
+
+def lognormal(rng: random.Random, median_ms: float, sigma: float) -> float:
+    """Seconds; half the samples fall below `median_ms`, with a right tail set by `sigma`."""
+    if median_ms <= 0:
+        return 0.0
+    return median_ms * math.exp(sigma * rng.gauss(0, 1)) / 1000
+
+
+# --- server side -------------------------------------------------------------
+
+class FakeGemini:
+    """
+    Stands in for `GenerativeModel`. The receipt it "reads" is derived from
+    the image bytes, so the same photo always yields the same items.
+    """
+
+    def __init__(self, median_ms: float, sigma: float, error_rate: float, seed: int):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, generation_config=None, stream=False):
+        from google.api_core.exceptions import ServiceUnavailable
+
+        with self._lock:
+            delay = lognormal(self._rng, self.median_ms, self.sigma)
+            fail = self._rng.random() < self.error_rate
+        time.sleep(delay)
+        if fail:
+            raise ServiceUnavailable("load test: injected model error")
+
+        image = next((part["data"] for part in contents if isinstance(part, dict)), None) \
+            if isinstance(contents, list) else None
+        if image is None:
+            # Expiration prediction for items the shelf-life table missed
+            return types.SimpleNamespace(text=json.dumps({"items": []}))
+        receipt = random.Random(hashlib.sha256(image).digest())
+        today = date.today().isoformat()
+        items = [
+            {"name": name, "date_bought": today, "price": round(receipt.uniform(0.5, 15), 2),
+             "estimated_expiration": None, "storage_option": storage}
+            for name, storage in receipt.sample(FOODS, receipt.randint(3, 12))
+        ]
+        return types.SimpleNamespace(text=json.dumps({"items": items}))
+
+
+def serve(args) -> None:
+    """Entry point of the server subprocess: install the fakes, then run uvicorn."""
+    sys.path.insert(0, APP_DIR)
+    import uvicorn
+
+    import db
+    import main
+    from db_memory import InMemorySupabase
+    from services.inference_client import gemini
+
+    db_rng, db_lock = random.Random(args.seed + 1), threading.Lock()
+
+    def db_latency() -> float:
+        with db_lock:
+            return lognormal(db_rng, args.db_latency_ms, args.db_latency_sigma)
+
+    # Installed before the lifespan's init_supabase(), which then keeps it
+    db._client = InMemorySupabase(latency=db_latency)
+    gemini._model = FakeGemini(args.model_latency_ms, args.model_latency_sigma, args.model_error_rate, args.seed)
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+
+def start_server(args) -> subprocess.Popen:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        args.port = s.getsockname()[1]
+    env = {
+        **os.environ,
+        "SUPABASE_URL": os.environ.get("SUPABASE_URL", "http://localhost:54321"),
+        "SUPABASE_KEY": os.environ.get("SUPABASE_KEY", "bench.bench.bench"),
+        "SUPABASE_BACKEND": "memory",
+        "PYTHONPATH": APP_DIR,
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        # Don't let the quota limiter shape the measurement unless asked to
+        "GEMINI_RATE_PER_MINUTE": os.environ.get("GEMINI_RATE_PER_MINUTE", "1000000"),
+        "GEMINI_BURST": os.environ.get("GEMINI_BURST", "10000"),
+    }
+    argv = [sys.executable, os.path.abspath(__file__), "--serve"] + [
+        f"--{name.replace('_', '-')}={getattr(args, name)}"
+        for name in ("port", "seed", "model_latency_ms", "model_latency_sigma", "model_error_rate",
+                     "db_latency_ms", "db_latency_sigma")
+    ]
+    # Server logs go to stderr; stdout is reserved for the results
+    return subprocess.Popen(argv, cwd=APP_DIR, env=env, stdout=sys.stderr)
+
+
+def server_memory(pid: int) -> dict:
+    """Current and peak RSS of the server process, in MB (Linux)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+    except OSError:
+        return {}
+    return {
+        "rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+        "peak_rss_mb": round(int(fields["VmHWM"].split()[0]) / 1024, 1),
+    }
+
+
+# --- workload ----------------------------------------------------------------
+
+def receipt_photo(blocks: list[int], rng: random.Random) -> bytes:
+    """
+    A receipt-like photo rendered from a grid of block shades. Re-rendering
+    the same grid with a small shift and exposure change gives a rescan.
+    """
+    from PIL import Image, ImageEnhance
+
+    grid = Image.frombytes("L", (6, 12), bytes(blocks)).resize((360, 720), Image.Resampling.BILINEAR)
+    dx, dy = rng.randint(0, 12), rng.randint(0, 24)
+    photo = grid.crop((dx, dy, dx + 340, dy + 680))
+    photo = ImageEnhance.Brightness(photo).enhance(rng.uniform(0.9, 1.1))
+    out = io.BytesIO()
+    photo.save(out, format="JPEG", quality=rng.randint(75, 92))
+    return out.getvalue()
+
+
+class Workload:
+    def __init__(self, users: list[str], mix: dict[str, float], rescan_rate: float):
+        self.users = users
+        self.ops = list(mix)
+        self.weights = [mix[op] for op in self.ops]
+        self.rescan_rate = rescan_rate
+        # Per user: block grids of receipts scanned so far
+        self.receipts: dict[str, list[list[int]]] = {user: [] for user in users}
+
+    async def scan(self, client, user: str, rng: random.Random):
+        previous = self.receipts[user]
+        if previous and rng.random() < self.rescan_rate:
+            blocks = rng.choice(previous)
+        else:
+            blocks = [rng.randrange(256) for _ in range(72)]
+            previous.append(blocks)
+        response = await client.post(
+            "/items/ingest-receipt",
+            files={"file": ("receipt.jpg", receipt_photo(blocks, rng), "image/jpeg")},
+            data={"user_uuid": user, "dedupe": "true"},
+        )
+        return response, response.json().get("status") if response.status_code == 200 else None
+
+    async def items(self, client, user, rng):
+        return await client.get("/items/get-items", params={"user_uuid": user, "limit": 100}), None
+
+    async def stats(self, client, user, rng):
+        return await client.get("/items/stats", params={"user_uuid": user}), None
+
+    async def expiring(self, client, user, rng):
+        return await client.get("/items/expiring", params={"user_uuid": user, "days": 7}), None
+
+    async def recipes(self, client, user, rng):
+        return await client.get("/user/recipes", params={"user_uuid": user, "limit": 20}), None
+
+    async def cookable(self, client, user, rng):
+        return await client.get("/user/recipes/cookable", params={"user_uuid": user}), None
+
+    async def save(self, client, user, rng):
+        ingredients = [name.lower() for name, _ in rng.sample(FOODS, rng.randint(3, 7))]
+        recipe = {
+            "title": f"Load test dish {rng.randrange(10 ** 6)}",
+            "cookTime": f"{rng.randint(10, 90)} minutes",
+            "difficulty": rng.choice(["Easy", "Medium", "Hard"]),
+            "servings": rng.randint(1, 6),
+            "ingredients": ingredients,
+            "steps": [f"Step with {name}" for name in ingredients],
+        }
+        response = await client.post("/user/save_recipe", json={"userId": user, "recipe": recipe})
+        ok = response.status_code == 200 and response.json().get("success")
+        return response, None if ok else "failed"
+
+    async def setup(self, client, rng: random.Random, items_per_user: int, recipes_per_user: int) -> None:
+        """Give every user an inventory and some saved recipes; not measured."""
+        for user in self.users:
+            today = date.today()
+            items = [
+                {"name": name, "price": round(rng.uniform(0.5, 15), 2), "date_bought": today.isoformat(),
+                 "estimated_expiration": (today + timedelta(days=rng.randint(-3, 30))).isoformat(),
+                 "storage_location": storage}
+                for name, storage in (rng.choice(FOODS) for _ in range(items_per_user))
+            ]
+            response = await client.post("/items/finalize-items", json={"user_uuid": user, "items_json": {"items": items}})
+            response.raise_for_status()
+            for _ in range(recipes_per_user):
+                response, failed = await self.save(client, user, rng)
+                if failed:
+                    raise RuntimeError(f"setup: saving a recipe failed: {response.text}")
+
+
+def percentile(samples: list[float], q: float) -> float:
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def latency_summary(samples: list[float]) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        "p50": round(percentile(ordered, 0.50) * 1000, 2),
+        "p95": round(percentile(ordered, 0.95) * 1000, 2),
+        "p99": round(percentile(ordered, 0.99) * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+        "mean": round(statistics.fmean(ordered) * 1000, 2),
+    }
+
+
+async def run_level(client, workload: Workload, concurrency: int, duration: float, warmup: float, seed: int) -> dict:
+    # (op, status, seconds, outcome) for requests that finished inside the window
+    samples: list[tuple[str, int, float, str | None]] = []
+    start = time.perf_counter()
+    window_start, window_end = start + warmup, start + warmup + duration
+
+    async def worker(n: int) -> None:
+        rng = random.Random(f"{seed}:{concurrency}:{n}")
+        while time.perf_counter() < window_end:
+            op = rng.choices(workload.ops, workload.weights)[0]
+            user = rng.choice(workload.users)
+            began = time.perf_counter()
+            try:
+                response, outcome = await getattr(workload, op)(client, user, rng)
+                status = response.status_code
+            except Exception as e:
+                status, outcome = 0, type(e).__name__
+            finished = time.perf_counter()
+            if window_start <= began and finished <= window_end:
+                samples.append((op, status, finished - began, outcome))
+
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+
+    def summarize(rows) -> dict:
+        statuses = Counter(str(status) for _, status, _, _ in rows)
+        errors = sum(1 for _, status, _, _ in rows if not 200 <= status < 400)
+        summary = {
+            "requests": len(rows),
+            "rps": round(len(rows) / duration, 2),
+            "errors": errors,
+            "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+            "status": dict(sorted(statuses.items())),
+            "latency_ms": latency_summary([seconds for _, status, seconds, _ in rows if 200 <= status < 400]),
+        }
+        outcomes = Counter(outcome for _, _, _, outcome in rows if outcome)
+        if outcomes:
+            summary["outcomes"] = dict(sorted(outcomes.items()))
+        return summary
+
+    return {
+        "concurrency": concurrency,
+        **summarize(samples),
+        "operations": {op: summarize([s for s in samples if s[0] == op]) for op in workload.ops},
+    }
+
+
+async def drive(args, server: subprocess.Popen) -> list[dict]:
+    import httpx
+
+    levels = [int(level) for level in args.levels.split(",")]
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=args.timeout) as client:
+        for _ in range(300):
+            if server.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            try:
+                await client.get("/")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError("server did not come up")
+
+        rng = random.Random(args.seed)
+        users = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(args.users)]
+        workload = Workload(users, parse_mix(args.mix), args.rescan_rate)
+        await workload.setup(client, rng, args.items_per_user, args.recipes_per_user)
+
+        results = []
+        for concurrency in levels:
+            level = await run_level(client, workload, concurrency, args.duration, args.warmup, args.seed)
+            level["server"] = server_memory(server.pid)
+            level["inference"] = (await client.get("/gem/inference-stats")).json()
+            results.append(level)
+            print(f"concurrency {concurrency:>4}: {level['rps']:>8} rps  "
+                  f"p50 {level['latency_ms'].get('p50')} ms  p99 {level['latency_ms'].get('p99')} ms  "
+                  f"errors {level['errors']}", file=sys.stderr)
+        return results
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        op, _, weight = part.partition("=")
+        op = op.strip()
+        if op not in OPERATIONS:
+            raise SystemExit(f"unknown operation in --mix: {op}")
+        mix[op] = float(weight or 1)
+    return mix
+
+
+def git_revision() -> dict:
+    def git(*argv: str) -> str:
+        return subprocess.run(["git", *argv], cwd=APP_DIR, capture_output=True, text=True).stdout.strip()
+
+    return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--", "."))}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> dict:
+    """Relative change per level against `baseline`; regressions are those worse than `tolerance`."""
+    before = {level["concurrency"]: level for level in baseline["levels"]}
+    changes, regressions = [], []
+    for level in results["levels"]:
+        old = before.get(level["concurrency"])
+        if old is None or not old["rps"]:
+            continue
+        change = {"concurrency": level["concurrency"], "rps": round(level["rps"] / old["rps"] - 1, 4)}
+        if -change["rps"] > tolerance:
+            regressions.append(f"c={level['concurrency']} rps {old['rps']} -> {level['rps']}")
+        for q in ("p95", "p99"):
+            old_ms, new_ms = old["latency_ms"].get(q), level["latency_ms"].get(q)
+            if old_ms and new_ms:
+                change[q] = round(new_ms / old_ms - 1, 4)
+                if change[q] > tolerance:
+                    regressions.append(f"c={level['concurrency']} {q} {old_ms}ms -> {new_ms}ms")
+        changes.append(change)
+    return {"baseline_commit": baseline.get("meta", {}).get("commit"), "tolerance": tolerance,
+            "levels": changes, "regressions": regressions}
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--levels", default="1,4,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=2, help="unmeasured seconds before each level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight,... (see module docstring)")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--items-per-user", type=int, default=40)
+    parser.add_argument("--recipes-per-user", type=int, default=5)
+    parser.add_argument("--rescan-rate", type=float, default=0.1, help="share of scans that re-shoot an earlier receipt")
+    parser.add_argument("--model-latency-ms", type=float, default=800)
+    parser.add_argument("--model-latency-sigma", type=float, default=0.4)
+    parser.add_argument("--model-error-rate", type=float, default=0.0)
+    parser.add_argument("--db-latency-ms", type=float, default=8)
+    parser.add_argument("--db-latency-sigma", type=float, default=0.3)
+    parser.add_argument("--timeout", type=float, default=60, help="client timeout per request, seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON results here")
+    parser.add_argument("--baseline", help="results file from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="with --baseline, fail if rps drops or p95/p99 rise by more than this fraction")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    parse_mix(args.mix)
+    server = start_server(args)
+    try:
+        levels = asyncio.run(drive(args, server))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    options = {k: v for k, v in vars(args).items() if k not in ("serve", "port", "output", "baseline", "max_regression")}
+    results = {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "options": options,
+        },
+        "levels": levels,
+    }
+    failed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(results, json.load(f), args.max_regression if args.max_regression is not None else 0.1)
+        results["comparison"] = comparison
+        failed = args.max_regression is not None and bool(comparison["regressions"])
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if failed:
+        sys.exit("load test regression: " + "; ".join(results["comparison"]["regressions"]))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,32 @@
+-- Save a recipe with its ingredients and steps in one call.
+-- Runs as a single transaction: either all three inserts land or none do.
+-- Called from user_service.save_recipe_in_db via supabase.rpc("save_recipe", ...).
+create or replace function public.save_recipe(p_user_uuid uuid, p_recipe jsonb)
+returns bigint
+language plpgsql
+as $$
+declare
+  v_recipe_id bigint;
+begin
+  insert into public.recipes (user_uuid, title, cook_time, difficulty, servings, url)
+  values (
+    p_user_uuid,
+    coalesce(p_recipe->>'title', 'Untitled'),
+    p_recipe->>'cook_time',
+    coalesce(p_recipe->>'difficulty', 'Easy'),
+    coalesce((p_recipe->>'servings')::int, 1),
+    p_recipe->>'url'
+  )
+  returning id into v_recipe_id;
+
+  insert into public.recipe_ingredients (recipe_id, ingredient)
+  select v_recipe_id, ingredient
+  from jsonb_array_elements_text(coalesce(p_recipe->'ingredients', '[]'::jsonb)) as ingredient;
+
+  insert into public.recipe_steps (recipe_id, step_number, instruction)
+  select v_recipe_id, step.ordinality, step.value
+  from jsonb_array_elements_text(coalesce(p_recipe->'steps', '[]'::jsonb)) with ordinality as step(value, ordinality);
+
+  return v_recipe_id;
+end;
+$$;
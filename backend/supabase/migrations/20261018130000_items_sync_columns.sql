@@ -0,0 +1,22 @@
+-- Change tracking for incremental inventory sync (/items/get-items?since=...).
+alter table public.items
+  add column if not exists updated_at timestamptz not null default now();
+
+create or replace function public.touch_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+  new.updated_at = now();
+  return new;
+end;
+$$;
+
+drop trigger if exists items_touch_updated_at on public.items;
+create trigger items_touch_updated_at
+  before update on public.items
+  for each row execute function public.touch_updated_at();
+
+-- Keyset pagination and "what changed since" lookups per user
+create index if not exists items_user_id_idx on public.items (user_uuid, id);
+create index if not exists items_user_updated_idx on public.items (user_uuid, updated_at desc);
@@ -0,0 +1,4 @@
+-- When an item was eaten/used. Null means still in the inventory (or thrown out
+-- once it expired). Drives the spend / savings analytics.
+alter table public.items
+  add column if not exists consumed_at timestamptz;
@@ -0,0 +1,9 @@
+-- Range lookups for the expiring-soon index and digest scheduler: per user,
+-- and across all users for the day(s) that just entered the digest window.
+create index if not exists items_user_expiration_idx
+  on public.items (user_uuid, estimated_expiration)
+  where consumed_at is null;
+
+create index if not exists items_expiration_idx
+  on public.items (estimated_expiration)
+  where consumed_at is null;
@@ -0,0 +1,10 @@
+-- Idempotent receipt ingest (/items/ingest-receipt): each row remembers the
+-- upload it came from and its line on the receipt, so a retried upload
+-- conflicts on this index instead of inserting the items twice.
+alter table public.items
+  add column if not exists ingest_key text,
+  add column if not exists ingest_line integer;
+
+-- NULL keys (items added any other way) never conflict with each other
+create unique index if not exists items_ingest_key_idx
+  on public.items (user_uuid, ingest_key, ingest_line);
@@ -0,0 +1,90 @@
+-- Bulk inventory changes (/items/bulk) in one call and one transaction.
+-- Called from item_service.apply_item_changes via supabase.rpc("bulk_mutate_items", ...).
+--
+-- p_changes is one entry per item, already collapsed by item_service.collapse_changes:
+--   {"id": 12, "version": "<updated_at as last read>", "set": {...}, "consume": bool, "delete": bool}
+-- A row whose updated_at has moved past "version" was changed by someone else
+-- since the client read it: it is reported as a conflict and left untouched.
+-- With p_atomic, any conflict leaves the whole batch unapplied.
+--
+-- Besides the row lock, the work is two statements whatever the batch size: one
+-- UPDATE for every set/consume (skipping rows whose values wouldn't change, so
+-- their updated_at doesn't move) and one DELETE.
+create or replace function public.bulk_mutate_items(p_user_uuid uuid, p_changes jsonb, p_atomic boolean default false)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v_before jsonb;
+  v_conflicts jsonb;
+  v_skip bigint[];
+  v_updated jsonb;
+  v_deleted jsonb;
+begin
+  -- Lock the targeted rows and keep their current state, keyed by id
+  select coalesce(jsonb_object_agg(cur.id::text, to_jsonb(cur)), '{}'::jsonb)
+    into v_before
+    from (
+      select i.*
+        from public.items i
+       where i.user_uuid = p_user_uuid
+         and i.id in (select (c->>'id')::bigint from jsonb_array_elements(p_changes) c)
+         for update
+    ) cur;
+
+  select coalesce(jsonb_agg(jsonb_build_object(
+           'id', c.id,
+           'reason', case when v_before ? c.id::text then 'version' else 'missing' end,
+           'current', v_before -> c.id::text)), '[]'::jsonb),
+         coalesce(array_agg(c.id), '{}')
+    into v_conflicts, v_skip
+    from jsonb_to_recordset(p_changes) as c(id bigint, version timestamptz)
+   where not v_before ? c.id::text
+      or (c.version is not null and (v_before -> c.id::text ->> 'updated_at')::timestamptz <> c.version);
+
+  if p_atomic and jsonb_array_length(v_conflicts) > 0 then
+    return jsonb_build_object('updated', '[]'::jsonb, 'deleted', '[]'::jsonb,
+                              'before', v_before, 'conflicts', v_conflicts);
+  end if;
+
+  with target as (
+    -- The row as it should end up: current values overlaid with "set"
+    select c.consume, jsonb_populate_record(cur, coalesce(c."set", '{}'::jsonb)) as n
+      from jsonb_to_recordset(p_changes) as c(id bigint, "set" jsonb, consume boolean, "delete" boolean)
+      join public.items cur on cur.id = c.id and cur.user_uuid = p_user_uuid
+     where not coalesce(c."delete", false)
+       and c.id <> all(v_skip)
+  ), updated as (
+    update public.items i
+       set name = (t.n).name,
+           price = (t.n).price,
+           date_bought = (t.n).date_bought,
+           estimated_expiration = (t.n).estimated_expiration,
+           storage_location = (t.n).storage_location,
+           consumed_at = case when t.consume then coalesce(i.consumed_at, now()) else i.consumed_at end
+      from target t
+     where i.id = (t.n).id
+       and (
+         ((t.n).name, (t.n).price, (t.n).date_bought, (t.n).estimated_expiration, (t.n).storage_location)
+           is distinct from (i.name, i.price, i.date_bought, i.estimated_expiration, i.storage_location)
+         or (coalesce(t.consume, false) and i.consumed_at is null)
+       )
+    returning i.*
+  )
+  select coalesce(jsonb_agg(to_jsonb(u)), '[]'::jsonb) into v_updated from updated u;
+
+  with deleted as (
+    delete from public.items i
+     using jsonb_to_recordset(p_changes) as c(id bigint, "delete" boolean)
+     where i.user_uuid = p_user_uuid
+       and i.id = c.id
+       and coalesce(c."delete", false)
+       and c.id <> all(v_skip)
+    returning i.*
+  )
+  select coalesce(jsonb_agg(to_jsonb(d)), '[]'::jsonb) into v_deleted from deleted d;
+
+  return jsonb_build_object('updated', v_updated, 'deleted', v_deleted,
+                            'before', v_before, 'conflicts', v_conflicts);
+end;
+$$;
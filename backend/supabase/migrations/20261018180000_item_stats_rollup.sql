@@ -0,0 +1,151 @@
+-- Per-user spend / consumption / waste totals for /items/stats, kept current by
+-- a trigger on items. Every write adds its row's contribution (and an update or
+-- delete first subtracts the old row's), so reading the stats costs the same
+-- however long the user's history is, and every worker sees the same numbers.
+-- Read through item_stats() from analytics_service.user_stats.
+create table if not exists public.item_stats_totals (
+  user_uuid uuid primary key,
+  item_count integer not null default 0,
+  total_spend numeric not null default 0,
+  consumed_count integer not null default 0,
+  consumed_value numeric not null default 0
+);
+
+-- Spend by the month items were bought
+create table if not exists public.item_stats_monthly (
+  user_uuid uuid not null,
+  month date not null,
+  spend numeric not null default 0,
+  primary key (user_uuid, month)
+);
+
+-- Per day: the value consumed that day, and the unconsumed items expiring that day
+create table if not exists public.item_stats_daily (
+  user_uuid uuid not null,
+  day date not null,
+  consumed_value numeric not null default 0,
+  expiring_count integer not null default 0,
+  expiring_value numeric not null default 0,
+  primary key (user_uuid, day)
+);
+
+-- "Expired so far" only reads days that still hold unconsumed items
+create index if not exists item_stats_daily_expiring_idx
+  on public.item_stats_daily (user_uuid, day)
+  where expiring_count <> 0;
+
+-- Add (p_sign = 1) or subtract (-1) one item row's contribution
+create or replace function public.item_stats_apply(p_row public.items, p_sign integer)
+returns void
+language plpgsql
+as $$
+declare
+  v_price numeric := p_sign * coalesce(p_row.price, 0);
+  v_consumed boolean := p_row.consumed_at is not null;
+  v_day date;
+begin
+  insert into public.item_stats_totals as t (user_uuid, item_count, total_spend, consumed_count, consumed_value)
+  values (p_row.user_uuid, p_sign, v_price,
+          case when v_consumed then p_sign else 0 end,
+          case when v_consumed then v_price else 0 end)
+  on conflict (user_uuid) do update
+     set item_count = t.item_count + excluded.item_count,
+         total_spend = t.total_spend + excluded.total_spend,
+         consumed_count = t.consumed_count + excluded.consumed_count,
+         consumed_value = t.consumed_value + excluded.consumed_value;
+
+  if p_row.date_bought is not null then
+    insert into public.item_stats_monthly as m (user_uuid, month, spend)
+    values (p_row.user_uuid, date_trunc('month', p_row.date_bought::date)::date, v_price)
+    on conflict (user_uuid, month) do update
+       set spend = m.spend + excluded.spend;
+  end if;
+
+  if v_consumed then
+    v_day := (p_row.consumed_at at time zone 'utc')::date;
+    insert into public.item_stats_daily as d (user_uuid, day, consumed_value)
+    values (p_row.user_uuid, v_day, v_price)
+    on conflict (user_uuid, day) do update
+       set consumed_value = d.consumed_value + excluded.consumed_value;
+  elsif p_row.estimated_expiration is not null then
+    v_day := p_row.estimated_expiration::date;
+    insert into public.item_stats_daily as d (user_uuid, day, expiring_count, expiring_value)
+    values (p_row.user_uuid, v_day, p_sign, v_price)
+    on conflict (user_uuid, day) do update
+       set expiring_count = d.expiring_count + excluded.expiring_count,
+           expiring_value = d.expiring_value + excluded.expiring_value;
+  else
+    return;
+  end if;
+
+  -- Keep the table proportional to live data
+  delete from public.item_stats_daily
+   where user_uuid = p_row.user_uuid and day = v_day
+     and consumed_value = 0 and expiring_count = 0;
+end;
+$$;
+
+create or replace function public.items_stats_trigger()
+returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op in ('UPDATE', 'DELETE') then
+    perform public.item_stats_apply(old, -1);
+  end if;
+  if tg_op in ('INSERT', 'UPDATE') then
+    perform public.item_stats_apply(new, 1);
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists items_stats on public.items;
+create trigger items_stats
+  after insert or update or delete on public.items
+  for each row execute function public.items_stats_trigger();
+
+-- Backfill from the existing items
+truncate public.item_stats_totals, public.item_stats_monthly, public.item_stats_daily;
+select public.item_stats_apply(i, 1) from public.items i;
+
+-- The /items/stats payload for one user, as of p_today
+create or replace function public.item_stats(p_user_uuid uuid, p_today date default current_date)
+returns jsonb
+language sql
+stable
+as $$
+  select jsonb_build_object(
+    'total_spend', round(coalesce(t.total_spend, 0), 2),
+    'monthly_spend', (
+      select coalesce(jsonb_agg(jsonb_build_object('month', to_char(m.month, 'YYYY-MM'), 'spend', round(m.spend, 2))
+                                order by m.month), '[]'::jsonb)
+        from public.item_stats_monthly m
+       where m.user_uuid = p_user_uuid
+    ),
+    'items', jsonb_build_object(
+      'total', coalesce(t.item_count, 0),
+      'consumed', coalesce(t.consumed_count, 0),
+      'expired', coalesce(e.expired, 0),
+      'active', coalesce(e.active, 0)
+    ),
+    'savings', jsonb_build_object(
+      'weekly', (
+        select round(coalesce(sum(d.consumed_value), 0), 2)
+          from public.item_stats_daily d
+         where d.user_uuid = p_user_uuid and d.day between p_today - 6 and p_today
+      ),
+      'lifetime', round(coalesce(t.consumed_value, 0), 2)
+    ),
+    'waste', jsonb_build_object('expired_value', round(coalesce(e.expired_value, 0), 2))
+  )
+  from (select p_user_uuid as user_uuid) u
+  left join public.item_stats_totals t on t.user_uuid = u.user_uuid
+  left join lateral (
+    select sum(d.expiring_count) filter (where d.day < p_today) as expired,
+           sum(d.expiring_count) filter (where d.day >= p_today) as active,
+           sum(d.expiring_value) filter (where d.day < p_today) as expired_value
+      from public.item_stats_daily d
+     where d.user_uuid = u.user_uuid and d.expiring_count <> 0
+  ) e on true;
+$$;
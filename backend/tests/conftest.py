@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# The app imports its modules from backend/app (`from services.x import y`)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+# Tests run against the in-memory database (db_memory.py), never a real project
+os.environ["SUPABASE_BACKEND"] = "memory"
+# Shared cache tiers default to files in the temp dir; give each run its own
+tempfile.tempdir = tempfile.mkdtemp(prefix="gobble-tests-")
@@ -0,0 +1,78 @@
+import asyncio
+from datetime import date, timedelta
+
+from db import get_supabase
+from services.analytics_service import user_stats
+from services.item_service import apply_item_changes, insert_items_into_supabase
+
+USER = "00000000-0000-0000-0000-000000000012"
+TODAY = date.today()
+
+
+def _day(offset: int) -> str:
+    return (TODAY + timedelta(days=offset)).isoformat()
+
+
+def _recomputed(user_uuid: str) -> dict:
+    """The same stats computed from scratch over the user's current rows."""
+    rows = [r for r in get_supabase().tables["items"] if r["user_uuid"] == user_uuid]
+    today, week_start = TODAY.isoformat(), _day(-6)
+    consumed = [r for r in rows if r.get("consumed_at")]
+    expiring = [r for r in rows if not r.get("consumed_at") and r.get("estimated_expiration")]
+    expired = [r for r in expiring if r["estimated_expiration"] < today]
+    months: dict = {}
+    for r in rows:
+        months[r["date_bought"][:7]] = months.get(r["date_bought"][:7], 0.0) + r["price"]
+    return {
+        "total_spend": round(sum(r["price"] for r in rows), 2),
+        "monthly_spend": [{"month": m, "spend": round(v, 2)} for m, v in sorted(months.items())],
+        "items": {
+            "total": len(rows),
+            "consumed": len(consumed),
+            "expired": len(expired),
+            "active": len(expiring) - len(expired),
+        },
+        "savings": {
+            "weekly": round(sum(r["price"] for r in consumed if week_start <= r["consumed_at"][:10] <= today), 2),
+            "lifetime": round(sum(r["price"] for r in consumed), 2),
+        },
+        "waste": {"expired_value": round(sum(r["price"] for r in expired), 2)},
+    }
+
+
+def test_stats_follow_inserts_consumes_edits_and_deletes():
+    inserted = asyncio.run(insert_items_into_supabase(USER, {"items": [
+        {"name": "Milk", "price": 3.0, "date_bought": _day(-40), "estimated_expiration": _day(-2)},
+        {"name": "Eggs", "price": 4.5, "date_bought": _day(-3), "estimated_expiration": _day(5)},
+        {"name": "Bread", "price": 2.25, "date_bought": _day(-1), "estimated_expiration": _day(2)},
+        {"name": "Rice", "price": 6.0, "date_bought": _day(-1)},
+    ]}))["result"]
+    milk, eggs, bread, rice = (row["id"] for row in inserted)
+
+    stats = asyncio.run(user_stats(USER))
+    assert stats == _recomputed(USER)
+    assert stats["total_spend"] == 15.75
+    assert stats["items"] == {"total": 4, "consumed": 0, "expired": 1, "active": 2}
+    assert stats["waste"] == {"expired_value": 3.0}
+
+    asyncio.run(apply_item_changes(USER, [
+        {"op": "consume", "id": eggs},
+        {"op": "update", "id": bread, "set": {"price": 3.0, "estimated_expiration": _day(-1)}},
+        {"op": "delete", "id": rice},
+    ]))
+    stats = asyncio.run(user_stats(USER))
+    assert stats == _recomputed(USER)
+    assert stats["items"] == {"total": 3, "consumed": 1, "expired": 2, "active": 0}
+    assert stats["savings"] == {"weekly": 4.5, "lifetime": 4.5}
+    assert stats["waste"] == {"expired_value": 6.0}
+
+
+def test_stats_for_a_user_without_items_are_zero():
+    stats = asyncio.run(user_stats("00000000-0000-0000-0000-0000000000ff"))
+    assert stats == {
+        "total_spend": 0.0,
+        "monthly_spend": [],
+        "items": {"total": 0, "consumed": 0, "expired": 0, "active": 0},
+        "savings": {"weekly": 0.0, "lifetime": 0.0},
+        "waste": {"expired_value": 0.0},
+    }
@@ -0,0 +1,44 @@
+import io
+
+import pytest
+from PIL import Image
+
+from services.image_service import PHOTO_PREPROCESS, ImageRejected, preprocess_image
+
+
+def _encode(size=(640, 480), fmt="JPEG") -> bytes:
+    out = io.BytesIO()
+    Image.effect_noise(size, 64).convert("RGB").save(out, format=fmt)
+    return out.getvalue()
+
+
+def _garble_png(data: bytes) -> bytes:
+    start = data.index(b"IDAT") + 24
+    return data[:start] + bytes(range(256)) * 4 + data[start + 1024:]
+
+
+JPEG, PNG = _encode(), _encode(fmt="PNG")
+DAMAGED = {
+    "jpeg-cut-short": JPEG[: len(JPEG) // 2],
+    "png-cut-short": PNG[: len(PNG) // 2],
+    "png-garbled": _garble_png(PNG),  # valid header, broken pixel data
+}
+
+
+def test_preprocess_downscales_and_reencodes():
+    image = preprocess_image(_encode((3000, 2000)), PHOTO_PREPROCESS)
+    assert max(image.width, image.height) == PHOTO_PREPROCESS.max_long_edge
+    assert image.mime_type == "image/jpeg"
+
+
+def test_not_an_image_is_415():
+    with pytest.raises(ImageRejected) as e:
+        preprocess_image(b"definitely not an image", PHOTO_PREPROCESS)
+    assert e.value.status_code == 415
+
+
+@pytest.mark.parametrize("name", DAMAGED)
+def test_truncated_or_corrupt_image_is_400(name):
+    with pytest.raises(ImageRejected) as e:
+        preprocess_image(DAMAGED[name], PHOTO_PREPROCESS)
+    assert e.value.status_code == 400
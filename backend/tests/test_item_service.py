@@ -0,0 +1,28 @@
+import asyncio
+
+from services.item_service import apply_item_changes, insert_items_into_supabase, item_versions, items_version
+
+USER = "00000000-0000-0000-0000-000000000010"
+
+
+def test_items_version_changes_on_every_write_and_only_then():
+    inserted = asyncio.run(insert_items_into_supabase(USER, {"items": [{"name": "Milk", "price": 3.0}]}))["result"]
+    tag, latest = asyncio.run(items_version(USER))
+    assert latest == inserted[0]["updated_at"]
+    assert asyncio.run(items_version(USER)) == (tag, latest)
+
+    asyncio.run(insert_items_into_supabase(USER, {"items": [{"name": "Eggs", "price": 4.0}]}))
+    after_insert = asyncio.run(items_version(USER))
+    assert after_insert[0] != tag
+
+    asyncio.run(apply_item_changes(USER, [{"op": "delete", "id": inserted[0]["id"]}]))
+    after_delete = asyncio.run(items_version(USER))
+    assert after_delete[0] != after_insert[0]
+    assert after_delete[1] == after_insert[1]  # deletes don't move the sync cursor
+
+
+def test_items_version_is_read_from_the_shared_tier():
+    assert item_versions.db_path is not None
+    tag, _ = asyncio.run(items_version(USER))
+    # What another worker would see: the disk tier, not this process's memory
+    assert item_versions.get(USER, refresh=True)["tag"] == tag
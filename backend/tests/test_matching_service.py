@@ -0,0 +1,30 @@
+import asyncio
+
+from services.item_service import insert_items_into_supabase
+from services.matching_service import cookable_recipes
+from services.user_service import save_recipe_in_db
+
+
+def _ranked(user: str, item_names: list[str]) -> list[dict]:
+    asyncio.run(save_recipe_in_db(user, {
+        "title": "Chicken stir fry",
+        "ingredients": ["2 boneless chicken breasts, cut into strips", "1 tbsp olive oil", "Salt to taste"],
+    }))
+    asyncio.run(insert_items_into_supabase(user, {"items": [{"name": n, "price": 1.0} for n in item_names]}))
+    return asyncio.run(cookable_recipes(user))
+
+
+def test_a_different_breast_does_not_cover_chicken_breast():
+    ranked = _ranked("00000000-0000-0000-0000-000000000151", ["Turkey breast", "Olive oil"])
+    assert ranked[0]["have"] == ["1 tbsp olive oil"]
+    assert ranked[0]["missing"] == ["2 boneless chicken breasts, cut into strips"]
+
+
+def test_parts_from_different_items_do_not_combine():
+    ranked = _ranked("00000000-0000-0000-0000-000000000152", ["Turkey breast", "Chicken thighs"])
+    assert ranked == []
+
+
+def test_receipt_abbreviations_cover_the_full_phrase():
+    ranked = _ranked("00000000-0000-0000-0000-000000000153", ["CHKN BRST BNLS", "Olive oil"])
+    assert ranked[0]["coverage"] == 1.0
@@ -0,0 +1,41 @@
+import pytest
+
+from services.recipe_utils import DEFAULT_COOK_TIME, normalize_cook_time
+
+
+@pytest.mark.parametrize("cook_time, expected", [
+    ("10-20 minutes", "15 minutes"),
+    ("10 - 20 min", "15 minutes"),
+    ("45–60 minutes", "52 minutes"),
+    ("45—60 minutes", "52 minutes"),
+    ("20 to 30 minutes", "25 minutes"),
+    ("1-2 hours", "90 minutes"),
+    ("1 to 2 hrs", "90 minutes"),
+    ("1.5-2.5 h", "120 minutes"),
+    ("30 min - 1 hr", "45 minutes"),
+    ("30 MIN - 1 HOUR", "45 minutes"),
+    ("About 10-15 minutes total", "12 minutes"),
+])
+def test_ranges_average_to_minutes(cook_time, expected):
+    assert normalize_cook_time(cook_time) == expected
+
+
+@pytest.mark.parametrize("cook_time", ["25 minutes", "1 hour", "overnight", "5"])
+def test_non_ranges_are_unchanged(cook_time):
+    assert normalize_cook_time(cook_time) == cook_time
+
+
+@pytest.mark.parametrize("cook_time", ["quick - easy", "-", "10 -"])
+def test_unparseable_dashes_get_the_default(cook_time):
+    assert normalize_cook_time(cook_time) == DEFAULT_COOK_TIME
+
+
+@pytest.mark.parametrize("cook_time", [None, ""])
+def test_missing_is_zero(cook_time):
+    assert normalize_cook_time(cook_time) == "0 minutes"
+
+
+def test_non_string_raises_type_error():
+    # save_recipe_in_db reports this as {"success": False}
+    with pytest.raises(TypeError):
+        normalize_cook_time(30)
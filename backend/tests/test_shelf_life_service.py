@@ -0,0 +1,14 @@
+from services.shelf_life_service import learn_expiration, learned_shelf_lives, shelf_life_days
+
+
+def test_learned_shelf_life_is_answered_locally_and_shared():
+    assert shelf_life_days("Zzyzx fruit", "R") is None
+    learn_expiration({"name": "Zzyzx fruit", "date_bought": "2026-10-01", "estimated_expiration": "2026-10-08",
+                      "storage_location": "R"})
+    learn_expiration({"name": "Zzyzx fruit", "date_bought": "2026-10-01", "estimated_expiration": "2026-11-01",
+                      "storage_location": "F"})
+    assert shelf_life_days("ZZYZX FRUIT", "R") == 7
+    assert shelf_life_days("ZZYZX FRUIT", "F") == 31
+    # What another worker reads: the SQLite tier, not this process's memory
+    assert learned_shelf_lives.get("zzyzx fruit", refresh=True) == {"R": 7, "F": 31}
+
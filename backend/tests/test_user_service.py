@@ -0,0 +1,31 @@
+import asyncio
+
+from services.user_service import list_recipes_in_db, recipe_versions, save_recipe_in_db
+
+USER = "00000000-0000-0000-0000-000000000001"
+
+
+def test_save_normalizes_cook_time():
+    saved = asyncio.run(save_recipe_in_db(USER, {"title": "Stew", "cookTime": "1-2 hours", "ingredients": ["beef"]}))
+    assert saved["success"]
+    recipes = asyncio.run(list_recipes_in_db(USER))["recipes"]
+    assert [(r["title"], r["cook_time"]) for r in recipes][0] == ("Stew", "90 minutes")
+
+
+def test_save_with_non_string_cook_time_reports_failure():
+    saved = asyncio.run(save_recipe_in_db(USER, {"title": "Soup", "cookTime": 30}))
+    assert saved["success"] is False
+    assert "error" in saved
+
+
+def test_saving_invalidates_the_cached_listing():
+    user = "00000000-0000-0000-0000-000000000011"
+    asyncio.run(save_recipe_in_db(user, {"title": "Curry", "cookTime": "40 minutes"}))
+    first = asyncio.run(list_recipes_in_db(user))
+    assert [r["title"] for r in first["recipes"]] == ["Curry"]
+    assert asyncio.run(list_recipes_in_db(user)) is first  # a cache hit, no database call
+
+    tag = recipe_versions.get(user, refresh=True)
+    asyncio.run(save_recipe_in_db(user, {"title": "Dal", "cookTime": "30 minutes"}))
+    assert recipe_versions.get(user, refresh=True) != tag
+    assert [r["title"] for r in asyncio.run(list_recipes_in_db(user))["recipes"]] == ["Dal", "Curry"]
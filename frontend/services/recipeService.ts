@@ -1,5 +1,7 @@
 import { supabase } from '../supabaseClient';
 
+const backendUrl = "https://4b14141d3b34.ngrok-free.app"; // same as items
+
 export interface Recipe {
   id: number;
   user_uuid: string;
@@ -14,36 +16,21 @@ export interface Recipe {
 
 export async function fetchUserRecipes(userId: string): Promise<Recipe[]> {
   try {
-    // Fetch recipes
-    const { data: recipes, error: recipesError } = await supabase
-      .from('recipes')
-      .select('*')
-      .eq('user_uuid', userId);
-
-    if (recipesError) throw recipesError;
-
-    // For each recipe, fetch its ingredients and steps
-    const fullRecipes = await Promise.all(recipes.map(async (recipe) => {
-      const [{ data: ingredients }, { data: steps }] = await Promise.all([
-        supabase
-          .from('recipe_ingredients')
-          .select('ingredient')
-          .eq('recipe_id', recipe.id),
-        supabase
-          .from('recipe_steps')
-          .select('instruction')
-          .eq('recipe_id', recipe.id)
-          .order('step_number')
-      ]);
-
-      return {
-        ...recipe,
-        ingredients: ingredients?.map(i => i.ingredient) || [],
-        steps: steps?.map(s => s.instruction) || []
-      };
-    }));
+    // The backend returns recipes with ingredients and steps already attached,
+    // one page per request
+    const recipes: Recipe[] = [];
+    let before: number | null = null;
+    do {
+      const params = new URLSearchParams({ user_uuid: userId, limit: "200" });
+      if (before !== null) params.append("before", String(before));
+      const res = await fetch(`${backendUrl}/user/recipes?${params.toString()}`);
+      if (!res.ok) throw new Error(`Server error ${res.status}: ${await res.text()}`);
+      const page: { recipes: Recipe[]; next_cursor: number | null } = await res.json();
+      recipes.push(...page.recipes);
+      before = page.next_cursor;
+    } while (before !== null);
 
-    return fullRecipes;
+    return recipes;
   } catch (error) {
     console.error('Error fetching recipes:', error);
     return [];